@@ -0,0 +1,318 @@
+"""
+Analítica en vivo de los resultados: distribución de sentimiento, puntuación
+media, cuantiles de estrellas y emociones más frecuentes por minuto y por hora.
+
+Los endpoints solo encolan cada SentimentResult (`record`, O(1) y sin
+cálculo); una tarea en segundo plano los agrega cada `flush_seconds`, en
+tandas de `flush_batch` que ceden el event loop entre sí, en dos anillos de
+cubetas de tiempo de tamaño fijo. Cada cubeta guarda contadores,
+un histograma de estrellas de ancho fijo (cuantiles aproximados) y un
+Space-Saving de emociones (heavy hitters), todo con memoria acotada y
+combinable, así que consultar una ventana es combinar sus cubetas sin
+recorrer el historial. Las consultas leen las cubetas tal como quedaron en
+la última agregación, sin agregar nada en la petición.
+"""
+from typing import Callable, Deque, Dict, Iterable, List, Optional, Tuple
+from collections import deque
+from datetime import datetime, timezone
+import asyncio
+import logging
+import time
+
+from app.chunking import expected_stars
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+RESOLUTIONS = {"minute": 60, "hour": 3600}
+STARS_RANGE = (1.0, 5.0)
+STARS_BINS = 80
+EMOTION_COUNTERS = 16
+
+
+class QuantileHistogram:
+    """Histograma de `bins` cubetas iguales sobre [low, high]: cuantiles con error de media cubeta"""
+
+    __slots__ = ("low", "high", "counts", "count", "total")
+
+    def __init__(self, low: float, high: float, bins: int):
+        self.low = low
+        self.high = high
+        self.counts = [0] * bins
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float) -> None:
+        bins = len(self.counts)
+        index = int((value - self.low) / (self.high - self.low) * bins)
+        self.counts[min(bins - 1, max(0, index))] += 1
+        self.count += 1
+        self.total += value
+
+    def merge(self, other: "QuantileHistogram") -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+
+    def clear(self) -> None:
+        self.counts = [0] * len(self.counts)
+        self.count = 0
+        self.total = 0.0
+
+    @property
+    def mean(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        width = (self.high - self.low) / len(self.counts)
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                # Interpolación lineal dentro de la cubeta
+                return self.low + width * (index + (rank - seen) / count)
+            seen += count
+        return self.high
+
+
+class SpaceSaving:
+    """
+    Elementos más frecuentes con `capacity` contadores (algoritmo Space-Saving):
+    cuando no hay sitio, el nuevo hereda el contador del menos frecuente, así
+    que los conteos son cotas superiores con error máximo `error`.
+    """
+
+    __slots__ = ("capacity", "counts", "error")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self.counts: Dict[str, int] = {}
+        self.error = 0
+
+    def add(self, item: str, count: int = 1) -> None:
+        if item in self.counts or len(self.counts) < self.capacity:
+            self.counts[item] = self.counts.get(item, 0) + count
+            return
+        smallest = min(self.counts, key=self.counts.get)
+        floor = self.counts.pop(smallest)
+        self.error = max(self.error, floor)
+        self.counts[item] = floor + count
+
+    def merge(self, other: "SpaceSaving") -> None:
+        for item, count in other.counts.items():
+            self.add(item, count)
+        self.error = max(self.error, other.error)
+
+    def clear(self) -> None:
+        self.counts.clear()
+        self.error = 0
+
+    def top(self, k: int) -> List[Tuple[str, int]]:
+        return sorted(self.counts.items(), key=lambda entry: (-entry[1], entry[0]))[:k]
+
+
+class Bucket:
+    """Agregados de un intervalo de tiempo que empieza en `start` (segundos epoch)"""
+
+    __slots__ = ("start", "count", "errors", "sentiments", "score_total", "stars", "emotions")
+
+    def __init__(self, start: int = 0):
+        self.start = start
+        self.count = 0
+        self.errors = 0
+        self.sentiments: Dict[str, int] = {}
+        self.score_total = 0.0
+        self.stars = QuantileHistogram(*STARS_RANGE, STARS_BINS)
+        self.emotions = SpaceSaving(EMOTION_COUNTERS)
+
+    def reset(self, start: int) -> None:
+        self.start = start
+        self.count = self.errors = 0
+        self.sentiments.clear()
+        self.score_total = 0.0
+        self.stars.clear()
+        self.emotions.clear()
+
+    def add(self, result: SentimentResult, stars: Optional[float]) -> None:
+        if not result.raw_scores:
+            # Resultado de error (SentimentAnalyzer._error_result): no es un sentimiento
+            self.errors += 1
+            return
+        self.count += 1
+        self.sentiments[result.sentiment] = self.sentiments.get(result.sentiment, 0) + 1
+        self.score_total += result.score
+        if stars is not None:
+            self.stars.add(stars)
+        for emotion in result.emotions:
+            self.emotions.add(emotion)
+
+    def merge(self, other: "Bucket") -> None:
+        self.count += other.count
+        self.errors += other.errors
+        for sentiment, count in other.sentiments.items():
+            self.sentiments[sentiment] = self.sentiments.get(sentiment, 0) + count
+        self.score_total += other.score_total
+        self.stars.merge(other.stars)
+        self.emotions.merge(other.emotions)
+
+    def report(self, top: int, width: int) -> Dict:
+        p50, p90 = self.stars.quantile(0.5), self.stars.quantile(0.9)
+        return {
+            "start": datetime.fromtimestamp(self.start, timezone.utc).isoformat(),
+            "seconds": width,
+            "count": self.count,
+            "errors": self.errors,
+            "sentiments": dict(sorted(self.sentiments.items(), key=lambda entry: -entry[1])),
+            "avg_score": round(self.score_total / self.count, 4) if self.count else None,
+            "avg_stars": round(self.stars.mean, 3) if self.stars.count else None,
+            "p50_stars": round(p50, 2) if p50 is not None else None,
+            "p90_stars": round(p90, 2) if p90 is not None else None,
+            "top_emotions": [{"emotion": emotion, "count": count} for emotion, count in self.emotions.top(top)],
+        }
+
+
+class TimeRing:
+    """`size` cubetas de `width` segundos en un anillo: la cubeta de un instante se reutiliza al dar la vuelta"""
+
+    def __init__(self, width: int, size: int):
+        self.width = width
+        self.buckets = [Bucket(-width) for _ in range(max(1, size))]
+
+    def bucket(self, timestamp: float) -> Optional[Bucket]:
+        """La cubeta de `timestamp`, o None si es tan antiguo que su cubeta ya se reutilizó"""
+        start = int(timestamp // self.width) * self.width
+        bucket = self.buckets[(start // self.width) % len(self.buckets)]
+        if bucket.start < start:
+            bucket.reset(start)
+        return bucket if bucket.start == start else None
+
+    def window(self, now: float, count: int) -> List[Bucket]:
+        """Las últimas `count` cubetas hasta la de `now`, de la más antigua a la más reciente (vacías incluidas)"""
+        current = int(now // self.width)
+        window = []
+        for index in range(current - min(count, len(self.buckets)) + 1, current + 1):
+            bucket = self.buckets[index % len(self.buckets)]
+            window.append(bucket if bucket.start == index * self.width else Bucket(index * self.width))
+        return window
+
+
+class RollingAnalytics:
+    """
+    Analítica por minuto (`minute_buckets` cubetas) y por hora (`hour_buckets`).
+    `record` solo encola: hasta `max_pending` resultados esperan a la
+    siguiente agregación, y si se llena se descartan los más antiguos.
+    `flush_batch` acota cuántos se agregan seguidos sin ceder el event loop.
+    """
+
+    def __init__(
+        self,
+        minute_buckets: int = 120,
+        hour_buckets: int = 48,
+        max_pending: int = 10000,
+        flush_seconds: float = 1.0,
+        flush_batch: int = 500,
+        clock: Callable[[], float] = time.time
+    ):
+        self.enabled = max_pending > 0
+        self.rings = {
+            "minute": TimeRing(RESOLUTIONS["minute"], minute_buckets),
+            "hour": TimeRing(RESOLUTIONS["hour"], hour_buckets),
+        }
+        self.flush_seconds = flush_seconds
+        self.flush_batch = max(1, flush_batch)
+        self.recorded = 0
+        self.dropped = 0
+        self._clock = clock
+        self._pending: Deque[Tuple[float, SentimentResult]] = deque(maxlen=max(1, max_pending))
+        self._task: Optional[asyncio.Task] = None
+
+    def record(self, result: SentimentResult) -> None:
+        if not self.enabled:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((self._clock(), result))
+
+    def record_many(self, results: Iterable[SentimentResult]) -> None:
+        for result in results:
+            self.record(result)
+
+    def flush(self, limit: Optional[int] = None) -> int:
+        """Agrega hasta `limit` resultados encolados (todos si es None); devuelve cuántos"""
+        flushed = len(self._pending) if limit is None else min(limit, len(self._pending))
+        for _ in range(flushed):
+            timestamp, result = self._pending.popleft()
+            stars = expected_stars(result.raw_scores) if result.raw_scores else None
+            for ring in self.rings.values():
+                bucket = ring.bucket(timestamp)
+                if bucket is not None:
+                    bucket.add(result, stars)
+        self.recorded += flushed
+        return flushed
+
+    async def drain(self) -> int:
+        """
+        Agrega lo que estaba encolado al empezar en tandas de `flush_batch`,
+        cediendo el event loop entre tandas; devuelve cuántos
+        """
+        remaining = len(self._pending)
+        flushed = 0
+        while remaining > 0 and self._pending:
+            count = self.flush(min(self.flush_batch, remaining))
+            remaining -= count
+            flushed += count
+            await asyncio.sleep(0)
+        return flushed
+
+    def query(self, resolution: str = "minute", buckets: int = 60, top: int = 5) -> Dict:
+        """
+        Serie de las últimas `buckets` cubetas de `resolution` y su resumen
+        combinado. Lee lo ya agregado: los resultados encolados aparecen tras
+        la siguiente agregación (como mucho `flush_seconds` después).
+        """
+        if resolution not in self.rings:
+            raise ValueError(f"Resolución desconocida: {resolution!r} (opciones: {', '.join(self.rings)})")
+        ring = self.rings[resolution]
+        window = ring.window(self._clock(), max(1, buckets))
+        summary = Bucket(window[0].start)
+        for bucket in window:
+            summary.merge(bucket)
+        return {
+            "resolution": resolution,
+            "series": [bucket.report(top, ring.width) for bucket in window],
+            "summary": summary.report(top, ring.width * len(window)),
+        }
+
+    def snapshot(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "recorded": self.recorded,
+            "pending": len(self._pending),
+            "dropped": self.dropped,
+            "buckets": {resolution: len(ring.buckets) for resolution, ring in self.rings.items()},
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            try:
+                await self.drain()
+            except Exception as e:
+                logger.error(f"Error agregando la analítica: {str(e)}")
+
+    def start(self) -> None:
+        if self.enabled and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self.flush()
@@ -0,0 +1,290 @@
+from typing import Dict, List, Optional, Sequence, Tuple
+import hashlib
+import logging
+import math
+import os
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# Nombre del grafo dentro del directorio exportado por `python -m app.onnx_tools export`
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model.int8.onnx"
+
+BACKENDS = ("transformers", "onnx", "onnx-int8", "stub")
+PRECISIONS = ("fp32", "bf16")
+
+# Scores de un texto: [{"label": "4 stars", "score": 0.61}, ...], como los del pipeline
+LabelScores = List[Dict]
+
+
+def cpu_supports_bf16() -> bool:
+    """Si la CPU tiene instrucciones bf16 nativas (AVX512-BF16 o AMX); sin ellas bf16 se emula y es más lento"""
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            flags = next((line.split(":", 1)[1].split() for line in f if line.startswith("flags")), [])
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+
+class InferenceBackend:
+    """
+    Motor de inferencia: recibe textos y devuelve, por texto, la lista de
+    {label, score} de todas las clases. SentimentAnalyzer se encarga del resto
+    (estrellas, emociones), así que el postproceso es idéntico en cada motor.
+
+    `predict` se divide en `encode` (tokenización) y `forward` (modelo y
+    softmax) para poder medir cada etapa por separado.
+    """
+
+    name = "base"
+    tokenizer = None
+    max_length = 512
+    # Precisiones con las que puede ejecutar el forward, y la actual
+    precisions: Tuple[str, ...] = ("fp32",)
+    precision = "fp32"
+    # Tensores que devuelven `encode` y `pad` ("pt" o "np")
+    tensor_type = "pt"
+
+    def predict(self, texts: List[str]) -> List[LabelScores]:
+        return self.forward(self.encode(texts))
+
+    def encode(self, texts: List[str]):
+        raise NotImplementedError
+
+    def forward(self, encoded) -> List[LabelScores]:
+        raise NotImplementedError
+
+    def set_precision(self, precision: str) -> None:
+        if precision not in self.precisions:
+            raise ValueError(
+                f"El motor {self.name} no admite la precisión {precision!r} (opciones: {', '.join(self.precisions)})"
+            )
+        self.precision = precision
+
+    def memory_bytes(self) -> int:
+        """Memoria aproximada de los pesos del modelo"""
+        return 0
+
+    def tokenize(self, texts: List[str]):
+        """
+        Tokeniza sin rellenar ni crear tensores (con tokens especiales y
+        truncado). Con el bucketing, de aquí salen las longitudes (`lengths`) y
+        el `encode` de cada grupo (`pad`), así que cada texto se tokeniza una vez.
+        """
+        return self.tokenizer(list(texts), truncation=True, max_length=self.max_length)
+
+    def lengths(self, tokenized) -> List[int]:
+        return [len(ids) for ids in tokenized["input_ids"]]
+
+    def pad(self, tokenized, indices: Sequence[int]):
+        """Lo mismo que `encode` de los textos `indices`, rellenando lo ya tokenizado"""
+        features = {name: [values[i] for i in indices] for name, values in tokenized.items()}
+        # transformers avisa de que con un tokenizer rápido es más rápido
+        # tokenizar y rellenar a la vez; aquí lo caro es tokenizar dos veces
+        self.tokenizer.deprecation_warnings["Asking-to-pad-a-fast-tokenizer"] = True
+        return self.tokenizer.pad(features, padding=True, return_tensors=self.tensor_type)
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        """Longitud en tokens de cada texto (con tokens especiales y truncado)"""
+        return self.lengths(self.tokenize(texts))
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        """(inicio, fin) en caracteres de cada token de `text`, sin tokens especiales ni truncado"""
+        encoded = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [tuple(span) for span in encoded["offset_mapping"]]
+
+    def window_tokens(self) -> int:
+        """Tokens de texto que caben en un forward (max_length menos los especiales)"""
+        return self.max_length - self.tokenizer.num_special_tokens_to_add()
+
+
+class TransformersBackend(InferenceBackend):
+    """
+    Modelo de transformers en PyTorch (fp32), el motor de referencia. Hace lo
+    mismo que el pipeline "sentiment-analysis" con top_k=None (tokenizar,
+    forward y softmax sobre todas las clases) pero con las etapas separadas.
+
+    En CPUs con bf16 nativo admite también precision="bf16": los pesos siguen
+    en fp32 y el forward se ejecuta con autocast a bf16.
+    """
+
+    name = "transformers"
+
+    def __init__(self, model_name: str, max_length: int = 512):
+        import torch
+        from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+        self.device = 0 if torch.cuda.is_available() else -1
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
+        self.model.eval()
+        if self.device == 0:
+            self.model.to("cuda")
+        self.max_length = min(max_length, self.tokenizer.model_max_length)
+        self.labels = [self.model.config.id2label[i] for i in range(len(self.model.config.id2label))]
+        if self.device == -1 and cpu_supports_bf16():
+            self.precisions = PRECISIONS
+
+    def memory_bytes(self) -> int:
+        tensors = list(self.model.parameters()) + list(self.model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+
+    def encode(self, texts: List[str]):
+        # Cada lote se rellena hasta su texto más largo; truncar evita que un
+        # texto por encima del límite del modelo rompa el forward
+        return self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors=self.tensor_type
+        )
+
+    def forward(self, encoded) -> List[LabelScores]:
+        import torch
+
+        bf16 = self.precision == "bf16"
+        with torch.inference_mode(), torch.autocast(self.model.device.type, dtype=torch.bfloat16, enabled=bf16):
+            logits = self.model(**encoded.to(self.model.device)).logits
+            probs = torch.softmax(logits.float(), dim=-1).cpu().tolist()
+        return [
+            [{"label": label, "score": p} for label, p in zip(self.labels, row)]
+            for row in probs
+        ]
+
+
+class OnnxBackend(InferenceBackend):
+    """
+    Grafo exportado a ONNX ejecutado con ONNX Runtime en CPU, opcionalmente
+    con los pesos cuantizados dinámicamente a int8.
+    """
+
+    name = "onnx"
+    tensor_type = "np"
+
+    def __init__(self, model_dir: str, quantized: bool = False, max_length: int = 512):
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise ImportError("El motor ONNX necesita 'onnxruntime' (pip install onnxruntime)") from e
+        from transformers import AutoConfig, AutoTokenizer
+
+        filename = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        path = os.path.join(model_dir, filename)
+        if not os.path.exists(path):
+            raise FileNotFoundError(
+                f"No existe {path}; expórtalo con: python -m app.onnx_tools export --output {model_dir}"
+                + (" --quantize" if quantized else "")
+            )
+
+        self.name = "onnx-int8" if quantized else "onnx"
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.max_length = min(max_length, self.tokenizer.model_max_length)
+        config = AutoConfig.from_pretrained(model_dir)
+        self.labels = [config.id2label[i] for i in range(len(config.id2label))]
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.path = path
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def memory_bytes(self) -> int:
+        # Los pesos del grafo ocupan en memoria lo mismo que en disco
+        return os.path.getsize(self.path)
+
+    def encode(self, texts: List[str]):
+        return self.tokenizer(
+            list(texts), padding=True, truncation=True, max_length=self.max_length, return_tensors=self.tensor_type
+        )
+
+    def forward(self, encoded) -> List[LabelScores]:
+        import numpy as np
+
+        feeds = {name: value.astype(np.int64) for name, value in encoded.items() if name in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+
+        # softmax estable por fila
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        probs = exp / exp.sum(axis=1, keepdims=True)
+        return [
+            [{"label": label, "score": float(p)} for label, p in zip(self.labels, row)]
+            for row in probs
+        ]
+
+
+class StubBackend(InferenceBackend):
+    """
+    Motor sin modelo para benchmarks y pruebas de carga: no descarga nada y
+    puntúa cada texto de forma determinista a partir de un hash del texto.
+
+    `batch_ms` y `token_ms` simulan el coste de un forward (fijo por lote y por
+    token rellenado) con un sleep, que como torch libera el GIL mientras dura.
+    """
+
+    name = "stub"
+    labels = ["1 star", "2 stars", "3 stars", "4 stars", "5 stars"]
+    batch_ms = 0.0
+    token_ms = 0.0
+
+    def __init__(self, max_length: int = 512):
+        self.device = -1
+        self.max_length = max_length
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        # ~1,3 tokens por palabra más [CLS]/[SEP], como un tokenizer WordPiece
+        return [min(self.max_length, int(len(text.split()) * 1.3) + 2) for text in texts]
+
+    def tokenize(self, texts: List[str]):
+        return list(texts)
+
+    def lengths(self, tokenized) -> List[int]:
+        return self.token_lengths(tokenized)
+
+    def pad(self, tokenized, indices: Sequence[int]):
+        return [tokenized[i] for i in indices]
+
+    def token_spans(self, text: str) -> List[Tuple[int, int]]:
+        # Un "token" por palabra
+        return [match.span() for match in re.finditer(r"\S+", text)]
+
+    def window_tokens(self) -> int:
+        return int((self.max_length - 2) / 1.3)
+
+    def encode(self, texts: List[str]):
+        return list(texts)
+
+    def forward(self, texts) -> List[LabelScores]:
+        if self.batch_ms or self.token_ms:
+            padded = len(texts) * max(self.token_lengths(texts), default=0)
+            time.sleep((self.batch_ms + self.token_ms * padded) / 1000)
+
+        results = []
+        for text in texts:
+            digest = hashlib.blake2b(text.encode("utf-8"), digest_size=len(self.labels)).digest()
+            logits = [byte / 64 for byte in digest]
+            total = sum(math.exp(logit) for logit in logits)
+            results.append([
+                {"label": label, "score": math.exp(logit) / total}
+                for label, logit in zip(self.labels, logits)
+            ])
+        return results
+
+
+def create_backend(
+    name: str,
+    model_name: str,
+    onnx_dir: Optional[str] = None,
+    max_length: int = 512,
+    precision: str = "fp32"
+) -> InferenceBackend:
+    if name == "transformers":
+        backend = TransformersBackend(model_name, max_length=max_length)
+    elif name in ("onnx", "onnx-int8"):
+        backend = OnnxBackend(onnx_dir or model_name, quantized=name == "onnx-int8", max_length=max_length)
+    elif name == "stub":
+        backend = StubBackend(max_length=max_length)
+    else:
+        raise ValueError(f"Motor de inferencia desconocido: {name!r} (opciones: {', '.join(BACKENDS)})")
+    backend.set_precision(precision)
+    return backend
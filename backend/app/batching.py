@@ -0,0 +1,376 @@
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Set
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import logging
+import math
+
+from app.metrics import QUEUE_WAIT_SECONDS, REQUESTS_SHED, stage
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+BatchFn = Callable[[List[str]], Awaitable[List[SentimentResult]]]
+
+# Carriles de admisión, de más a menos prioridad: los textos sueltos de
+# `submit` (/sentify, /sentify/live) y los lotes ya formados de `run_batch`
+# (/sentify/batch, /sentify/document)
+LANES = ("interactive", "bulk")
+
+
+class Overloaded(Exception):
+    """
+    La cola de inferencia está saturada y la petición se rechaza sin llegar al
+    modelo: la cola de su carril está llena (`reason="queue_full"`) o llevaba
+    esperando más que el máximo (`reason="timeout"`). `retry_after` estima en
+    segundos cuándo tiene sentido reintentar.
+    """
+
+    def __init__(self, lane: str, reason: str, retry_after: int):
+        what = "llena" if reason == "queue_full" else "con demasiada espera"
+        super().__init__(f"Cola de inferencia ({lane}) {what}; reintenta en {retry_after} s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class _PriorityGate:
+    """
+    Semáforo de `capacity` huecos para los lotes en inferencia. Al liberarse
+    un hueco lo recibe el primero que espera en el carril de más prioridad.
+    """
+
+    def __init__(self, capacity: int):
+        self.free = capacity
+        self._waiters: Dict[str, Deque[asyncio.Future]] = {lane: deque() for lane in LANES}
+
+    def waiting(self, lane: str) -> int:
+        return sum(not waiter.done() for waiter in self._waiters[lane])
+
+    async def acquire(self, lane: str) -> None:
+        if self.free > 0:
+            self.free -= 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters[lane].append(waiter)
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Se le dio el hueco justo al cancelarse: pasa al siguiente
+                self.release()
+            else:
+                self._waiters[lane].remove(waiter)
+            raise
+
+    def release(self) -> None:
+        for lane in LANES:
+            waiters = self._waiters[lane]
+            while waiters:
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    return
+        self.free += 1
+
+
+@dataclass
+class _Pending:
+    """Un texto de `submit` en la cola"""
+    text: str
+    future: asyncio.Future
+    enqueued: float
+    dispatched: bool = False
+
+
+@dataclass
+class BatchStats:
+    """Contadores acumulados del planificador de lotes"""
+    batches: int = 0
+    items: int = 0
+    failed_batches: int = 0
+    max_batch_size_seen: int = 0
+    batch_size_histogram: Dict[int, int] = field(default_factory=dict)
+    # Rechazos por carril y motivo, y duración media reciente de un lote
+    shed: Dict[str, int] = field(default_factory=dict)
+    batch_seconds: float = 0.0
+
+    def record_duration(self, seconds: float) -> None:
+        self.batch_seconds = seconds if not self.batch_seconds else 0.8 * self.batch_seconds + 0.2 * seconds
+
+    def record(self, size: int) -> None:
+        self.batches += 1
+        self.items += size
+        self.max_batch_size_seen = max(self.max_batch_size_seen, size)
+        self.batch_size_histogram[size] = self.batch_size_histogram.get(size, 0) + 1
+
+    @property
+    def avg_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+
+class BatchScheduler:
+    """
+    Agrupa las peticiones que llegan a la vez en un único forward pass del modelo.
+
+    Cada llamada a `submit` encola un texto y espera su resultado. Un worker en
+    segundo plano toma el primer texto de la cola, espera como mucho
+    `max_wait_ms` a que lleguen más (hasta `max_batch_size`), ejecuta
+    `analyze_batch` una sola vez y reparte cada resultado a quien lo pidió.
+
+    Hasta `max_concurrency` lotes pueden estar en vuelo a la vez, de modo que
+    un pool de inferencia con varios workers procesa lotes en paralelo.
+
+    Control de admisión (0 = sin límite): como mucho `max_queue` textos
+    esperando en la cola y `max_queue_wait_ms` de espera hasta entrar en un
+    lote; `run_batch` tiene sus propios límites (`max_bulk_queue` lotes
+    esperando, `max_bulk_wait_ms`). Lo que no cabe se rechaza con Overloaded
+    en vez de acumular latencia. Cuando se libera un hueco de inferencia, los
+    lotes de `submit` pasan por delante de los de `run_batch`.
+    """
+
+    def __init__(
+        self,
+        analyze_batch: BatchFn,
+        max_batch_size: int = 16,
+        max_wait_ms: float = 5.0,
+        max_concurrency: int = 1,
+        max_queue: int = 0,
+        max_queue_wait_ms: float = 0.0,
+        max_bulk_queue: int = 0,
+        max_bulk_wait_ms: float = 0.0
+    ):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size debe ser >= 1")
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency debe ser >= 1")
+
+        self.analyze_batch = analyze_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max(max_wait_ms, 0.0) / 1000.0
+        self.max_concurrency = max_concurrency
+        self.max_queue = max(0, max_queue)
+        self.max_queue_wait = max(max_queue_wait_ms, 0.0) / 1000.0
+        self.max_bulk_queue = max(0, max_bulk_queue)
+        self.max_bulk_wait = max(max_bulk_wait_ms, 0.0) / 1000.0
+        self.stats = BatchStats()
+
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[_PriorityGate] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    @property
+    def batches_in_flight(self) -> int:
+        return len(self._in_flight)
+
+    @property
+    def bulk_waiting(self) -> int:
+        return self._slots.waiting("bulk") if self._slots is not None else 0
+
+    def retry_after(self, lane: str) -> int:
+        """Segundos estimados hasta vaciar lo que tiene por delante una petición nueva del carril"""
+        ahead = math.ceil(self.queue_depth / self.max_batch_size) + self.batches_in_flight
+        if lane == "bulk":
+            ahead += self.bulk_waiting
+        return max(1, math.ceil((ahead + 1) * self.stats.batch_seconds / self.max_concurrency))
+
+    def _shed(self, lane: str, reason: str) -> Overloaded:
+        key = f"{lane}:{reason}"
+        self.stats.shed[key] = self.stats.shed.get(key, 0) + 1
+        REQUESTS_SHED.inc(lane=lane, reason=reason)
+        return Overloaded(lane, reason, self.retry_after(lane))
+
+    def admit(self, lane: str) -> None:
+        """Lanza Overloaded si ahora mismo no cabe una petición más en el carril"""
+        if lane == "interactive" and self.max_queue and self.queue_depth >= self.max_queue:
+            raise self._shed(lane, "queue_full")
+        if lane == "bulk" and self.max_bulk_queue and self.bulk_waiting >= self.max_bulk_queue:
+            raise self._shed(lane, "queue_full")
+
+    async def submit(self, text: str) -> SentimentResult:
+        """
+        Encola un texto y devuelve su resultado cuando se procese su lote. Si
+        el llamante se cancela (p.ej. el cliente se desconectó) antes de que
+        el texto entre en un lote, el texto no llega al modelo.
+        """
+        self._ensure_started()
+        self.admit("interactive")
+        item = _Pending(text, self._loop.create_future(), self._loop.time())
+        self._queue.put_nowait(item)
+        try:
+            if self.max_queue_wait:
+                done, _ = await asyncio.wait({item.future}, timeout=self.max_queue_wait)
+                if not done and not item.dispatched:
+                    item.future.cancel()
+                    raise self._shed("interactive", "timeout")
+            return await item.future
+        except asyncio.CancelledError:
+            item.future.cancel()
+            raise
+
+    async def run_batch(self, texts: List[str]) -> List[SentimentResult]:
+        """
+        Ejecuta un lote ya formado (p.ej. de /sentify/batch) compartiendo el
+        límite de `max_concurrency` con los lotes del planificador, para que
+        el trabajo masivo no desborde el pool de inferencia. Tiene menos
+        prioridad que los lotes de `submit`.
+        """
+        self._ensure_started()
+        self.admit("bulk")
+        started = self._loop.time()
+        try:
+            await asyncio.wait_for(self._slots.acquire("bulk"), self.max_bulk_wait or None)
+        except asyncio.TimeoutError:
+            raise self._shed("bulk", "timeout")
+        QUEUE_WAIT_SECONDS.observe(self._loop.time() - started, lane="bulk")
+        # Como en _dispatch, la duración del lote no incluye la espera al hueco
+        started = self._loop.time()
+        self.stats.record(len(texts))
+        try:
+            with stage("batch"):
+                results = await self.analyze_batch(texts)
+        except Exception:
+            self.stats.failed_batches += 1
+            raise
+        finally:
+            self._slots.release()
+        self.stats.record_duration(self._loop.time() - started)
+        return results
+
+    async def close(self) -> None:
+        """Detiene el worker; las peticiones pendientes se cancelan"""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+        in_flight = list(self._in_flight)
+        for task in in_flight:
+            task.cancel()
+        # Dejar que cada lote cancelado libere su hueco y resuelva sus futures
+        # antes de soltar el semáforo y el loop
+        await asyncio.gather(*in_flight, return_exceptions=True)
+        if self._queue is not None:
+            while not self._queue.empty():
+                self._queue.get_nowait().future.cancel()
+        self._worker = None
+        self._queue = None
+        self._loop = None
+        self._slots = None
+        self._in_flight.clear()
+
+    def snapshot(self) -> Dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "batches_in_flight": self.batches_in_flight,
+            "max_concurrency": self.max_concurrency,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "max_queue": self.max_queue,
+            "max_queue_wait_ms": self.max_queue_wait * 1000.0,
+            "bulk_waiting": self.bulk_waiting,
+            "shed": dict(self.stats.shed),
+            "batch_seconds": round(self.stats.batch_seconds, 4),
+            "batches": self.stats.batches,
+            "items": self.stats.items,
+            "failed_batches": self.stats.failed_batches,
+            "avg_batch_size": round(self.stats.avg_batch_size, 3),
+            "max_batch_size_seen": self.stats.max_batch_size_seen,
+            "batch_size_histogram": dict(sorted(self.stats.batch_size_histogram.items())),
+        }
+
+    def _ensure_started(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._worker is not None and not self._worker.done() and self._loop is loop:
+            return
+        # Primer uso, o un event loop nuevo (p.ej. otro TestClient): la cola
+        # y el worker tienen que vivir en el loop actual
+        self._loop = loop
+        self._queue = asyncio.Queue()
+        self._slots = _PriorityGate(self.max_concurrency)
+        self._worker = loop.create_task(self._run())
+
+    async def _collect(self, first: _Pending) -> List[_Pending]:
+        batch = [first]
+        deadline = self._loop.time() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            remaining = deadline - self._loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self) -> None:
+        while True:
+            # Esperar a la primera petición sin ocupar hueco (run_batch también
+            # los usa) y luego a un hueco antes de completar el lote: mientras
+            # todos los workers están ocupados la cola sigue creciendo y el
+            # siguiente lote sale más lleno
+            first = await self._queue.get()
+            try:
+                await self._slots.acquire("interactive")
+            except BaseException:
+                first.future.cancel()
+                raise
+            try:
+                batch = await self._collect(first)
+            except BaseException:
+                self._slots.release()
+                raise
+            # Las peticiones canceladas mientras esperaban no ocupan sitio en el lote
+            batch = [item for item in batch if not item.future.done()]
+            if not batch:
+                self._slots.release()
+                continue
+
+            now = self._loop.time()
+            for item in batch:
+                item.dispatched = True
+                QUEUE_WAIT_SECONDS.observe(now - item.enqueued, lane="interactive")
+            self.stats.record(len(batch))
+            task = self._loop.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+
+    async def _dispatch(self, batch: List[_Pending]) -> None:
+        started = self._loop.time()
+        try:
+            with stage("batch"):
+                results = await self.analyze_batch([item.text for item in batch])
+            if len(results) != len(batch):
+                raise RuntimeError(f"Se esperaban {len(batch)} resultados y llegaron {len(results)}")
+        except Exception as e:
+            self.stats.failed_batches += 1
+            logger.error(f"Error procesando lote de {len(batch)} textos: {str(e)}")
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+            return
+        except asyncio.CancelledError:
+            # close() durante el forward: quien espera no debe quedarse colgado
+            for item in batch:
+                item.future.cancel()
+            raise
+        finally:
+            self._slots.release()
+
+        self.stats.record_duration(self._loop.time() - started)
+        for item, result in zip(batch, results):
+            if not item.future.done():
+                item.future.set_result(result)
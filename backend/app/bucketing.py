@@ -0,0 +1,49 @@
+from typing import Dict, List, Sequence
+
+
+def plan_buckets(
+    lengths: Sequence[int],
+    max_bucket_size: int = 64,
+    forward_overhead_tokens: int = 64
+) -> List[List[int]]:
+    """
+    Agrupa índices de textos por longitud en tokens para que cada lote se
+    rellene (padding) solo hasta el más largo de su grupo.
+
+    Los índices se ordenan por longitud y se recorren de menor a mayor. Añadir
+    un texto más largo al grupo actual obliga a rellenar todas sus filas hasta
+    la nueva longitud; se abre un grupo nuevo cuando ese padding extra supera
+    `forward_overhead_tokens`, el coste fijo estimado de un forward adicional
+    expresado en tokens. Así no se parte en lotes diminutos cuando no compensa.
+    """
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    buckets: List[List[int]] = []
+    current: List[int] = []
+
+    for i in order:
+        if current:
+            extra_padding = len(current) * (lengths[i] - lengths[current[-1]])
+            if extra_padding > forward_overhead_tokens or len(current) >= max_bucket_size:
+                buckets.append(current)
+                current = []
+        current.append(i)
+
+    if current:
+        buckets.append(current)
+    return buckets
+
+
+def padding_cost(lengths: Sequence[int], buckets: List[List[int]]) -> Dict[str, int]:
+    """
+    Coste de procesar `buckets` con padding al más largo de cada uno.
+
+    `tokens` es proporcional a los FLOPs de las capas lineales; `attention`
+    (suma de filas × longitud²) al de la atención, que crece cuadráticamente.
+    """
+    real = sum(lengths)
+    tokens = attention = 0
+    for bucket in buckets:
+        longest = max(lengths[i] for i in bucket)
+        tokens += len(bucket) * longest
+        attention += len(bucket) * longest * longest
+    return {"real_tokens": real, "padded_tokens": tokens, "attention_cost": attention, "forward_passes": len(buckets)}
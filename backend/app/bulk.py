@@ -0,0 +1,241 @@
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, List, Optional
+from collections import deque
+from dataclasses import dataclass
+from tempfile import SpooledTemporaryFile
+import asyncio
+import json
+import logging
+
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+# Una línea NDJSON de entrada no debería acercarse a esto (el texto máximo son 500
+# caracteres); el límite evita que una línea sin '\n' haga crecer el buffer sin fin
+MAX_LINE_BYTES = 16 * 1024
+
+BatchFn = Callable[[List[str]], Awaitable[List[SentimentResult]]]
+ValidateFn = Callable[[str], Optional[str]]
+
+
+class UploadTooLarge(Exception):
+    """El cuerpo subido supera el máximo de `spool_upload`"""
+
+    def __init__(self, max_bytes: int):
+        super().__init__(f"La subida supera el máximo de {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+@dataclass
+class BulkItem:
+    """Un elemento de una petición masiva, con su posición en la entrada"""
+    index: int
+    id: Optional[str] = None
+    text: Optional[str] = None
+    error: Optional[str] = None
+    result: Optional[SentimentResult] = None
+    recommendation: Optional[Dict] = None
+
+
+RenderFn = Callable[[BulkItem], str]
+# Codifica un lote ya puntuado entero (p.ej. MessagePack o un record batch de Arrow)
+EncodeFn = Callable[[List[BulkItem]], bytes]
+PrepareFn = Callable[[List[BulkItem]], None]
+
+
+def _parse_entry(index: int, entry) -> BulkItem:
+    if isinstance(entry, str):
+        return BulkItem(index=index, text=entry)
+    if isinstance(entry, dict):
+        item_id = entry.get("id")
+        item_id = None if item_id is None else str(item_id)
+        text = entry.get("text")
+        if not isinstance(text, str):
+            return BulkItem(index=index, id=item_id, error="Campo 'text' ausente o no es una cadena")
+        return BulkItem(index=index, id=item_id, text=text)
+    return BulkItem(index=index, error="Cada elemento debe ser una cadena o un objeto con 'text'")
+
+
+async def items_from_list(entries: Iterable) -> AsyncIterator[BulkItem]:
+    """Convierte una lista ya decodificada (cadenas u objetos {id, text}) en BulkItems"""
+    for index, entry in enumerate(entries):
+        yield _parse_entry(index, entry)
+
+
+async def items_from_ndjson(chunks: AsyncIterable[bytes], max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[BulkItem]:
+    """
+    Lee un cuerpo NDJSON a medida que llega: una cadena JSON o un objeto
+    {"id": ..., "text": ...} por línea. Las líneas vacías se ignoran y las
+    de más de `max_line_bytes` se reportan como error sin decodificarlas.
+    """
+    buffer = b""
+    index = 0
+    skipping = False
+
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        while True:
+            newline = buffer.find(b"\n", start)
+            if newline < 0:
+                break
+            line = buffer[start:newline]
+            start = newline + 1
+            if skipping:
+                # Final de una línea demasiado larga que ya se reportó
+                skipping = False
+                continue
+            if len(line) > max_line_bytes:
+                yield BulkItem(index=index, error=f"Línea de más de {max_line_bytes} bytes")
+                index += 1
+            elif line.strip():
+                yield _parse_line(index, line)
+                index += 1
+        # Un único recorte por chunk en vez de copiar el resto en cada línea
+        buffer = buffer[start:]
+
+        if len(buffer) > max_line_bytes:
+            if not skipping:
+                yield BulkItem(index=index, error=f"Línea de más de {max_line_bytes} bytes")
+                index += 1
+                skipping = True
+            buffer = b""
+
+    if buffer.strip() and not skipping:
+        yield _parse_line(index, buffer)
+
+
+async def spool_upload(
+    chunks: AsyncIterable[bytes],
+    max_memory_bytes: int = 1024 * 1024,
+    max_bytes: int = 0
+) -> SpooledTemporaryFile:
+    """
+    Vuelca un cuerpo subido a un fichero temporal (en memoria hasta
+    `max_memory_bytes`, en disco a partir de ahí). Si pasa de `max_bytes`
+    (0 = sin límite) deja de leer, cierra el fichero y lanza UploadTooLarge.
+
+    La respuesta en streaming no puede leer el cuerpo de la petición mientras
+    se envía: el servidor ASGI usa el mismo canal para detectar desconexiones.
+    """
+    spool = SpooledTemporaryFile(max_size=max_memory_bytes)
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadTooLarge(max_bytes)
+            spool.write(chunk)
+    except BaseException:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
+
+
+async def read_spool(spool: SpooledTemporaryFile, chunk_size: int = 64 * 1024) -> AsyncIterator[bytes]:
+    """Relee un fichero de `spool_upload` por bloques y lo cierra al terminar"""
+    try:
+        while True:
+            chunk = spool.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        spool.close()
+
+
+def _parse_line(index: int, line: bytes) -> BulkItem:
+    try:
+        entry = json.loads(line)
+    except ValueError as e:
+        return BulkItem(index=index, error=f"JSON inválido: {e}")
+    return _parse_entry(index, entry)
+
+
+async def _chunked(items: AsyncIterable[BulkItem], size: int) -> AsyncIterator[List[BulkItem]]:
+    chunk: List[BulkItem] = []
+    async for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+async def _score_chunk(chunk: List[BulkItem], analyze_batch: BatchFn) -> List[BulkItem]:
+    pending = [item for item in chunk if item.error is None]
+    if not pending:
+        return chunk
+
+    try:
+        results = await analyze_batch([item.text for item in pending])
+    except Exception as e:
+        logger.error(f"Error procesando lote masivo de {len(pending)} textos: {str(e)}")
+        for item in pending:
+            item.error = str(e)
+        return chunk
+
+    if len(results) != len(pending):
+        error = f"Se esperaban {len(pending)} resultados y llegaron {len(results)}"
+        logger.error(f"Error procesando lote masivo: {error}")
+        for item in pending:
+            item.error = error
+        return chunk
+
+    for item, result in zip(pending, results):
+        item.result = result
+    return chunk
+
+
+async def stream_results(
+    items: AsyncIterable[BulkItem],
+    analyze_batch: BatchFn,
+    render: Optional[RenderFn],
+    validate: ValidateFn,
+    batch_size: int = 32,
+    max_in_flight: int = 1,
+    prepare: Optional[PrepareFn] = None,
+    encode: Optional[EncodeFn] = None
+) -> AsyncIterator[bytes]:
+    """
+    Puntúa los elementos en lotes de `batch_size` y emite una línea NDJSON por
+    elemento, en el orden de entrada, en cuanto termina cada lote.
+
+    Hasta `max_in_flight` lotes se procesan a la vez; como mucho esos lotes
+    viven en memoria, sea cual sea el tamaño total de la entrada. `prepare`
+    recibe cada lote ya puntuado antes de renderizarlo, para el trabajo que
+    conviene hacer de una vez por lote (p.ej. las recomendaciones). Con
+    `encode`, cada lote se emite como un único bloque codificado por `encode`
+    en vez de una línea por elemento con `render`.
+    """
+    def lines(chunk: List[BulkItem]) -> Iterable[bytes]:
+        if prepare is not None:
+            prepare(chunk)
+        if encode is not None:
+            return (encode(chunk),)
+        return ((render(item) + "\n").encode("utf-8") for item in chunk)
+
+    async def validated() -> AsyncIterator[BulkItem]:
+        async for item in items:
+            if item.error is None:
+                item.error = validate(item.text)
+            yield item
+
+    pending: Deque[asyncio.Task] = deque()
+    try:
+        async for chunk in _chunked(validated(), batch_size):
+            pending.append(asyncio.ensure_future(_score_chunk(chunk, analyze_batch)))
+            if len(pending) >= max_in_flight:
+                for line in lines(await pending.popleft()):
+                    yield line
+
+        while pending:
+            for line in lines(await pending.popleft()):
+                yield line
+    finally:
+        # Si el cliente se desconecta, no seguir puntuando lotes huérfanos
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,210 @@
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from collections import OrderedDict
+from dataclasses import dataclass
+import asyncio
+import logging
+import sys
+import time
+import unicodedata
+
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+CacheKey = Tuple[str, str]
+ComputeFn = Callable[[str], Awaitable[SentimentResult]]
+ComputeBatchFn = Callable[[List[str]], Awaitable[List[SentimentResult]]]
+
+
+def normalize_text(text: str) -> str:
+    """Forma canónica de un texto para la clave de caché: NFC y espacios colapsados"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def _estimate_bytes(key: CacheKey, result: SentimentResult) -> int:
+    # Aproximación del coste en memoria de una entrada; no hace falta exactitud,
+    # solo que el límite en bytes crezca con textos y resultados más grandes
+    size = sys.getsizeof(key[1]) + sys.getsizeof(result)
+    size += sys.getsizeof(result.emotions) + sum(sys.getsizeof(e) for e in result.emotions)
+    size += sys.getsizeof(result.raw_scores) + sum(sys.getsizeof(k) + 24 for k in result.raw_scores)
+    return size
+
+
+@dataclass
+class _Entry:
+    result: SentimentResult
+    size: int
+    expires_at: Optional[float]
+
+
+@dataclass
+class CacheStats:
+    """Contadores acumulados de la caché de resultados"""
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    evictions: int = 0
+    expirations: int = 0
+
+
+class ResultCache:
+    """
+    Caché LRU de SentimentResult por (modelo, texto normalizado).
+
+    Está acotada por número de entradas y por memoria estimada, con TTL
+    opcional. Las peticiones concurrentes del mismo texto comparten una única
+    inferencia en vuelo (single-flight). Solo se guarda el SentimentResult:
+    las recomendaciones se siguen calculando en cada petición.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_entries: int = 10000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: float = 0.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl_seconds if ttl_seconds > 0 else None
+        self.stats = CacheStats()
+        self._clock = clock
+        self._entries: "OrderedDict[CacheKey, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._in_flight: Dict[CacheKey, asyncio.Task] = {}
+        # Cuántos llamantes esperan cada inferencia en vuelo
+        self._waiters: Dict[CacheKey, int] = {}
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.max_bytes > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, text: str) -> CacheKey:
+        return (self.model_name, normalize_text(text))
+
+    def get(self, text: str) -> Optional[SentimentResult]:
+        key = self.key(text)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at is not None and entry.expires_at <= self._clock():
+            self._remove(key)
+            self.stats.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return entry.result
+
+    def put(self, text: str, result: SentimentResult) -> None:
+        if not self.enabled:
+            return
+        key = self.key(text)
+        if key in self._entries:
+            self._remove(key)
+        size = _estimate_bytes(key, result)
+        if size > self.max_bytes:
+            return
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        self._entries[key] = _Entry(result, size, expires_at)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.stats.evictions += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._bytes = 0
+
+    async def get_or_compute(self, text: str, compute: ComputeFn) -> SentimentResult:
+        """
+        Devuelve el resultado cacheado o lo calcula con `compute`. Si ya hay una
+        inferencia en vuelo para el mismo texto, espera a esa en vez de lanzar otra.
+
+        La inferencia compartida sigue mientras quede alguien esperándola: si
+        se cancelan todos los que la esperan (p.ej. clientes que se han
+        desconectado) se cancela también, y si aún estaba en la cola del
+        micro-batching no llega al modelo.
+        """
+        if not self.enabled:
+            return await compute(text)
+
+        cached = self.get(text)
+        if cached is not None:
+            self.stats.hits += 1
+            return cached
+
+        key = self.key(text)
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.stats.coalesced += 1
+        else:
+            self.stats.misses += 1
+            task = asyncio.ensure_future(compute(text))
+            self._in_flight[key] = task
+            self._waiters[key] = 0
+            task.add_done_callback(lambda done: self._finish(key, text, done))
+        self._waiters[key] += 1
+        try:
+            # shield: si un llamante se cancela, la inferencia compartida sigue para los demás
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if not task.done() and self._in_flight.get(key) is task:
+                self._waiters[key] -= 1
+                if not self._waiters[key]:
+                    task.cancel()
+            raise
+
+    def _finish(self, key: CacheKey, text: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+            self._waiters.pop(key, None)
+        # task.exception() también marca el error como recuperado
+        if not task.cancelled() and task.exception() is None:
+            self.put(text, task.result())
+
+    async def get_or_compute_many(self, texts: List[str], compute_batch: ComputeBatchFn) -> List[SentimentResult]:
+        """Variante por lotes: solo los textos que no están en caché van al modelo"""
+        if not self.enabled:
+            return await compute_batch(texts)
+
+        results: List[Optional[SentimentResult]] = [self.get(text) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        self.stats.hits += len(texts) - len(missing)
+        self.stats.misses += len(missing)
+
+        if missing:
+            computed = await compute_batch([texts[i] for i in missing])
+            if len(computed) != len(missing):
+                raise RuntimeError(f"Se esperaban {len(missing)} resultados y llegaron {len(computed)}")
+            for i, result in zip(missing, computed):
+                self.put(texts[i], result)
+                results[i] = result
+        return results
+
+    def snapshot(self) -> Dict:
+        lookups = self.stats.hits + self.stats.misses + self.stats.coalesced
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "ttl_seconds": self.ttl,
+            "in_flight": len(self._in_flight),
+            "hits": self.stats.hits,
+            "misses": self.stats.misses,
+            "coalesced": self.stats.coalesced,
+            "evictions": self.stats.evictions,
+            "expirations": self.stats.expirations,
+            "hit_rate": round((self.stats.hits + self.stats.coalesced) / lookups, 4) if lookups else 0.0,
+        }
+
+    def _remove(self, key: CacheKey) -> None:
+        entry = self._entries.pop(key)
+        self._bytes -= entry.size
@@ -0,0 +1,197 @@
+"""
+Cascada de clasificación: el léxico del idioma responde primero y solo los
+textos por debajo del umbral de confianza pasan al modelo.
+
+    python -m app.cascade --language es --texts textos.txt
+
+compara la cascada con el modelo solo sobre un fichero de textos (uno por
+línea) y barre varios umbrales para elegir SENTIFY_CASCADE_THRESHOLD.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+from collections import Counter
+import argparse
+import json
+import logging
+import sys
+
+from app.config import settings
+from app.lexicon import Lexicon, LexiconMatch, load_lexicons
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+TIERS = ("lexicon", "model")
+
+ComputeFn = Callable[[str], Awaitable[SentimentResult]]
+ComputeBatchFn = Callable[[List[str]], Awaitable[List[SentimentResult]]]
+
+DEFAULT_THRESHOLDS = (0.5, 0.6, 0.7, 0.8, 0.85, 0.9, 0.95)
+
+
+def normalize_language(language: Optional[str]) -> str:
+    return (language or "").strip().lower().split("-")[0].split("_")[0]
+
+
+def lexicon_result(match: LexiconMatch) -> SentimentResult:
+    """SentimentResult con la misma forma que el del modelo (scores por estrella)"""
+    rest = (1.0 - match.confidence) / 4
+    scores = [
+        {"label": f"{stars} star" + ("s" if stars > 1 else ""), "score": match.confidence if stars == match.stars else rest}
+        for stars in range(1, 6)
+    ]
+    return SentimentAnalyzer.build_result(scores)
+
+
+class SentimentCascade:
+    """
+    Clasificador por niveles delante del modelo.
+
+    `fast_path` devuelve el resultado del léxico del idioma si su confianza
+    llega a `threshold`, o None si el texto tiene que ir al modelo. Los
+    contadores por nivel e idioma permiten ver qué parte del tráfico se ahorra.
+    """
+
+    def __init__(self, lexicons: Dict[str, Lexicon], threshold: float = 0.85, enabled: bool = True):
+        self.lexicons = lexicons
+        self.threshold = threshold
+        self.enabled = enabled
+        self.hits: Counter = Counter()
+        self.by_language: Dict[str, Counter] = {}
+
+    def fast_path(self, text: str, language: Optional[str]) -> Optional[SentimentResult]:
+        if not self.enabled:
+            return None
+        lexicon = self.lexicons.get(normalize_language(language))
+        if lexicon is None:
+            return None
+        match = lexicon.match(text)
+        if match is None or match.confidence < self.threshold:
+            return None
+        return lexicon_result(match)
+
+    def _record(self, language: Optional[str], tier: str, count: int = 1) -> None:
+        if count:
+            self.hits[tier] += count
+            self.by_language.setdefault(normalize_language(language) or "?", Counter())[tier] += count
+
+    async def analyze(self, text: str, language: Optional[str], fallback: ComputeFn) -> SentimentResult:
+        result = self.fast_path(text, language)
+        if result is not None:
+            self._record(language, "lexicon")
+            return result
+        self._record(language, "model")
+        return await fallback(text)
+
+    async def analyze_many(self, texts: List[str], language: Optional[str], fallback_batch: ComputeBatchFn) -> List[SentimentResult]:
+        """Variante por lotes: solo los textos que el léxico no resuelve van a `fallback_batch`"""
+        results: List[Optional[SentimentResult]] = [self.fast_path(text, language) for text in texts]
+        missing = [i for i, result in enumerate(results) if result is None]
+        self._record(language, "lexicon", len(texts) - len(missing))
+        self._record(language, "model", len(missing))
+
+        if missing:
+            computed = await fallback_batch([texts[i] for i in missing])
+            if len(computed) != len(missing):
+                raise RuntimeError(f"Se esperaban {len(missing)} resultados y llegaron {len(computed)}")
+            for i, result in zip(missing, computed):
+                results[i] = result
+        return results
+
+    def snapshot(self) -> Dict:
+        total = sum(self.hits.values())
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "languages": sorted(self.lexicons),
+            "tiers": {tier: self.hits[tier] for tier in TIERS},
+            "hit_rate": {tier: round(self.hits[tier] / total, 4) if total else 0.0 for tier in TIERS},
+            "by_language": {language: dict(counts) for language, counts in self.by_language.items()},
+        }
+
+
+def _top_label(result: SentimentResult) -> Optional[str]:
+    return max(result.raw_scores, key=result.raw_scores.get) if result.raw_scores else None
+
+
+def agreement_report(
+    lexicon: Lexicon,
+    analyzer: SentimentAnalyzer,
+    texts: List[str],
+    thresholds: Sequence[float] = DEFAULT_THRESHOLDS,
+    batch_size: int = 16
+) -> Dict:
+    """
+    Compara la cascada con el modelo solo. Para cada umbral: qué fracción de
+    textos resuelve el léxico (`coverage`) y en cuántos de ellos coincide con el
+    modelo en sentimiento y en estrellas. Los textos que no resuelve el léxico
+    van al modelo en la cascada, así que coinciden por construcción.
+    """
+    reference: List[SentimentResult] = []
+    for start in range(0, len(texts), batch_size):
+        reference.extend(analyzer.analyze_batch(texts[start:start + batch_size]))
+    matches = [lexicon.match(text) for text in texts]
+    fast = [lexicon_result(match) if match is not None else None for match in matches]
+
+    sweep = []
+    for threshold in thresholds:
+        answered = [
+            i for i, match in enumerate(matches)
+            if match is not None and match.confidence >= threshold
+        ]
+        same_sentiment = sum(fast[i].sentiment == reference[i].sentiment for i in answered)
+        same_stars = sum(_top_label(fast[i]) == _top_label(reference[i]) for i in answered)
+        total = len(texts)
+        sweep.append({
+            "threshold": threshold,
+            "coverage": len(answered) / total if total else 0.0,
+            "lexicon_sentiment_agreement": same_sentiment / len(answered) if answered else 1.0,
+            "lexicon_star_agreement": same_stars / len(answered) if answered else 1.0,
+            "cascade_sentiment_agreement": (total - len(answered) + same_sentiment) / total if total else 1.0,
+        })
+
+    disagreements = [
+        {"text": text, "lexicon": fast[i].sentiment, "model": reference[i].sentiment,
+         "confidence": round(matches[i].confidence, 3)}
+        for i, text in enumerate(texts)
+        if fast[i] is not None and fast[i].sentiment != reference[i].sentiment
+    ]
+    disagreements.sort(key=lambda d: d["confidence"], reverse=True)
+    return {
+        "language": lexicon.language,
+        "texts": len(texts),
+        "matched": sum(match is not None for match in matches),
+        "thresholds": sweep,
+        # Los desacuerdos más confiados primero: son los que hay que revisar en el léxico
+        "disagreements": disagreements[:50],
+    }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.cascade", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--model", default=settings.model_name)
+    parser.add_argument("--language", default="es")
+    parser.add_argument("--lexicon", default=settings.lexicon_path or None, help="JSON con léxicos propios")
+    parser.add_argument("--texts", required=True, help="Fichero con un texto por línea")
+    parser.add_argument("--thresholds", type=float, nargs="+", default=list(DEFAULT_THRESHOLDS))
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    lexicons = load_lexicons(args.lexicon)
+    language = normalize_language(args.language)
+    if language not in lexicons:
+        parser.error(f"No hay léxico para {args.language!r} (disponibles: {', '.join(sorted(lexicons))})")
+    with open(args.texts, encoding="utf-8") as f:
+        texts = [line.strip() for line in f if line.strip()]
+
+    from app.lifecycle import analyzer_factory
+
+    # Con el motor y el directorio ONNX del modelo con los que lo cargaría el servicio
+    analyzer = analyzer_factory(settings)(args.model)
+    report = agreement_report(lexicons[language], analyzer, texts, thresholds=args.thresholds)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
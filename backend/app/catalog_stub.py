@@ -0,0 +1,103 @@
+"""
+Catálogo musical local con la forma de la API de Spotify, para desarrollo y
+pruebas sin red ni credenciales.
+
+    python -m app.catalog_stub --port 8090 --latency-ms 50 --failure-rate 0.1
+    SENTIFY_MUSIC_CATALOG_URL=http://localhost:8090 uvicorn app.main:app
+
+Sirve GET /v1/tracks?ids=... y POST /api/token con las canciones de un
+catálogo de recomendaciones (el incluido o uno JSON); los metadatos se
+inventan a partir del id, siempre los mismos. La latencia y la tasa de
+fallos permiten probar los timeouts y el circuit breaker del cliente.
+"""
+from typing import Dict, Optional
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+
+from fastapi import FastAPI, HTTPException, Query
+
+from app.music_catalog import track_id
+from app.recommendations import DEFAULT_CATALOG
+
+MAX_IDS = 50
+
+
+def catalog_tracks(data: Dict) -> Dict[str, Dict]:
+    """Objetos track de la API para las canciones de un catálogo con la forma de DEFAULT_CATALOG"""
+    tracks = {}
+    for category, entry in data["categories"].items():
+        for song in entry.get("songs", ()):
+            id_ = track_id(song.get("url"))
+            if id_ is None or id_ in tracks:
+                continue
+            seed = int(hashlib.sha1(id_.encode()).hexdigest()[:8], 16)
+            tracks[id_] = {
+                "id": id_,
+                "name": song["title"],
+                "artists": [{"name": song["artist"]}],
+                "album": {
+                    "name": f"{song['artist']} ({category})",
+                    "images": [{"url": f"https://i.scdn.co/image/{id_}", "width": 640, "height": 640}],
+                },
+                "duration_ms": 150000 + seed % 150000,
+                "preview_url": f"https://p.scdn.co/mp3-preview/{id_}",
+                "external_urls": {"spotify": f"https://open.spotify.com/track/{id_}"},
+            }
+    return tracks
+
+
+def create_app(catalog: Optional[Dict] = None, latency_ms: float = 0.0, failure_rate: float = 0.0,
+               seed: Optional[int] = None) -> FastAPI:
+    tracks = catalog_tracks(catalog or DEFAULT_CATALOG)
+    rng = random.Random(seed)
+    app = FastAPI(title="Catálogo musical local")
+    app.state.requests = 0
+    app.state.latency_ms = latency_ms
+    app.state.failure_rate = failure_rate
+
+    async def simulate() -> None:
+        app.state.requests += 1
+        if app.state.latency_ms > 0:
+            await asyncio.sleep(app.state.latency_ms / 1000.0)
+        if rng.random() < app.state.failure_rate:
+            raise HTTPException(status_code=503, detail="Fallo simulado")
+
+    @app.post("/api/token")
+    async def token():
+        await simulate()
+        return {"access_token": "stub-token", "token_type": "Bearer", "expires_in": 3600}
+
+    @app.get("/v1/tracks")
+    async def get_tracks(ids: str = Query(...)):
+        await simulate()
+        requested = [id_ for id_ in ids.split(",") if id_]
+        if len(requested) > MAX_IDS:
+            raise HTTPException(status_code=400, detail=f"Como mucho {MAX_IDS} ids")
+        return {"tracks": [tracks.get(id_) for id_ in requested]}
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    parser = argparse.ArgumentParser(prog="python -m app.catalog_stub", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--catalog", help="Catálogo JSON con la forma de DEFAULT_CATALOG (por defecto, el incluido)")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia añadida a cada petición")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Fracción de peticiones que responden 503")
+    args = parser.parse_args()
+
+    catalog = None
+    if args.catalog:
+        with open(args.catalog, encoding="utf-8") as f:
+            catalog = json.load(f)
+    uvicorn.run(create_app(catalog, args.latency_ms, args.failure_rate), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
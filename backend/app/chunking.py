@@ -0,0 +1,235 @@
+"""
+Documentos largos: ventanas de tokens solapadas y combinación de sus resultados.
+
+Un texto de más de una ventana (max_length del modelo menos los tokens
+especiales) se parte en ventanas de ese tamaño que se solapan
+`overlap_tokens`, para que una frase cortada en el borde se vea entera en
+alguna. Cada ventana se puntúa como un texto más (en los mismos lotes que los
+demás textos) y el documento se resume con la media de las distribuciones de
+las ventanas ponderada por los tokens que aporta cada una, de modo que cada
+token cuenta una sola vez aunque caiga en el solape.
+
+El texto se tokeniza por bloques de `BLOCK_CHARS` caracteres y las ventanas
+se generan a medida: el coste es lineal en la longitud del documento y la
+memoria no depende de ella más que por el propio texto.
+"""
+from typing import AsyncIterator, Awaitable, Callable, Deque, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from collections import deque
+from dataclasses import dataclass, field
+import re
+
+from app.sentiment_analyzer import POLARITY_LABELS, SentimentAnalyzer, SentimentResult
+
+
+BLOCK_CHARS = 16 * 1024
+DEFAULT_OVERLAP_TOKENS = 64
+
+Span = Tuple[int, int]
+SpansFn = Callable[[str], List[Span]]
+BatchFn = Callable[[List[str]], Awaitable[List[SentimentResult]]]
+
+_POLARITY_STARS = {-1: 1.5, 0: 3.0, 1: 4.5}
+_WHITESPACE = re.compile(r"\s")
+
+
+@dataclass
+class Window:
+    """Una ventana del documento: posición en caracteres, tokens y peso en la media"""
+    index: int
+    start: int
+    end: int
+    tokens: int
+    # Tokens que no estaban en la ventana anterior
+    weight: int
+
+
+def _spans(text: str, token_spans: SpansFn, block_chars: int) -> Iterator[Span]:
+    """Tokens de todo el texto, tokenizando por bloques cortados en un espacio"""
+    start = 0
+    while start < len(text):
+        end = min(len(text), start + block_chars)
+        if end < len(text):
+            # El último espacio del bloque, para no partir una palabra entre dos bloques
+            cut = next((i for i in range(end - 1, start, -1) if _WHITESPACE.match(text, i)), None)
+            end = cut + 1 if cut is not None else end
+        for token_start, token_end in token_spans(text[start:end]):
+            yield start + token_start, start + token_end
+        start = end
+
+
+def iter_windows(
+    text: str,
+    token_spans: SpansFn,
+    window_tokens: int,
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    block_chars: int = BLOCK_CHARS
+) -> Iterator[Window]:
+    """
+    Ventanas de `window_tokens` tokens que avanzan `window_tokens - overlap_tokens`.
+    La última se alinea con el final del texto (solapa más con la anterior) en
+    vez de quedarse corta. Un texto que cabe en una ventana da una sola.
+    """
+    step = max(1, window_tokens - max(0, overlap_tokens))
+    history: Deque[Span] = deque(maxlen=window_tokens)
+    fresh = 0
+    index = 0
+
+    def window(weight: int) -> Window:
+        return Window(index, history[0][0], history[-1][1], len(history), weight)
+
+    for span in _spans(text, token_spans, block_chars):
+        history.append(span)
+        fresh += 1
+        if (index == 0 and len(history) == window_tokens) or (index > 0 and fresh == step):
+            yield window(fresh)
+            index += 1
+            fresh = 0
+    if fresh and history:
+        yield window(fresh)
+
+
+def expected_stars(raw_scores: Dict[str, float]) -> Optional[float]:
+    """Estrellas esperadas (1-5) según la distribución de puntuaciones de un texto"""
+    total = weighted = 0.0
+    for label, score in raw_scores.items():
+        name = label.lower()
+        if name in POLARITY_LABELS:
+            stars = _POLARITY_STARS[POLARITY_LABELS[name]]
+        else:
+            digits = re.search(r"\d", name)
+            if digits is None:
+                continue
+            stars = float(digits.group())
+        total += score
+        weighted += score * stars
+    return weighted / total if total else None
+
+
+@dataclass
+class DocumentResult:
+    """Resultado de un documento: el combinado, las estrellas medias y el detalle por ventana"""
+    result: SentimentResult
+    stars: Optional[float]
+    tokens: int
+    segments: List[Dict] = field(default_factory=list)
+
+
+def segment_detail(window: Window, result: SentimentResult) -> Dict:
+    stars = expected_stars(result.raw_scores)
+    return {
+        "index": window.index,
+        "start": window.start,
+        "end": window.end,
+        "tokens": window.tokens,
+        "sentiment": result.sentiment,
+        "score": result.score,
+        "stars": round(stars, 3) if stars is not None else None,
+    }
+
+
+class DocumentScore:
+    """
+    Acumula los resultados de las ventanas de un documento (en cualquier
+    orden) y los combina: la distribución media ponderada por el peso de cada
+    ventana pasa por SentimentAnalyzer.build_result como la de un texto corto.
+    Con una sola ventana el resultado es el de esa ventana.
+
+    Al documento no se le aplica la regla de palabras muy negativas de los
+    textos cortos: una aparición en miles de palabras no lo decide; sí se
+    aplica dentro de cada ventana.
+    """
+
+    def __init__(self, keep_segments: bool = True):
+        self.keep_segments = keep_segments
+        self.segments: List[Dict] = []
+        self.tokens = 0
+        self._weight = 0
+        self._scores: Dict[str, float] = {}
+        self._stars = 0.0
+        self._stars_weight = 0
+        self._windows = 0
+        self._first: Optional[SentimentResult] = None
+
+    def add(self, window: Window, result: SentimentResult) -> Dict:
+        segment = segment_detail(window, result)
+        self._windows += 1
+        self._first = self._first or result
+        if self.keep_segments:
+            self.segments.append(segment)
+        self.tokens += window.weight
+        # Los resultados de error (sin puntuaciones) no cuentan en la media
+        if result.raw_scores:
+            self._weight += window.weight
+            for label, score in result.raw_scores.items():
+                self._scores[label] = self._scores.get(label, 0.0) + score * window.weight
+            if segment["stars"] is not None:
+                self._stars += segment["stars"] * window.weight
+                self._stars_weight += window.weight
+        return segment
+
+    def result(self) -> DocumentResult:
+        if self._windows == 1:
+            # Un texto que cabe en una ventana da lo mismo que analizarlo directamente
+            combined = self._first
+        elif not self._weight:
+            combined = SentimentAnalyzer._error_result()
+        else:
+            combined = SentimentAnalyzer.build_result(
+                [{"label": label, "score": total / self._weight} for label, total in self._scores.items()]
+            )
+        self.segments.sort(key=lambda segment: segment["index"])
+        stars = self._stars / self._stars_weight if self._stars_weight else None
+        return DocumentResult(combined, round(stars, 3) if stars is not None else None, self.tokens, self.segments)
+
+
+def analyze_documents(
+    analyzer: SentimentAnalyzer,
+    texts: Iterable[str],
+    overlap_tokens: int = DEFAULT_OVERLAP_TOKENS,
+    batch_size: int = 32,
+    keep_segments: bool = True
+) -> List[DocumentResult]:
+    """
+    Puntúa documentos de cualquier longitud con `analyzer`. Las ventanas de
+    todos los documentos se reparten en lotes compartidos de `batch_size`
+    (los textos cortos son una ventana más), y solo viven en memoria las de
+    un lote a la vez.
+    """
+    scores: List[DocumentScore] = []
+    batch: List[Tuple[int, str, Window]] = []
+
+    def flush() -> None:
+        results = analyzer.analyze_batch([window_text for _, window_text, _ in batch])
+        for (document, _, window), result in zip(batch, results):
+            scores[document].add(window, result)
+        batch.clear()
+
+    for document, text in enumerate(texts):
+        scores.append(DocumentScore(keep_segments))
+        for window in iter_windows(text, analyzer.backend.token_spans, analyzer.backend.window_tokens(), overlap_tokens):
+            batch.append((document, text[window.start:window.end], window))
+            if len(batch) == batch_size:
+                flush()
+    if batch:
+        flush()
+    return [score.result() for score in scores]
+
+
+async def score_windows(
+    text: str,
+    windows: Sequence[Tuple[int, int, int, int]],
+    analyze_batch: BatchFn,
+    score: DocumentScore,
+    group_size: int = 32
+) -> AsyncIterator[Dict]:
+    """
+    Puntúa las ventanas (inicio, fin, tokens, peso) de `text` con
+    `analyze_batch` (p.ej. BatchScheduler.run_batch) de `group_size` en
+    `group_size`, las acumula en `score` y emite el detalle de cada una, en
+    orden, en cuanto termina su grupo.
+    """
+    for offset in range(0, len(windows), group_size):
+        group = [Window(offset + i, *window) for i, window in enumerate(windows[offset:offset + group_size])]
+        results = await analyze_batch([text[window.start:window.end] for window in group])
+        for window, result in zip(group, results):
+            yield score.add(window, result)
@@ -0,0 +1,232 @@
+import os
+from dataclasses import dataclass
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value not in (None, "") else default
+
+
+def _env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value not in (None, "") else default
+
+
+def _env_str(name: str, default: str) -> str:
+    value = os.getenv(name)
+    return value if value not in (None, "") else default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+@dataclass(frozen=True)
+class Settings:
+    """Configuración del servicio, leída de variables de entorno SENTIFY_*"""
+    model_name: str = "nlptown/bert-base-multilingual-uncased-sentiment"
+
+    # Motor de inferencia ("transformers", "onnx" u "onnx-int8") y directorio
+    # del grafo exportado con `python -m app.onnx_tools export`. Los modelos de
+    # language_models usan cada uno `<onnx_dir>/<modelo>` (ver
+    # app.lifecycle.onnx_model_dir)
+    inference_backend: str = "transformers"
+    onnx_dir: str = "models/onnx"
+
+    # Modelo por idioma de la petición ("es=modelo,en=modelo"; el resto usa
+    # model_name), cargados bajo demanda. Con presupuesto (0 = sin límite) se
+    # descargan los menos usados cuando los pesos cargados lo superan
+    language_models: str = ""
+    model_memory_budget_mb: float = 0.0
+    # Modelos que /admin/models/preload puede cargar además del por defecto y
+    # los de language_models ("modelo-a,modelo-b")
+    allowed_models: str = ""
+
+    # Token de los endpoints /admin (cabecera X-Admin-Token); vacío = endpoints
+    # /admin desactivados (responden 404)
+    admin_token: str = ""
+
+    # Tokenización: longitud máxima en tokens y agrupado por longitud de los lotes
+    max_seq_length: int = 512
+    length_bucketing: bool = True
+    bucket_overhead_tokens: int = 64
+
+    # Cascada: el léxico del idioma responde los textos claros (confianza >=
+    # umbral) sin pasar por el modelo. Desactivada por defecto; conviene fijar
+    # el umbral con `python -m app.cascade` antes de activarla
+    cascade_enabled: bool = False
+    cascade_threshold: float = 0.85
+    lexicon_path: str = ""
+
+    # Catálogo de recomendaciones en JSON o SQLite (vacío = el incluido); se
+    # comprueba cada `catalog_reload_seconds` si cambió el fichero (0 = nunca)
+    catalog_path: str = ""
+    catalog_reload_seconds: float = 5.0
+
+    # Recomendaciones: "category" (por la emoción principal) o "vector" (vecinos
+    # más cercanos a la distribución completa de puntuaciones, ver app.mood)
+    recommendation_mode: str = "category"
+    recommendation_top_k: int = 1
+    recommendation_diversity: bool = True
+    recommendation_no_repeat: int = 0
+    recommendation_exploration: float = 0.02
+    recommendation_ann_threshold: int = 50000
+
+    # Arranque: warm-up del modelo y espera máxima de una petición mientras carga
+    warmup: bool = True
+    startup_wait_seconds: float = 30.0
+
+    # Micro-batching de inferencia
+    batch_max_size: int = 16
+    batch_max_wait_ms: float = 5.0
+
+    # Control de admisión de la cola de inferencia (0 = sin límite): textos
+    # sueltos esperando y su espera máxima (más allá, 503), y lotes masivos
+    # esperando y su espera máxima (más allá, 429)
+    admission_max_queue: int = 256
+    admission_max_wait_ms: float = 2000.0
+    admission_bulk_max_queue: int = 16
+    admission_bulk_max_wait_ms: float = 30000.0
+
+    # Pool de inferencia fuera del event loop ("thread" o "process")
+    inference_mode: str = "thread"
+    inference_workers: int = 1
+    torch_intra_op_threads: int = 0
+    torch_inter_op_threads: int = 0
+
+    # Perfil de ejecución calibrado por modelo (hilos, tamaño de lote y
+    # precisión, ver app.tuning): se aplica el de `runtime_profile_path` si lo
+    # hay; con `runtime_calibrate`, si falta se calibra al arrancar con el
+    # modelo ya cargado en el pool y se guarda
+    runtime_profile_path: str = ""
+    runtime_calibrate: bool = False
+    runtime_tolerance: float = 0.02
+
+    # Workers de `python -m app.prefork` (comparten un único modelo precargado)
+    prefork_workers: int = 2
+
+    # Endpoints masivos /sentify/batch, y tamaño máximo de una subida a
+    # /sentify/batch/stream (0 = sin límite)
+    bulk_batch_size: int = 32
+    bulk_max_upload_mb: float = 100.0
+
+    # Documentos largos (/sentify/document): tamaño máximo y solape en tokens
+    # entre ventanas consecutivas
+    document_max_chars: int = 200000
+    document_overlap_tokens: int = 64
+
+    # Análisis en vivo (/sentify/live): se analiza el último texto tras
+    # `live_debounce_ms` sin cambios, con un cubo de tokens por conexión
+    live_debounce_ms: float = 150.0
+    live_rate_per_second: float = 4.0
+    live_burst: int = 4
+
+    # Analítica en vivo (/analytics): cubetas por minuto y por hora que se
+    # conservan, y resultados que pueden esperar a agregarse (0 la desactiva).
+    # Se agregan en tandas de analytics_flush_batch para no bloquear el event loop
+    analytics_minute_buckets: int = 120
+    analytics_hour_buckets: int = 48
+    analytics_max_pending: int = 10000
+    analytics_flush_batch: int = 500
+
+    # Catálogo musical externo (API de Spotify o `python -m app.catalog_stub`)
+    # para completar las canciones recomendadas; sin URL no se usa. /sentify
+    # espera sus metadatos como mucho `music_catalog_budget_ms`
+    music_catalog_url: str = ""
+    music_catalog_token_url: str = ""
+    music_catalog_client_id: str = ""
+    music_catalog_client_secret: str = ""
+    music_catalog_timeout_seconds: float = 2.0
+    music_catalog_max_connections: int = 8
+    music_catalog_budget_ms: float = 30.0
+    music_catalog_cache_entries: int = 10000
+    music_catalog_cache_ttl_seconds: float = 3600.0
+    music_catalog_failure_threshold: int = 5
+    music_catalog_reset_seconds: float = 30.0
+
+    # Caché de resultados (0 entradas desactiva la caché, TTL 0 = sin caducidad)
+    cache_max_entries: int = 10000
+    cache_max_mb: float = 64.0
+    cache_ttl_seconds: float = 0.0
+
+    # Profiler de muestreo para peticiones lentas (0 lo desactiva): vuelca a
+    # `profile_dir` un perfil de cada petición que tarde más de `profile_slow_ms`
+    profile_slow_ms: float = 0.0
+    profile_dir: str = "profiles"
+    profile_interval_ms: float = 10.0
+
+    @classmethod
+    def from_env(cls) -> "Settings":
+        return cls(
+            model_name=_env_str("SENTIFY_MODEL_NAME", cls.model_name),
+            inference_backend=_env_str("SENTIFY_INFERENCE_BACKEND", cls.inference_backend),
+            onnx_dir=_env_str("SENTIFY_ONNX_DIR", cls.onnx_dir),
+            language_models=_env_str("SENTIFY_LANGUAGE_MODELS", cls.language_models),
+            model_memory_budget_mb=_env_float("SENTIFY_MODEL_MEMORY_BUDGET_MB", cls.model_memory_budget_mb),
+            allowed_models=_env_str("SENTIFY_ALLOWED_MODELS", cls.allowed_models),
+            admin_token=_env_str("SENTIFY_ADMIN_TOKEN", cls.admin_token),
+            max_seq_length=_env_int("SENTIFY_MAX_SEQ_LENGTH", cls.max_seq_length),
+            length_bucketing=_env_bool("SENTIFY_LENGTH_BUCKETING", cls.length_bucketing),
+            bucket_overhead_tokens=_env_int("SENTIFY_BUCKET_OVERHEAD_TOKENS", cls.bucket_overhead_tokens),
+            cascade_enabled=_env_bool("SENTIFY_CASCADE_ENABLED", cls.cascade_enabled),
+            cascade_threshold=_env_float("SENTIFY_CASCADE_THRESHOLD", cls.cascade_threshold),
+            lexicon_path=_env_str("SENTIFY_LEXICON_PATH", cls.lexicon_path),
+            catalog_path=_env_str("SENTIFY_CATALOG_PATH", cls.catalog_path),
+            catalog_reload_seconds=_env_float("SENTIFY_CATALOG_RELOAD_SECONDS", cls.catalog_reload_seconds),
+            recommendation_mode=_env_str("SENTIFY_RECOMMENDATION_MODE", cls.recommendation_mode),
+            recommendation_top_k=_env_int("SENTIFY_RECOMMENDATION_TOP_K", cls.recommendation_top_k),
+            recommendation_diversity=_env_bool("SENTIFY_RECOMMENDATION_DIVERSITY", cls.recommendation_diversity),
+            recommendation_no_repeat=_env_int("SENTIFY_RECOMMENDATION_NO_REPEAT", cls.recommendation_no_repeat),
+            recommendation_exploration=_env_float("SENTIFY_RECOMMENDATION_EXPLORATION", cls.recommendation_exploration),
+            recommendation_ann_threshold=_env_int("SENTIFY_RECOMMENDATION_ANN_THRESHOLD", cls.recommendation_ann_threshold),
+            warmup=_env_bool("SENTIFY_WARMUP", cls.warmup),
+            startup_wait_seconds=_env_float("SENTIFY_STARTUP_WAIT_SECONDS", cls.startup_wait_seconds),
+            batch_max_size=_env_int("SENTIFY_BATCH_MAX_SIZE", cls.batch_max_size),
+            batch_max_wait_ms=_env_float("SENTIFY_BATCH_MAX_WAIT_MS", cls.batch_max_wait_ms),
+            admission_max_queue=_env_int("SENTIFY_ADMISSION_MAX_QUEUE", cls.admission_max_queue),
+            admission_max_wait_ms=_env_float("SENTIFY_ADMISSION_MAX_WAIT_MS", cls.admission_max_wait_ms),
+            admission_bulk_max_queue=_env_int("SENTIFY_ADMISSION_BULK_MAX_QUEUE", cls.admission_bulk_max_queue),
+            admission_bulk_max_wait_ms=_env_float("SENTIFY_ADMISSION_BULK_MAX_WAIT_MS", cls.admission_bulk_max_wait_ms),
+            inference_mode=_env_str("SENTIFY_INFERENCE_MODE", cls.inference_mode),
+            inference_workers=_env_int("SENTIFY_INFERENCE_WORKERS", cls.inference_workers),
+            torch_intra_op_threads=_env_int("SENTIFY_TORCH_INTRA_OP_THREADS", cls.torch_intra_op_threads),
+            torch_inter_op_threads=_env_int("SENTIFY_TORCH_INTER_OP_THREADS", cls.torch_inter_op_threads),
+            runtime_profile_path=_env_str("SENTIFY_RUNTIME_PROFILE_PATH", cls.runtime_profile_path),
+            runtime_calibrate=_env_bool("SENTIFY_RUNTIME_CALIBRATE", cls.runtime_calibrate),
+            runtime_tolerance=_env_float("SENTIFY_RUNTIME_TOLERANCE", cls.runtime_tolerance),
+            prefork_workers=_env_int("SENTIFY_PREFORK_WORKERS", cls.prefork_workers),
+            bulk_batch_size=_env_int("SENTIFY_BULK_BATCH_SIZE", cls.bulk_batch_size),
+            bulk_max_upload_mb=_env_float("SENTIFY_BULK_MAX_UPLOAD_MB", cls.bulk_max_upload_mb),
+            document_max_chars=_env_int("SENTIFY_DOCUMENT_MAX_CHARS", cls.document_max_chars),
+            document_overlap_tokens=_env_int("SENTIFY_DOCUMENT_OVERLAP_TOKENS", cls.document_overlap_tokens),
+            live_debounce_ms=_env_float("SENTIFY_LIVE_DEBOUNCE_MS", cls.live_debounce_ms),
+            live_rate_per_second=_env_float("SENTIFY_LIVE_RATE_PER_SECOND", cls.live_rate_per_second),
+            live_burst=_env_int("SENTIFY_LIVE_BURST", cls.live_burst),
+            analytics_minute_buckets=_env_int("SENTIFY_ANALYTICS_MINUTE_BUCKETS", cls.analytics_minute_buckets),
+            analytics_hour_buckets=_env_int("SENTIFY_ANALYTICS_HOUR_BUCKETS", cls.analytics_hour_buckets),
+            analytics_max_pending=_env_int("SENTIFY_ANALYTICS_MAX_PENDING", cls.analytics_max_pending),
+            analytics_flush_batch=_env_int("SENTIFY_ANALYTICS_FLUSH_BATCH", cls.analytics_flush_batch),
+            music_catalog_url=_env_str("SENTIFY_MUSIC_CATALOG_URL", cls.music_catalog_url),
+            music_catalog_token_url=_env_str("SENTIFY_MUSIC_CATALOG_TOKEN_URL", cls.music_catalog_token_url),
+            music_catalog_client_id=_env_str("SENTIFY_MUSIC_CATALOG_CLIENT_ID", cls.music_catalog_client_id),
+            music_catalog_client_secret=_env_str("SENTIFY_MUSIC_CATALOG_CLIENT_SECRET", cls.music_catalog_client_secret),
+            music_catalog_timeout_seconds=_env_float("SENTIFY_MUSIC_CATALOG_TIMEOUT_SECONDS", cls.music_catalog_timeout_seconds),
+            music_catalog_max_connections=_env_int("SENTIFY_MUSIC_CATALOG_MAX_CONNECTIONS", cls.music_catalog_max_connections),
+            music_catalog_budget_ms=_env_float("SENTIFY_MUSIC_CATALOG_BUDGET_MS", cls.music_catalog_budget_ms),
+            music_catalog_cache_entries=_env_int("SENTIFY_MUSIC_CATALOG_CACHE_ENTRIES", cls.music_catalog_cache_entries),
+            music_catalog_cache_ttl_seconds=_env_float("SENTIFY_MUSIC_CATALOG_CACHE_TTL_SECONDS", cls.music_catalog_cache_ttl_seconds),
+            music_catalog_failure_threshold=_env_int("SENTIFY_MUSIC_CATALOG_FAILURE_THRESHOLD", cls.music_catalog_failure_threshold),
+            music_catalog_reset_seconds=_env_float("SENTIFY_MUSIC_CATALOG_RESET_SECONDS", cls.music_catalog_reset_seconds),
+            cache_max_entries=_env_int("SENTIFY_CACHE_MAX_ENTRIES", cls.cache_max_entries),
+            cache_max_mb=_env_float("SENTIFY_CACHE_MAX_MB", cls.cache_max_mb),
+            cache_ttl_seconds=_env_float("SENTIFY_CACHE_TTL_SECONDS", cls.cache_ttl_seconds),
+            profile_slow_ms=_env_float("SENTIFY_PROFILE_SLOW_MS", cls.profile_slow_ms),
+            profile_dir=_env_str("SENTIFY_PROFILE_DIR", cls.profile_dir),
+            profile_interval_ms=_env_float("SENTIFY_PROFILE_INTERVAL_MS", cls.profile_interval_ms),
+        )
+
+
+settings = Settings.from_env()
@@ -0,0 +1,182 @@
+"""
+Codificación de las respuestas de análisis sin pasar por pydantic.
+
+Los endpoints de análisis construyen el dict de la respuesta directamente
+desde el SentimentResult (`result_payload`) y lo codifican con orjson si está
+instalado, o con json si no. Con la cabecera Accept el cliente puede pedir
+un formato binario más compacto:
+
+- application/msgpack: MessagePack (necesita msgpack). En los lotes, un
+  objeto por resultado concatenados, como las líneas de NDJSON.
+- application/vnd.apache.arrow.stream: solo lotes, un stream IPC de Arrow con
+  un record batch por lote de análisis (necesita pyarrow). La recomendación
+  va como JSON en una columna de texto.
+
+Los formatos cuya librería no está instalada no se ofrecen, y si el cliente
+no acepta ninguno de los ofrecidos se responde en JSON (NDJSON en los lotes).
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence
+from datetime import datetime
+from importlib.util import find_spec
+import json
+
+from app.sentiment_analyzer import SentimentResult
+
+
+JSON = "application/json"
+NDJSON = "application/x-ndjson"
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+
+# Otros nombres con los que los clientes piden el mismo formato
+MEDIA_ALIASES = {
+    "application/x-msgpack": MSGPACK,
+    "application/vnd.msgpack": MSGPACK,
+}
+# Módulo que necesita cada formato opcional
+FORMAT_MODULES = {MSGPACK: "msgpack", ARROW: "pyarrow"}
+
+# Fin de un stream IPC de Arrow (marca de continuación y longitud 0)
+ARROW_EOS = b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+EncodeFn = Callable[[Dict], bytes]
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+try:
+    import orjson
+
+    JSON_ENCODER = "orjson"
+
+    def dumps(payload) -> bytes:
+        return orjson.dumps(payload, default=_json_default)
+except ImportError:
+    JSON_ENCODER = "json"
+
+    def dumps(payload) -> bytes:
+        return json.dumps(payload, ensure_ascii=False, separators=(",", ":"), default=_json_default).encode("utf-8")
+
+
+def available(media_type: str) -> bool:
+    module = FORMAT_MODULES.get(media_type)
+    return module is None or find_spec(module) is not None
+
+
+def negotiate(accept: Optional[str], offered: Sequence[str]) -> Optional[str]:
+    """
+    El formato de `offered` que prefiere la cabecera Accept (el primero si no
+    hay cabecera o empatan), o None si no acepta ninguno. Cada formato toma la
+    calidad del rango más específico que lo incluye, como en RFC 9110.
+    """
+    offered = [media for media in offered if available(media)]
+    if not accept:
+        return offered[0] if offered else None
+    ranges = []
+    for part in accept.split(","):
+        media, *params = [item.strip() for item in part.split(";")]
+        quality = 1.0
+        for param in params:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        media = media.lower()
+        ranges.append((MEDIA_ALIASES.get(media, media), quality))
+
+    best, best_quality = None, 0.0
+    for candidate in offered:
+        quality, specificity = 0.0, -1
+        for media, q in ranges:
+            if media == candidate:
+                level = 2
+            elif media.endswith("/*") and candidate.startswith(media[:-1]):
+                level = 1
+            elif media == "*/*":
+                level = 0
+            else:
+                continue
+            if level > specificity:
+                quality, specificity = q, level
+        if quality > best_quality:
+            best, best_quality = candidate, quality
+    return best
+
+
+def result_payload(result: SentimentResult, recommendation: Optional[Dict], timestamp: datetime) -> Dict:
+    """Los campos de SentifyResponse, sin validarlos otra vez"""
+    return {
+        "sentiment": result.sentiment,
+        "score": result.score,
+        "confidence": result.confidence,
+        "emotions": result.emotions,
+        "intensity": result.intensity,
+        "recommendation": recommendation,
+        "timestamp": timestamp,
+    }
+
+
+def encoder(media_type: str) -> EncodeFn:
+    """Codificación de una respuesta en `media_type` (JSON, NDJSON o MessagePack)"""
+    if media_type == MSGPACK:
+        import msgpack
+
+        packer = msgpack.Packer(default=_json_default, datetime=False)
+        return packer.pack
+    if media_type == NDJSON:
+        return lambda payload: dumps(payload) + b"\n"
+    return dumps
+
+
+class ArrowBatchEncoder:
+    """
+    Resultados de un lote como stream IPC de Arrow: el esquema con el primer
+    lote, un record batch por lote y la marca de fin con `close`.
+    """
+
+    def __init__(self):
+        try:
+            import pyarrow
+        except ImportError as e:
+            raise ImportError("La salida Arrow necesita 'pyarrow' (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self.schema = pyarrow.schema([
+            ("index", pyarrow.int64()),
+            ("id", pyarrow.string()),
+            ("error", pyarrow.string()),
+            ("sentiment", pyarrow.string()),
+            ("score", pyarrow.float64()),
+            ("confidence", pyarrow.float64()),
+            ("emotions", pyarrow.list_(pyarrow.string())),
+            ("intensity", pyarrow.string()),
+            ("recommendation", pyarrow.string()),
+            ("timestamp", pyarrow.timestamp("us")),
+        ])
+        self._started = False
+
+    def encode(self, rows: List[Dict]) -> bytes:
+        columns = {name: [row.get(name) for row in rows] for name in self.schema.names}
+        columns["recommendation"] = [
+            dumps(value).decode("utf-8") if value is not None else None for value in columns["recommendation"]
+        ]
+        batch = self._pa.RecordBatch.from_pydict(columns, schema=self.schema)
+        chunk = b"" if self._started else self.schema.serialize().to_pybytes()
+        self._started = True
+        return chunk + batch.serialize().to_pybytes()
+
+    def close(self) -> bytes:
+        chunk = b"" if self._started else self.schema.serialize().to_pybytes()
+        self._started = True
+        return chunk + ARROW_EOS
+
+
+def encode_rows(media_type: str) -> Callable[[Iterable[Dict]], bytes]:
+    """Codificador de lotes de filas para los endpoints masivos (NDJSON o MessagePack)"""
+    encode = encoder(media_type)
+    return lambda rows: b"".join(encode(row) for row in rows)
@@ -0,0 +1,257 @@
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+from app.metrics import collect_stages, drain_stages, observe_stages
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+INFERENCE_MODES = ("thread", "process")
+
+AnalyzerFactory = Callable[[str], SentimentAnalyzer]
+
+# Analizador propio de cada proceso del pool (solo en modo "process")
+_worker_analyzer: Optional[SentimentAnalyzer] = None
+_worker_barrier = None
+_worker_timings: Dict[str, float] = {}
+
+
+def configure_torch_threads(intra_op_threads: int = 0, inter_op_threads: int = 0) -> None:
+    """
+    Ajusta los hilos de torch. 0 deja el valor por defecto de torch.
+
+    Con varios workers en el mismo nodo conviene repartir los núcleos
+    (p.ej. núcleos / workers) para que no compitan entre sí.
+    """
+    import torch
+
+    if intra_op_threads > 0:
+        torch.set_num_threads(intra_op_threads)
+    if inter_op_threads > 0:
+        try:
+            torch.set_num_interop_threads(inter_op_threads)
+        except RuntimeError as e:
+            # Solo se puede fijar una vez y antes de cualquier trabajo paralelo
+            logger.warning(f"No se pudieron fijar los hilos inter-op de torch: {e}")
+
+
+def _load_and_warm_up(
+    analyzer_factory: AnalyzerFactory,
+    model_name: str,
+    warmup_batches: Sequence[Sequence[str]]
+) -> Tuple[SentimentAnalyzer, Dict[str, float]]:
+    started = time.perf_counter()
+    analyzer = analyzer_factory(model_name)
+    loaded = time.perf_counter()
+    # Las primeras pasadas reservan buffers y eligen kernels; hacerlas aquí
+    # evita que la primera petición real las pague
+    for batch in warmup_batches:
+        analyzer.analyze_batch(list(batch))
+    warmed = time.perf_counter()
+    return analyzer, {"load_s": loaded - started, "warmup_s": warmed - loaded}
+
+
+def _init_worker(
+    analyzer_factory: AnalyzerFactory,
+    model_name: str,
+    intra_op_threads: int,
+    inter_op_threads: int,
+    warmup_batches: Sequence[Sequence[str]],
+    barrier
+) -> None:
+    global _worker_analyzer, _worker_barrier, _worker_timings
+    _worker_barrier = barrier
+    configure_torch_threads(intra_op_threads, inter_op_threads)
+    _worker_analyzer, _worker_timings = _load_and_warm_up(analyzer_factory, model_name, warmup_batches)
+    # Las etapas de cada lote (tokenize, forward...) se devuelven al padre con
+    # sus resultados; el registro de métricas de este proceso no se publica
+    collect_stages()
+
+
+def _analyzer_memory(analyzer) -> int:
+    backend = getattr(analyzer, "backend", None)
+    return backend.memory_bytes() if backend is not None else 0
+
+
+def _worker_ready() -> Tuple[int, int, Dict[str, float], int]:
+    # El initializer ya cargó el modelo cuando esto se ejecuta. La barrera
+    # retiene cada ping hasta que todos los workers tienen uno, así que cada
+    # proceso del pool responde exactamente a uno
+    import torch
+
+    _worker_barrier.wait()
+    return os.getpid(), torch.get_num_threads(), _worker_timings, _analyzer_memory(_worker_analyzer)
+
+
+def _worker_analyze_batch(texts: List[str]) -> Tuple[List[SentimentResult], List[Tuple[str, float]]]:
+    return _worker_analyzer.analyze_batch(texts), drain_stages()
+
+
+def _worker_calibrate(options: Dict):
+    from app.tuning import calibrate
+
+    try:
+        return calibrate(_worker_analyzer, **options)
+    finally:
+        # Las pasadas de la calibración no son peticiones
+        drain_stages()
+
+
+def _configure_analyzer(analyzer, intra_op_threads: int, precision: str) -> None:
+    configure_torch_threads(intra_op_threads)
+    analyzer.backend.set_precision(precision)
+
+
+def _worker_configure(intra_op_threads: int, precision: str) -> Tuple[int, int]:
+    # Misma barrera que _worker_ready: cada proceso atiende exactamente una
+    import torch
+
+    _configure_analyzer(_worker_analyzer, intra_op_threads, precision)
+    _worker_barrier.wait()
+    return os.getpid(), torch.get_num_threads()
+
+
+def _worker_windows(text: str, overlap_tokens: int) -> List[Tuple[int, int, int, int]]:
+    # Solo viajan las posiciones, no el texto de cada ventana
+    return [(w.start, w.end, w.tokens, w.weight) for w in _worker_analyzer.windows(text, overlap_tokens)]
+
+
+class InferenceExecutor:
+    """
+    Ejecuta la inferencia del modelo fuera del event loop de asyncio.
+
+    - mode="thread": un único modelo compartido por un pool de hilos; torch
+      libera el GIL durante el forward, así que el loop sigue atendiendo I/O.
+    - mode="process": cada proceso del pool carga su propio modelo una vez.
+      Todos los procesos se arrancan (y cargan el modelo) en el constructor,
+      para que ninguna petición pague la carga.
+
+    `analyzer_factory` construye el analizador a partir del nombre del modelo;
+    en modo "process" tiene que ser serializable con pickle. Cada analizador
+    procesa `warmup_batches` antes de quedar disponible.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        mode: str = "thread",
+        workers: int = 1,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        analyzer_factory: AnalyzerFactory = SentimentAnalyzer,
+        warmup_batches: Sequence[Sequence[str]] = ()
+    ):
+        if mode not in INFERENCE_MODES:
+            raise ValueError(f"Modo de inferencia desconocido: {mode!r} (opciones: {', '.join(INFERENCE_MODES)})")
+        if workers < 1:
+            raise ValueError("workers debe ser >= 1")
+
+        self.model_name = model_name
+        self.mode = mode
+        self.workers = workers
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.analyzer: Optional[SentimentAnalyzer] = None
+        self._worker_threads: Dict[int, int] = {}
+        # Memoria de los pesos, sumando la copia de cada proceso en modo "process"
+        self.memory_bytes = 0
+        # Tiempos de carga de pesos y warm-up (el peor worker en modo "process")
+        self.timings: Dict[str, float] = {}
+        self._pool: Executor
+
+        logger.info(f"Inicializando InferenceExecutor: modo={mode}, workers={workers}")
+
+        if mode == "thread":
+            configure_torch_threads(intra_op_threads, inter_op_threads)
+            self.analyzer, self.timings = _load_and_warm_up(analyzer_factory, model_name, warmup_batches)
+            self.memory_bytes = _analyzer_memory(self.analyzer)
+            self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sentify-inference")
+        else:
+            # spawn en vez de fork: hacer fork de un proceso con torch/OpenMP
+            # ya inicializados puede bloquear los hilos del hijo
+            context = multiprocessing.get_context("spawn")
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(
+                    analyzer_factory, model_name, intra_op_threads, inter_op_threads,
+                    warmup_batches, context.Barrier(workers)
+                )
+            )
+            self._warm_up_processes()
+
+    def _warm_up_processes(self) -> None:
+        # Una tarea por worker: el pool arranca un proceso por cada tarea que
+        # no encuentra un worker libre, y la barrera impide que uno las atienda todas
+        pings = [self._pool.submit(_worker_ready) for _ in range(self.workers)]
+        replies = [ping.result() for ping in pings]
+        self._worker_threads = {pid: threads for pid, threads, _, _ in replies}
+        self.timings = {
+            phase: max(timings[phase] for _, _, timings, _ in replies)
+            for phase in ("load_s", "warmup_s")
+        }
+        self.memory_bytes = sum(memory for _, _, _, memory in replies)
+        logger.info(f"Pool de procesos listo: {len(self._worker_threads)} procesos con el modelo cargado")
+
+    def calibrate(self, **options):
+        """
+        Calibra (app.tuning.calibrate) con el modelo ya cargado: el del pool de
+        hilos o el de uno de los procesos, sin cargar otra copia. Solo debe
+        llamarse antes de atender peticiones.
+        """
+        if self.mode == "thread":
+            from app.tuning import calibrate
+
+            return calibrate(self.analyzer, **options)
+        return self._pool.submit(_worker_calibrate, options).result()
+
+    def configure(self, intra_op_threads: int, precision: str) -> None:
+        """Aplica hilos de torch y precisión a los modelos ya cargados (p.ej. tras calibrar)"""
+        self.intra_op_threads = intra_op_threads
+        if self.mode == "thread":
+            _configure_analyzer(self.analyzer, intra_op_threads, precision)
+            return
+        replies = [self._pool.submit(_worker_configure, intra_op_threads, precision) for _ in range(self.workers)]
+        self._worker_threads = dict(reply.result() for reply in replies)
+
+    async def analyze_batch(self, texts: List[str]) -> List[SentimentResult]:
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            return await loop.run_in_executor(self._pool, self.analyzer.analyze_batch, texts)
+        results, stages = await loop.run_in_executor(self._pool, _worker_analyze_batch, texts)
+        observe_stages(stages)
+        return results
+
+    async def windows(self, text: str, overlap_tokens: int = 64) -> List[Tuple[int, int, int, int]]:
+        """(inicio, fin, tokens, peso) de las ventanas de un documento largo (ver app.chunking)"""
+        loop = asyncio.get_running_loop()
+        if self.mode == "thread":
+            windows = await loop.run_in_executor(self._pool, self.analyzer.windows, text, overlap_tokens)
+            return [(w.start, w.end, w.tokens, w.weight) for w in windows]
+        return await loop.run_in_executor(self._pool, _worker_windows, text, overlap_tokens)
+
+    def snapshot(self) -> dict:
+        import torch
+
+        return {
+            "backend": getattr(getattr(self.analyzer, "backend", None), "name", None),
+            "mode": self.mode,
+            "workers": self.workers,
+            "memory_bytes": self.memory_bytes,
+            "intra_op_threads": self.intra_op_threads or None,
+            "inter_op_threads": self.inter_op_threads or None,
+            # Hilos efectivos de torch: los de este proceso en modo "thread",
+            # o los de cada worker (por pid) en modo "process"
+            "torch_threads": torch.get_num_threads() if self.mode == "thread" else dict(self._worker_threads)
+        }
+
+    def shutdown(self) -> None:
+        """Cancela el trabajo pendiente y espera a que terminen los workers"""
+        self._pool.shutdown(wait=True, cancel_futures=True)
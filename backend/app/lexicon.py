@@ -0,0 +1,170 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+from dataclasses import dataclass
+import json
+import re
+
+
+# Léxicos incluidos. Cada término (palabra o frase) lleva un peso de -2 a 2:
+# el signo es la polaridad y 2 marca las palabras "muy" positivas/negativas.
+# Se pueden ampliar o sustituir por idioma con un JSON (ver load_lexicons).
+DEFAULT_LEXICONS: Dict[str, Dict] = {
+    "es": {
+        "terms": {
+            "me encanta": 2, "encanta": 2, "encantó": 2, "excelente": 2, "increíble": 2,
+            "maravilloso": 2, "perfecto": 2, "fantástico": 2, "espectacular": 2, "genial": 2,
+            "lo mejor": 2, "feliz": 2, "amo": 2,
+            "bueno": 1, "buena": 1, "bien": 1, "me gusta": 1, "gusta": 1, "recomiendo": 1,
+            "contento": 1, "contenta": 1, "agradable": 1, "útil": 1, "rápido": 1, "gracias": 1,
+            "malo": -1, "mala": -1, "mal": -1, "lento": -1, "caro": -1, "roto": -1, "rota": -1,
+            "decepcionado": -1, "decepcionada": -1, "decepción": -1, "triste": -1, "problema": -1,
+            "falla": -1, "fallos": -1, "molesto": -1, "molesta": -1,
+            "odio": -2, "pésimo": -2, "pésima": -2, "basura": -2, "horrible": -2, "malísimo": -2,
+            "asco": -2, "terrible": -2, "lo peor": -2, "estafa": -2, "desastre": -2, "fatal": -2,
+        },
+        "negators": ["no", "nunca", "jamás", "ni", "nada", "tampoco", "sin"],
+        "intensifiers": {"muy": 1.5, "súper": 1.5, "super": 1.5, "bastante": 1.25, "totalmente": 1.5, "realmente": 1.25},
+    },
+    "en": {
+        "terms": {
+            "love": 2, "excellent": 2, "amazing": 2, "awesome": 2, "wonderful": 2, "perfect": 2,
+            "fantastic": 2, "outstanding": 2, "the best": 2, "brilliant": 2, "happy": 2,
+            "good": 1, "great": 1, "nice": 1, "like": 1, "recommend": 1, "useful": 1, "fast": 1,
+            "pleasant": 1, "thanks": 1, "glad": 1,
+            "bad": -1, "slow": -1, "expensive": -1, "broken": -1, "disappointed": -1, "disappointing": -1,
+            "sad": -1, "problem": -1, "late": -1, "annoying": -1, "poor": -1,
+            "hate": -2, "awful": -2, "terrible": -2, "horrible": -2, "worst": -2, "garbage": -2,
+            "scam": -2, "disaster": -2, "useless": -2, "disgusting": -2, "waste of money": -2,
+        },
+        "negators": ["not", "no", "never", "don't", "dont", "isn't", "isnt", "wasn't", "wasnt", "without", "nothing"],
+        "intensifiers": {"very": 1.5, "really": 1.25, "so": 1.25, "extremely": 1.5, "totally": 1.5},
+    },
+}
+
+# Palabras, con apóstrofos internos ("don't") para que los negadores ingleses casen
+_TOKEN_RE = re.compile(r"\w+(?:'\w+)?")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower())
+
+
+@dataclass
+class LexiconMatch:
+    """Resultado del léxico para un texto"""
+    stars: int
+    confidence: float
+    hits: int
+    positive: float
+    negative: float
+
+
+class Lexicon:
+    """
+    Clasificador por léxico de un idioma, en una sola pasada sobre los tokens.
+
+    Las frases se compilan en un diccionario por tupla de tokens y en cada
+    posición se prueba primero la más larga. Un negador invierte (y atenúa)
+    los términos de las `negation_window` palabras siguientes y un
+    intensificador multiplica el peso del siguiente término.
+
+    La confianza combina tres factores: pureza (todo el peso en una misma
+    polaridad), evidencia (más peso acumulado, más certeza) y cobertura (un
+    único término en un texto largo dice poco del conjunto).
+    """
+
+    def __init__(
+        self,
+        language: str,
+        terms: Dict[str, float],
+        negators: Iterable[str] = (),
+        intensifiers: Optional[Dict[str, float]] = None,
+        negation_window: int = 3,
+        negation_factor: float = 0.8,
+        tokens_per_hit: int = 8
+    ):
+        self.language = language
+        self.negators = frozenset(tokenize(" ".join(negators)))
+        self.intensifiers = {word.lower(): float(factor) for word, factor in (intensifiers or {}).items()}
+        self.negation_window = negation_window
+        self.negation_factor = negation_factor
+        self.tokens_per_hit = tokens_per_hit
+        self._phrases: Dict[Tuple[str, ...], float] = {}
+        for term, weight in terms.items():
+            key = tuple(tokenize(term))
+            if key:
+                self._phrases[key] = float(weight)
+        self._max_phrase = max((len(key) for key in self._phrases), default=1)
+
+    @classmethod
+    def from_dict(cls, language: str, data: Dict) -> "Lexicon":
+        return cls(
+            language,
+            data.get("terms", {}),
+            negators=data.get("negators", ()),
+            intensifiers=data.get("intensifiers"),
+            negation_window=data.get("negation_window", 3),
+            tokens_per_hit=data.get("tokens_per_hit", 8)
+        )
+
+    def __len__(self) -> int:
+        return len(self._phrases)
+
+    def match(self, text: str) -> Optional[LexiconMatch]:
+        """Estrellas (1-5) y confianza del texto, o None si no contiene ningún término"""
+        tokens = tokenize(text)
+        positive = negative = 0.0
+        hits = 0
+        negated_until = -1
+        boost = 1.0
+        i = 0
+        while i < len(tokens):
+            token = tokens[i]
+            if token in self.negators:
+                negated_until = i + self.negation_window
+                i += 1
+                continue
+            if token in self.intensifiers:
+                boost = self.intensifiers[token]
+                i += 1
+                continue
+
+            for size in range(min(self._max_phrase, len(tokens) - i), 0, -1):
+                weight = self._phrases.get(tuple(tokens[i:i + size]))
+                if weight is not None:
+                    weight *= boost
+                    if i <= negated_until:
+                        weight = -weight * self.negation_factor
+                    if weight > 0:
+                        positive += weight
+                    else:
+                        negative -= weight
+                    hits += 1
+                    i += size
+                    break
+            else:
+                i += 1
+            boost = 1.0
+
+        total = positive + negative
+        if total == 0:
+            return None
+
+        polarity = (positive - negative) / hits
+        stars = min(5, max(1, 3 + int(round(polarity))))
+        purity = abs(positive - negative) / total
+        evidence = 1.0 - 0.5 ** total
+        coverage = min(1.0, hits * self.tokens_per_hit / len(tokens))
+        return LexiconMatch(stars, purity * evidence * coverage, hits, positive, negative)
+
+
+def load_lexicons(path: Optional[str] = None) -> Dict[str, Lexicon]:
+    """
+    Léxicos por idioma. Un JSON en `path` con la forma de DEFAULT_LEXICONS
+    ({"es": {"terms": {...}, "negators": [...], "intensifiers": {...}}})
+    añade idiomas o sustituye los incluidos.
+    """
+    data = dict(DEFAULT_LEXICONS)
+    if path:
+        with open(path, encoding="utf-8") as f:
+            data.update(json.load(f))
+    return {language: Lexicon.from_dict(language, entry) for language, entry in data.items()}
@@ -0,0 +1,272 @@
+from typing import Callable, Dict, List, Optional
+from functools import partial
+import asyncio
+import importlib
+import logging
+import os
+import re
+import time
+
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+# Textos de warm-up de longitudes representativas (corto, medio y cercano al
+# máximo de 500 caracteres de SentifyRequest.text)
+WARMUP_TEXTS = [
+    "Me encanta.",
+    "El servicio fue correcto, aunque la entrega tardó un poco más de lo esperado y el paquete llegó algo dañado.",
+    ("Llevo varias semanas usando la aplicación y tengo sentimientos encontrados. "
+     "La interfaz es clara y las recomendaciones suelen acertar, pero a veces se queda "
+     "colgada al abrirla y tengo que reiniciarla. El soporte respondió rápido y con amabilidad, "
+     "aunque la solución que me dieron no funcionó del todo. En general la sigo recomendando, "
+     "pero espero que mejoren la estabilidad en las próximas versiones porque es lo que más "
+     "molesta en el día a día."),
+]
+
+
+# Analizador cargado antes de hacer fork de los workers (ver app.prefork)
+_preloaded: Optional[SentimentAnalyzer] = None
+_preloaded_timings: Dict[str, float] = {}
+
+
+class ModelNotReady(Exception):
+    """El modelo todavía no está cargado (o falló su carga)"""
+
+
+def warmup_batches(batch_size: int) -> List[List[str]]:
+    """Un lote de uno y un lote lleno por cada longitud representativa"""
+    batches = [[text] for text in WARMUP_TEXTS]
+    if batch_size > 1:
+        batches += [[text] * batch_size for text in WARMUP_TEXTS]
+    return batches
+
+
+def onnx_model_dir(onnx_dir: str, model_name: str, default_model: str) -> str:
+    """
+    Directorio del grafo ONNX de `model_name`: SENTIFY_ONNX_DIR para el modelo
+    por defecto y `<SENTIFY_ONNX_DIR>/<modelo>` (con / y demás caracteres
+    cambiados por "__") para los de SENTIFY_LANGUAGE_MODELS.
+    """
+    if model_name == default_model:
+        return onnx_dir
+    return os.path.join(onnx_dir, re.sub(r"[^A-Za-z0-9._-]+", "__", model_name))
+
+
+def _create_analyzer(model_name: str, onnx_dir: str, default_model: str, **kwargs) -> SentimentAnalyzer:
+    return SentimentAnalyzer(model_name, onnx_dir=onnx_model_dir(onnx_dir, model_name, default_model), **kwargs)
+
+
+def analyzer_factory(settings) -> partial:
+    """Construye el SentimentAnalyzer de `settings` a partir del nombre del modelo"""
+    # partial de una función del módulo es serializable, así que también sirve en modo "process"
+    return partial(
+        _create_analyzer,
+        onnx_dir=settings.onnx_dir,
+        default_model=settings.model_name,
+        backend=settings.inference_backend,
+        max_length=settings.max_seq_length,
+        bucketing=settings.length_bucketing,
+        bucket_overhead_tokens=settings.bucket_overhead_tokens
+    )
+
+
+def install_preloaded(analyzer: SentimentAnalyzer, timings: Dict[str, float]) -> None:
+    """
+    Hace que ModelRuntime use `analyzer` en vez de cargar el modelo. Pensado
+    para llamarse en el proceso padre antes del fork: los workers heredan los
+    pesos ya cargados y los comparten copy-on-write.
+    """
+    global _preloaded, _preloaded_timings
+    _preloaded = analyzer
+    _preloaded_timings = dict(timings)
+
+
+class ModelRuntime:
+    """
+    Carga del modelo en segundo plano durante el lifespan de la app.
+
+    `start` lanza la carga (imports de torch/transformers, pesos y warm-up) en
+    un hilo, así que la app atiende /health desde el primer momento; `ready`
+    solo pasa a True cuando el modelo ya está caliente. Las fases de arranque
+    quedan medidas en `timings`. Si hay un analizador precargado (modo
+    pre-fork) del modelo por defecto se reutiliza y solo se hace el warm-up.
+
+    `model_name` permite cargar otro modelo que el de `settings` (ver
+    app.registry) con el resto de la configuración igual.
+
+    Con SENTIFY_RUNTIME_PROFILE_PATH, antes de construir el pool se carga (o
+    calibra) el perfil de ejecución del modelo y sus hilos y precisión
+    sustituyen a los de `settings`; `on_ready` se llama en el event loop
+    cuando el modelo queda listo, p.ej. para aplicar su tamaño de lote.
+    """
+
+    def __init__(
+        self,
+        settings,
+        warmup: bool = True,
+        model_name: Optional[str] = None,
+        on_ready: Optional[Callable[[], None]] = None
+    ):
+        self.settings = settings
+        self.model_name = model_name or settings.model_name
+        self.warmup = warmup
+        self.on_ready = on_ready
+        self.executor = None
+        self.profile = None
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self._ready: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        # Se incrementa en cada shutdown: una carga de un ciclo anterior que
+        # termine tarde no debe instalarse en el actual
+        self._generation = 0
+
+    @property
+    def ready(self) -> bool:
+        return self.executor is not None
+
+    @property
+    def phase(self) -> str:
+        if self.ready:
+            return "ready"
+        if self.error is not None:
+            return "failed"
+        return "loading" if self._task is not None else "idle"
+
+    async def start(self) -> None:
+        if self._task is not None:
+            return
+        self.error = None
+        self._ready = asyncio.Event()
+        self._task = asyncio.get_running_loop().create_task(self._load(self._generation, self._ready))
+
+    async def _load(self, generation: int, ready: asyncio.Event) -> None:
+        # `ready` es el evento de este ciclo: tras un shutdown, self._ready es
+        # None o el del ciclo siguiente, que esta carga no debe tocar
+        try:
+            executor, profile, timings = await asyncio.to_thread(self._build_executor)
+            if generation != self._generation:
+                # La app se apagó mientras se cargaba el modelo
+                executor.shutdown()
+                return
+            self.executor, self.profile, self.timings = executor, profile, timings
+            if self.on_ready is not None:
+                self.on_ready()
+        except Exception as e:
+            logger.error(f"Error cargando el modelo {self.model_name}: {e}")
+            if generation == self._generation:
+                self.error = str(e)
+        finally:
+            ready.set()
+
+    def _build_executor(self):
+        """
+        Construye el pool sin tocar el estado del runtime: devuelve el
+        ejecutor, el perfil y los tiempos para que `_load` los instale solo si
+        la carga sigue siendo la del ciclo actual.
+        """
+        settings = self.settings
+        timings: Dict[str, float] = {}
+        started = time.perf_counter()
+        # El motor "stub" no usa transformers; torch sigue haciendo falta para
+        # fijar los hilos de inferencia
+        for module in ("torch",) if settings.inference_backend == "stub" else ("torch", "transformers"):
+            importlib.import_module(module)
+        from app.executor import InferenceExecutor
+        from app.tuning import resolve_profile
+        timings["import_s"] = time.perf_counter() - started
+
+        preloaded = _preloaded is not None and self.model_name == settings.model_name
+        profiled = time.perf_counter()
+        profile = resolve_profile(settings, self.model_name)
+        profile_s = time.perf_counter() - profiled
+        precision = profile.precision if profile is not None else "fp32"
+        intra_op_threads = profile.intra_op_threads if profile is not None else settings.torch_intra_op_threads
+        batch_size = profile.batch_size if profile is not None else settings.batch_max_size
+
+        mode, factory = settings.inference_mode, analyzer_factory(settings)
+        if precision != "fp32":
+            factory = partial(factory, precision=precision)
+        if preloaded:
+            # El modelo ya está en memoria (heredado del padre): un pool de
+            # procesos volvería a cargarlo, así que siempre se usan hilos
+            if profile is not None:
+                _preloaded.backend.set_precision(precision)
+            mode, factory = "thread", lambda model_name: _preloaded
+            timings.update(_preloaded_timings)
+
+        executor = InferenceExecutor(
+            self.model_name,
+            mode=mode,
+            workers=settings.inference_workers,
+            intra_op_threads=intra_op_threads,
+            inter_op_threads=settings.torch_inter_op_threads,
+            analyzer_factory=factory,
+            warmup_batches=warmup_batches(batch_size) if self.warmup else ()
+        )
+        # Sin perfil guardado se calibra con el modelo que el pool acaba de
+        # cargar, sin otra copia en memoria. Un worker de app.prefork no
+        # calibra: lo harían todos a la vez, compitiendo por los mismos núcleos
+        if profile is None and not preloaded:
+            profiled = time.perf_counter()
+            try:
+                profile = resolve_profile(settings, self.model_name, executor)
+                if profile is not None:
+                    executor.configure(profile.intra_op_threads, profile.precision)
+            except BaseException:
+                executor.shutdown()
+                raise
+            profile_s += time.perf_counter() - profiled
+        if settings.runtime_profile_path:
+            # Incluye la calibración si ha hecho falta
+            timings["profile_s"] = profile_s
+        if profile is not None:
+            logger.info(f"Perfil de ejecución de {self.model_name}: {profile.describe()}")
+        timings.update(executor.timings)
+        timings["total_s"] = time.perf_counter() - started
+        logger.info(f"Modelo {self.model_name} listo: " + ", ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+        return executor, profile, timings
+
+    async def wait_ready(self, timeout: float) -> None:
+        """Espera a que el modelo esté listo como mucho `timeout` segundos"""
+        if self.ready:
+            return
+        if self._ready is None:
+            raise ModelNotReady("El modelo no se ha empezado a cargar")
+        try:
+            await asyncio.wait_for(asyncio.shield(self._ready.wait()), timeout)
+        except asyncio.TimeoutError:
+            raise ModelNotReady("El modelo se está cargando")
+        if not self.ready:
+            raise ModelNotReady(f"La carga del modelo falló: {self.error}")
+
+    async def analyze_batch(self, texts: List[str]) -> List[SentimentResult]:
+        if not self.ready:
+            raise ModelNotReady("El modelo se está cargando")
+        return await self.executor.analyze_batch(texts)
+
+    async def windows(self, text: str, overlap_tokens: int):
+        if not self.ready:
+            raise ModelNotReady("El modelo se está cargando")
+        return await self.executor.windows(text, overlap_tokens)
+
+    def snapshot(self) -> Dict:
+        return {
+            "model": self.model_name,
+            "ready": self.ready,
+            "phase": self.phase,
+            "error": self.error,
+            "timings": {k: round(v, 3) for k, v in self.timings.items()},
+            "profile": self.profile.summary() if self.profile is not None else None,
+        }
+
+    def shutdown(self) -> None:
+        self._generation += 1
+        if self.executor is not None:
+            self.executor.shutdown()
+        self.executor = None
+        self.profile = None
+        self._task = None
+        self._ready = None
@@ -0,0 +1,189 @@
+"""
+Análisis en vivo mientras el usuario escribe (WebSocket /sentify/live).
+
+Cada conexión tiene una `LiveSession`. Los textos que envía el cliente solo
+sustituyen al pendiente: se analiza el último cuando lleva `debounce_ms` sin
+cambiar, y si llega uno nuevo mientras se analiza el anterior, el anterior se
+cancela (si aún estaba en la cola del micro-batching no llega al modelo) y su
+resultado no se envía. Cada conexión tiene como mucho un análisis en vuelo y
+un cubo de tokens (`rate_per_second`, `burst`), así que un cliente muy
+hablador solo consigue que sus textos se agrupen más, no más inferencia.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional
+from dataclasses import dataclass
+import asyncio
+import logging
+import time
+
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+AnalyzeFn = Callable[["LiveUpdate"], Awaitable[SentimentResult]]
+SendFn = Callable[[Dict[str, Any]], Awaitable[None]]
+RenderFn = Callable[["LiveUpdate", SentimentResult], Dict[str, Any]]
+
+
+@dataclass
+class LiveUpdate:
+    """Un texto enviado por el cliente; `seq` permite casar cada respuesta con su texto"""
+    seq: int
+    text: str
+    language: Optional[str] = "es"
+    include_recommendation: bool = True
+
+
+@dataclass
+class LiveStats:
+    """Contadores de todas las sesiones (`sessions` son las conexiones abiertas)"""
+    sessions: int = 0
+    updates: int = 0
+    analyzed: int = 0
+    # Textos sustituidos por otro antes de analizarse, o cancelados en vuelo
+    coalesced: int = 0
+    superseded: int = 0
+    # Iguales al último analizado: se responde sin inferencia
+    unchanged: int = 0
+    throttled: int = 0
+    errors: int = 0
+
+
+stats = LiveStats()
+
+
+class TokenBucket:
+    """`rate` análisis por segundo de media con ráfagas de hasta `burst`"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def delay(self) -> float:
+        """Segundos hasta que haya un token (0 si ya lo hay)"""
+        if self.rate <= 0:
+            return 0.0
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        if self.rate > 0:
+            self._refill()
+            self.tokens -= 1
+
+
+class LiveSession:
+    """
+    Estado de una conexión: el último texto recibido, el análisis en vuelo y
+    el último resultado enviado. `update` se llama por cada mensaje y `run`
+    es el bucle que analiza y envía hasta que se cierra la conexión.
+    """
+
+    def __init__(
+        self,
+        analyze: AnalyzeFn,
+        render: RenderFn,
+        send: SendFn,
+        debounce_ms: float = 150.0,
+        rate_per_second: float = 4.0,
+        burst: int = 4
+    ):
+        self.analyze = analyze
+        self.render = render
+        self.send = send
+        self.debounce = debounce_ms / 1000.0
+        self.bucket = TokenBucket(rate_per_second, burst)
+        self._pending: Optional[LiveUpdate] = None
+        self._changed = asyncio.Event()
+        self._updated_at = 0.0
+        self._in_flight: Optional[asyncio.Task] = None
+        self._last: Optional[LiveUpdate] = None
+        self._last_result: Optional[SentimentResult] = None
+
+    def update(self, update: LiveUpdate) -> None:
+        stats.updates += 1
+        if self._pending is not None:
+            stats.coalesced += 1
+        self._pending = update
+        self._updated_at = time.monotonic()
+        self._changed.set()
+        if self._in_flight is not None and not self._in_flight.done():
+            # El texto en análisis ya no es el último: no merece un forward
+            self._in_flight.cancel()
+
+    async def _next(self) -> LiveUpdate:
+        """Espera a un texto que lleve `debounce` sin cambiar y a que el cubo tenga un token"""
+        while True:
+            await self._changed.wait()
+            quiet = self._updated_at + self.debounce - time.monotonic()
+            if quiet > 0:
+                self._changed.clear()
+                try:
+                    # Si llega otro texto antes de tiempo se vuelve a esperar
+                    await asyncio.wait_for(self._changed.wait(), quiet)
+                    continue
+                except asyncio.TimeoutError:
+                    self._changed.set()
+            wait = self.bucket.delay()
+            if wait > 0:
+                stats.throttled += 1
+                # Mientras tanto los textos nuevos sustituyen al pendiente
+                await asyncio.sleep(wait)
+                continue
+            self._changed.clear()
+            update, self._pending = self._pending, None
+            if update is not None:
+                return update
+
+    def _same_as_last(self, update: LiveUpdate) -> bool:
+        last = self._last
+        return (
+            last is not None and self._last_result is not None
+            and (last.text, last.language, last.include_recommendation)
+            == (update.text, update.language, update.include_recommendation)
+        )
+
+    async def run(self) -> None:
+        stats.sessions += 1
+        try:
+            while True:
+                update = await self._next()
+                if self._same_as_last(update):
+                    # Mismo texto que el último analizado (p.ej. tras borrar y reescribir)
+                    stats.unchanged += 1
+                    await self.send(self.render(update, self._last_result))
+                    continue
+
+                self.bucket.take()
+                self._in_flight = asyncio.ensure_future(self.analyze(update))
+                try:
+                    result = await self._in_flight
+                except asyncio.CancelledError:
+                    if self._in_flight.cancelled() and not asyncio.current_task().cancelling():
+                        stats.superseded += 1
+                        continue
+                    raise
+                except Exception as e:
+                    stats.errors += 1
+                    logger.error(f"Error en análisis en vivo: {str(e)}")
+                    await self.send({"seq": update.seq, "error": str(e)})
+                    continue
+                finally:
+                    self._in_flight = None
+
+                stats.analyzed += 1
+                self._last, self._last_result = update, result
+                # Si mientras tanto llegó otro texto, este resultado ya está viejo
+                if self._pending is None:
+                    await self.send(self.render(update, result))
+        finally:
+            stats.sessions -= 1
+            if self._in_flight is not None:
+                self._in_flight.cancel()
@@ -1,17 +1,57 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse, Response
+from pydantic import BaseModel, Field, ValidationError
+from typing import Literal, Optional, List, Dict, Sequence, Union
+from contextlib import asynccontextmanager
+from dataclasses import asdict
+import asyncio
+import hmac
+import json
 import logging
 from datetime import datetime
+import os
+import resource
 
-from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+from app.sentiment_analyzer import SentimentResult
+from app.analytics import RollingAnalytics
+from app.batching import Overloaded
 from app.recommendations import RecommendationEngine
+from app.lifecycle import ModelNotReady
+from app.registry import ModelRegistry, ModelSlot
+from app.cascade import SentimentCascade
+from app.lexicon import load_lexicons
+from app.memory import process_memory
+from app.music_catalog import MusicCatalogClient
+from app.metrics import MetricsMiddleware, registry, stage, handler_started, handler_finished
+from app.profiling import SlowRequestProfiler
+from app import bulk, encoding, live
+from app.chunking import DocumentScore, score_windows
+from app.live import LiveSession, LiveUpdate
+from app.config import settings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Arranque: el modelo se carga en segundo plano; /ready indica cuándo está listo
+    await models.start()
+    analytics.start()
+    if profiler is not None:
+        profiler.start()
+    yield
+    # Apagado: vaciar los planificadores y liberar los workers (y sus modelos)
+    if profiler is not None:
+        profiler.stop()
+    await analytics.stop()
+    if music_catalog is not None:
+        await music_catalog.close()
+    await models.close()
+
 
 app = FastAPI(
     title="API de Sentify y Recomendación de Colores",
     description="API para análisis de sentimientos y servicios de recomendación de colores.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 logging.basicConfig(level=logging.INFO)
@@ -25,8 +65,75 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-analyzer = SentimentAnalyzer()
-recommender = RecommendationEngine()
+# Rutas que se etiquetan por separado en las métricas HTTP
+METRIC_PATHS = (
+    "/sentify", "/sentify/batch", "/sentify/batch/stream", "/sentify/document", "/sentify/live", "/analytics",
+    "/health", "/ready", "/stats", "/metrics", "/admin/models", "/admin/models/preload", "/admin/catalog/reload"
+)
+
+profiler = SlowRequestProfiler(
+    settings.profile_slow_ms,
+    output_dir=settings.profile_dir,
+    interval_ms=settings.profile_interval_ms
+) if settings.profile_slow_ms > 0 else None
+app.add_middleware(MetricsMiddleware, paths=METRIC_PATHS, profiler=profiler)
+
+# Un modelo (con su micro-batching y su caché) por idioma; runtime, batcher y
+# cache son los del modelo por defecto, que siempre está cargado
+models = ModelRegistry(settings, warmup=settings.warmup)
+runtime = models.default.runtime
+batcher = models.default.batcher
+cache = models.default.cache
+recommender = RecommendationEngine(
+    settings.catalog_path or None,
+    reload_seconds=settings.catalog_reload_seconds,
+    mode=settings.recommendation_mode,
+    top_k=settings.recommendation_top_k,
+    diversity=settings.recommendation_diversity,
+    no_repeat=settings.recommendation_no_repeat,
+    exploration=settings.recommendation_exploration,
+    ann_threshold=settings.recommendation_ann_threshold
+)
+cascade = SentimentCascade(
+    load_lexicons(settings.lexicon_path or None),
+    threshold=settings.cascade_threshold,
+    enabled=settings.cascade_enabled
+)
+# Los endpoints solo encolan cada resultado; se agrega en segundo plano
+analytics = RollingAnalytics(
+    minute_buckets=settings.analytics_minute_buckets,
+    hour_buckets=settings.analytics_hour_buckets,
+    max_pending=settings.analytics_max_pending,
+    flush_batch=settings.analytics_flush_batch
+)
+# Metadatos de las canciones recomendadas desde el catálogo externo, si hay uno
+music_catalog = MusicCatalogClient(
+    settings.music_catalog_url,
+    token_url=settings.music_catalog_token_url or None,
+    client_id=settings.music_catalog_client_id,
+    client_secret=settings.music_catalog_client_secret,
+    timeout_seconds=settings.music_catalog_timeout_seconds,
+    max_connections=settings.music_catalog_max_connections,
+    cache_entries=settings.music_catalog_cache_entries,
+    cache_ttl_seconds=settings.music_catalog_cache_ttl_seconds,
+    failure_threshold=settings.music_catalog_failure_threshold,
+    reset_seconds=settings.music_catalog_reset_seconds
+) if settings.music_catalog_url else None
+
+
+async def _enrich(recommendation: Optional[Dict]) -> Optional[Dict]:
+    """Canciones con los metadatos del catálogo externo que lleguen a tiempo; si no, las del catálogo propio"""
+    if music_catalog is None:
+        return recommendation
+    return await music_catalog.enrich(recommendation, settings.music_catalog_budget_ms / 1000.0)
+
+
+def _enrich_cached(recommendation: Optional[Dict]) -> Optional[Dict]:
+    """Como `_enrich` pero sin esperar: solo lo que ya está en caché (lotes, documentos y análisis en vivo)"""
+    if music_catalog is None:
+        return recommendation
+    return music_catalog.enrich_nowait(recommendation)
+
 
 class SentifyRequest(BaseModel):
     text: str = Field(..., max_length=500, min_length=3, example="Texto para analizar sentimiento.") 
@@ -68,6 +175,34 @@ class SentifyResponse(BaseModel):
     timestamp: datetime
 
 
+class SentifyBatchItem(BaseModel):
+    id: Optional[str] = Field(None, description="Identificador del llamante, se devuelve tal cual")
+    text: str
+
+
+class SentifyBatchRequest(BaseModel):
+    items: List[Union[str, SentifyBatchItem]] = Field(..., description="Textos a analizar, o objetos {id, text}")
+    language: Optional[str] = Field('es', description="Código de idioma (ej. 'es' para Español, 'en' para Inglés)")
+    include_recommendation: bool = Field(True, description="Incluir recomendaciones en cada resultado")
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "items": ["Me encanta este producto.", {"id": "c-42", "text": "No funciona nada."}],
+                "language": "es",
+                "include_recommendation": True
+            }
+        }
+
+
+class SentifyBatchResult(BaseModel):
+    """ One NDJSON line of a bulk response: a SentifyResponse or an inline error """
+    index: int
+    id: Optional[str] = None
+    result: Optional[SentifyResponse] = None
+    error: Optional[str] = None
+
+
 @app.get("/")
 async def root():
     """ Root endpoint to check API status """
@@ -77,7 +212,13 @@ async def root():
         "status": "running",
         "endpoints": {
             "health": "/health",
+            "ready": "/ready",
             "sentify": "/sentify",
+            "sentify-batch": "/sentify/batch",
+            "sentify-batch-stream": "/sentify/batch/stream",
+            "stats": "/stats",
+            "metrics": "/metrics",
+            "admin-models": "/admin/models",
             "color-recommendation": "/color-recommendation"
         }
     }
@@ -89,33 +230,645 @@ async def health_check():
     return {
         "status": "healthy", 
         "timestamp": datetime.utcnow(),
-        "service": "Mood Classifier API"
+        "service": "Mood Classifier API",
+        "model": runtime.phase
     }
 
 
+@app.get("/ready")
+async def readiness_check():
+    """ Readiness endpoint: 200 only once the model is loaded and warmed up """
+    return JSONResponse(
+        status_code=200 if runtime.ready else 503,
+        content=runtime.snapshot()
+    )
+
+
+@app.get("/stats")
+async def get_stats():
+    """ Runtime statistics used to tune inference """
+    return {
+        "batching": batcher.snapshot(),
+        "startup": runtime.snapshot(),
+        "inference": runtime.executor.snapshot() if runtime.ready else None,
+        "cache": cache.snapshot(),
+        "cascade": cascade.snapshot(),
+        "models": models.snapshot(),
+        "recommendations": recommender.snapshot(),
+        "live": asdict(live.stats),
+        "analytics": analytics.snapshot(),
+        "music_catalog": music_catalog.snapshot() if music_catalog is not None else None,
+        # Memoria de este worker: con app.prefork, "shared" incluye los pesos del modelo
+        "memory": {"pid": os.getpid(), **process_memory()}
+    }
+
+
+def _collect_metrics():
+    """Métricas que se leen de los snapshot en cada scrape de /metrics"""
+    slots = [({"model": slot.model_name}, slot) for slot in models.slots()]
+    batching = [(labels, slot.batcher.snapshot()) for labels, slot in slots]
+    yield "sentify_model_ready", "gauge", "1 si el modelo está cargado y caliente", [
+        (labels, float(slot.runtime.ready)) for labels, slot in slots
+    ]
+    yield "sentify_model_memory_bytes", "gauge", "Memoria de los pesos de cada modelo cargado", [
+        (labels, slot.memory_bytes) for labels, slot in slots
+    ]
+    yield "sentify_model_evictions", "counter", "Modelos descargados por presupuesto o desde /admin", [
+        ({}, models.evictions)
+    ]
+    yield "sentify_batches", "counter", "Lotes enviados al modelo por el micro-batching", [
+        (labels, stats["batches"]) for labels, stats in batching
+    ]
+    yield "sentify_batch_items", "counter", "Textos enviados al modelo por el micro-batching", [
+        (labels, stats["items"]) for labels, stats in batching
+    ]
+    yield "sentify_batch_failures", "counter", "Lotes cuyo forward falló", [
+        (labels, stats["failed_batches"]) for labels, stats in batching
+    ]
+    yield "sentify_batch_queue_depth", "gauge", "Textos esperando a formar lote", [
+        (labels, stats["queue_depth"]) for labels, stats in batching
+    ]
+    yield "sentify_batches_in_flight", "gauge", "Lotes en inferencia", [
+        (labels, stats["batches_in_flight"]) for labels, stats in batching
+    ]
+    yield "sentify_bulk_batches_waiting", "gauge", "Lotes masivos esperando un hueco de inferencia", [
+        (labels, stats["bulk_waiting"]) for labels, stats in batching
+    ]
+
+    caches = [(labels, slot.cache.snapshot()) for labels, slot in slots]
+    yield "sentify_cache_lookups", "counter", "Consultas a la caché de resultados por resultado", [
+        ({**labels, "result": outcome}, stats[outcome])
+        for labels, stats in caches for outcome in ("hits", "misses", "coalesced")
+    ]
+    yield "sentify_cache_evictions", "counter", "Entradas expulsadas de la caché", [
+        (labels, stats["evictions"]) for labels, stats in caches
+    ]
+    yield "sentify_cache_entries", "gauge", "Entradas en la caché de resultados", [
+        (labels, stats["entries"]) for labels, stats in caches
+    ]
+    yield "sentify_cache_bytes", "gauge", "Memoria estimada de la caché", [
+        (labels, stats["bytes"]) for labels, stats in caches
+    ]
+
+    tiers = cascade.snapshot()["tiers"]
+    yield "sentify_cascade_answers", "counter", "Textos resueltos por cada nivel de la cascada", [
+        ({"tier": tier}, count) for tier, count in tiers.items()
+    ]
+
+    live_stats = asdict(live.stats)
+    yield "sentify_live_sessions", "gauge", "Conexiones abiertas a /sentify/live", [({}, live_stats.pop("sessions"))]
+    yield "sentify_live_updates", "counter", "Textos recibidos por /sentify/live según su destino", [
+        ({"outcome": outcome}, count) for outcome, count in live_stats.items() if outcome != "updates"
+    ]
+
+    memory = process_memory()
+    yield "process_memory_bytes", "gauge", "Memoria del proceso (rss, pss, compartida y privada)", [
+        ({"kind": kind}, memory[kind]) for kind in ("rss", "pss", "shared", "private")
+    ]
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    yield "process_cpu_seconds", "counter", "Tiempo de CPU del proceso", [({}, usage.ru_utime + usage.ru_stime)]
+    if profiler is not None:
+        yield "sentify_slow_request_profiles", "counter", "Perfiles volcados por peticiones lentas", [({}, profiler.dumps)]
+
+
+registry.add_collector(_collect_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """ Prometheus metrics (text exposition format 0.0.4) """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/analytics")
+async def get_analytics(
+    resolution: Literal["minute", "hour"] = "minute",
+    buckets: int = Query(60, ge=1, le=1440, description="Cubetas más recientes a devolver"),
+    top: int = Query(5, ge=1, le=16, description="Emociones más frecuentes por cubeta")
+):
+    """
+    Rolling mood analytics of the analyzed texts (/sentify, batches and documents):
+    per-minute or per-hour series with the sentiment distribution, average score,
+    star quantiles and top emotions, plus a summary over the whole window. Built from
+    fixed-size aggregates, so the cost does not depend on the traffic history.
+    """
+    return analytics.query(resolution, buckets, top)
+
+
+async def _acquire_model(language: Optional[str]) -> ModelSlot:
+    # Durante el arranque (o la carga bajo demanda del modelo del idioma) las
+    # peticiones esperan un tiempo acotado al modelo
+    try:
+        return await models.acquire(language, settings.startup_wait_seconds)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+
+# Código de nginx para "el cliente cerró la conexión": solo se ve en las métricas
+CLIENT_CLOSED_REQUEST = 499
+
+
+def _overloaded(e: Overloaded) -> HTTPException:
+    # Un texto suelto rechazado es el servicio saturado (503); un lote masivo
+    # rechazado es el cliente pidiendo más de lo que cabe (429)
+    status_code = 503 if e.lane == "interactive" else 429
+    return HTTPException(status_code=status_code, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
+def _document_error(e: Exception) -> HTTPException:
+    """El error HTTP de un fallo puntuando las ventanas de un documento"""
+    if isinstance(e, Overloaded):
+        return _overloaded(e)
+    if isinstance(e, ModelNotReady):
+        # Modelo descargado o recargándose a mitad del documento
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    logger.error(f"Error processing document: {str(e)}")
+    return HTTPException(status_code=500, detail=str(e))
+
+
+def _admit_bulk(slot: ModelSlot) -> None:
+    """Rechaza de entrada (429) un trabajo masivo si su carril ya está lleno"""
+    try:
+        slot.batcher.admit("bulk")
+    except Overloaded as e:
+        models.release(slot)
+        raise _overloaded(e)
+
+
+async def _cancel_on_disconnect(request: Request, awaitable):
+    """
+    Espera `awaitable`, pero lo cancela si el cliente cierra la conexión antes:
+    un texto que aún estaba en la cola del micro-batching no llega al modelo.
+    """
+    work = asyncio.ensure_future(awaitable)
+
+    async def disconnected() -> None:
+        # El cuerpo ya está leído: lo siguiente que llega es la desconexión
+        while (await request.receive())["type"] != "http.disconnect":
+            pass
+
+    watcher = asyncio.ensure_future(disconnected())
+    try:
+        await asyncio.wait({work, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not work.done():
+            work.cancel()
+    if work.cancelled():
+        raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="El cliente cerró la conexión")
+    return work.result()
+
+
+def _negotiate(accept: Optional[str], offered: Sequence[str]) -> str:
+    """
+    Formato de la respuesta según Accept. Si el cliente no acepta ninguno de
+    los disponibles se responde en el primero de `offered` (JSON o NDJSON),
+    como antes de haber formatos binarios, en vez de un 406.
+    """
+    return encoding.negotiate(accept, offered) or offered[0]
+
+
 @app.post("/sentify", response_model=SentifyResponse)
-async def analyze_sentiment(request: SentifyRequest):
+async def analyze_sentiment(request: SentifyRequest, http_request: Request, accept: Optional[str] = Header(None)):
     """
-    Analyze text sentiment and provide recommendations
+    Analyze text sentiment and provide recommendations.
+    Responds 503 with Retry-After when the inference queue is saturated.
+    Send Accept: application/msgpack for a MessagePack body instead of JSON.
     """
+    media_type = _negotiate(accept, (encoding.JSON, encoding.MSGPACK))
+    handler_started()
+    slot = await _acquire_model(request.language)
     try:
-        result: SentimentResult = analyzer.analyze_text(request.text)
+        # Incluye la espera en la cola del micro-batching; el forward en sí es la etapa "forward"
+        with stage("analysis"):
+            result: SentimentResult = await _cancel_on_disconnect(http_request, cascade.analyze(
+                request.text,
+                request.language,
+                lambda text: slot.cache.get_or_compute(text, slot.batcher.submit)
+            ))
+        analytics.record(result)
         
-        recommendations = recommender.get_recommendations(result.emotions)
+        with stage("recommendation"):
+            recommendations = await _enrich(recommender.recommend(result))
         
-        return SentifyResponse(
+        handler_finished()
+        # El resultado ya es válido: se codifica directamente, sin pasar por SentifyResponse
+        payload = encoding.result_payload(result, recommendations, datetime.utcnow())
+        return Response(content=encoding.encoder(media_type)(payload), media_type=media_type)
+
+    except Overloaded as e:
+        raise _overloaded(e)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing request: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        models.release(slot)
+
+
+def _validate_bulk_text(text: str) -> Optional[str]:
+    try:
+        SentifyRequest(text=text)
+    except ValidationError as e:
+        return e.errors()[0]["msg"]
+    return None
+
+
+# Formatos de los endpoints masivos: application/json se responde como NDJSON
+BULK_FORMATS = (encoding.NDJSON, encoding.JSON, encoding.MSGPACK, encoding.ARROW)
+
+
+def _bulk_media_type(accept: Optional[str]) -> str:
+    media_type = _negotiate(accept, BULK_FORMATS)
+    return encoding.NDJSON if media_type == encoding.JSON else media_type
+
+
+def _bulk_response(items, slot: ModelSlot, language: Optional[str], include_recommendation: bool,
+                   media_type: str = encoding.NDJSON) -> StreamingResponse:
+    async def cached_run_batch(texts: List[str]) -> List[SentimentResult]:
+        return await slot.cache.get_or_compute_many(texts, slot.batcher.run_batch)
+
+    async def analyze_batch(texts: List[str]) -> List[SentimentResult]:
+        return await cascade.analyze_many(texts, language, cached_run_batch)
+
+    def row(item: bulk.BulkItem) -> Dict:
+        """Un SentifyBatchResult como dict, sin los campos vacíos"""
+        line = {"index": item.index}
+        if item.id is not None:
+            line["id"] = item.id
+        if item.result is not None:
+            analytics.record(item.result)
+            result = encoding.result_payload(item.result, item.recommendation, datetime.utcnow())
+            if result["recommendation"] is None:
+                del result["recommendation"]
+            line["result"] = result
+        if item.error is not None:
+            line["error"] = item.error
+        return line
+
+    def flat_row(item: bulk.BulkItem) -> Dict:
+        """Una fila de la tabla de Arrow: los campos del resultado al mismo nivel que index/id/error"""
+        line = {"index": item.index, "id": item.id, "error": item.error}
+        if item.result is not None:
+            analytics.record(item.result)
+            line.update(encoding.result_payload(item.result, item.recommendation, datetime.utcnow()))
+        return line
+
+    if media_type == encoding.ARROW:
+        arrow = encoding.ArrowBatchEncoder()
+        encode = lambda chunk: arrow.encode([flat_row(item) for item in chunk])
+    else:
+        encode_rows = encoding.encode_rows(media_type)
+        encode = lambda chunk: encode_rows(row(item) for item in chunk)
+
+    def recommend(chunk: List[bulk.BulkItem]) -> None:
+        # Una sola búsqueda para todo el lote en modo "vector"
+        scored = [item for item in chunk if item.result is not None]
+        for item, recommendation in zip(scored, recommender.recommend_many([item.result for item in scored])):
+            item.recommendation = _enrich_cached(recommendation)
+
+    async def lines():
+        # El modelo sigue en uso hasta que se emite la última línea
+        try:
+            async for line in bulk.stream_results(
+                items,
+                analyze_batch,
+                None,
+                _validate_bulk_text,
+                batch_size=settings.bulk_batch_size,
+                max_in_flight=settings.inference_workers,
+                prepare=recommend if include_recommendation else None,
+                encode=encode
+            ):
+                yield line
+            if media_type == encoding.ARROW:
+                yield arrow.close()
+        finally:
+            models.release(slot)
+
+    return StreamingResponse(lines(), media_type=media_type)
+
+
+@app.post("/sentify/batch", response_class=StreamingResponse)
+async def analyze_sentiment_batch(request: SentifyBatchRequest, accept: Optional[str] = Header(None)):
+    """
+    Analyze many texts in model-sized batches.
+    Results are streamed back as NDJSON (one SentifyBatchResult per line, in input order)
+    as soon as each batch finishes; invalid items are reported inline. Bulk work yields
+    to single-text requests and is rejected with 429 and Retry-After when its queue is full.
+    Accept: application/msgpack streams one MessagePack object per result instead, and
+    application/vnd.apache.arrow.stream an Arrow IPC stream with one record batch per batch.
+    """
+    media_type = _bulk_media_type(accept)
+    slot = await _acquire_model(request.language)
+    _admit_bulk(slot)
+    entries = (item if isinstance(item, str) else item.model_dump() for item in request.items)
+    return _bulk_response(bulk.items_from_list(entries), slot, request.language, request.include_recommendation, media_type)
+
+
+@app.post("/sentify/batch/stream", response_class=StreamingResponse)
+async def analyze_sentiment_batch_stream(
+    request: Request,
+    language: Optional[str] = 'es',
+    include_recommendation: bool = True,
+    accept: Optional[str] = Header(None)
+):
+    """
+    Same as /sentify/batch but takes an NDJSON upload (one JSON string or
+    {"id", "text"} object per line). The upload is spooled to a temporary file
+    and parsed line by line, so memory stays flat regardless of the input size.
+    Uploads over SENTIFY_BULK_MAX_UPLOAD_MB are rejected with 413.
+    """
+    media_type = _bulk_media_type(accept)
+    max_bytes = int(settings.bulk_max_upload_mb * 1024 * 1024)
+    declared = request.headers.get("content-length", "")
+    if max_bytes and declared.isdigit() and int(declared) > max_bytes:
+        raise HTTPException(status_code=413, detail=str(bulk.UploadTooLarge(max_bytes)))
+    # El modelo se reserva después de recibir la subida: un cliente lento no
+    # retiene su hueco (ni impide descargarlo) mientras envía
+    try:
+        spool = await bulk.spool_upload(request.stream(), max_bytes=max_bytes)
+    except bulk.UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    try:
+        slot = await _acquire_model(language)
+        _admit_bulk(slot)
+    except BaseException:
+        spool.close()
+        raise
+    return _bulk_response(bulk.items_from_ndjson(bulk.read_spool(spool)), slot, language, include_recommendation, media_type)
+
+
+class SentifyDocumentRequest(BaseModel):
+    text: str = Field(..., min_length=3, max_length=settings.document_max_chars, description="Documento de cualquier longitud hasta SENTIFY_DOCUMENT_MAX_CHARS")
+    language: Optional[str] = Field('es', description="Código de idioma (ej. 'es' para Español, 'en' para Inglés)")
+    include_segments: bool = Field(True, description="Incluir el resultado de cada ventana del documento")
+    include_recommendation: bool = Field(True, description="Incluir recomendaciones para el resultado combinado")
+    stream: bool = Field(False, description="Responder en NDJSON: una línea por ventana en cuanto se puntúa y el resultado al final")
+
+
+class DocumentSegment(BaseModel):
+    index: int
+    start: int
+    end: int
+    tokens: int
+    sentiment: str
+    score: float
+    stars: Optional[float] = None
+
+
+class SentifyDocumentResponse(SentifyResponse):
+    stars: Optional[float] = None
+    tokens: int
+    segments: Optional[List[DocumentSegment]] = None
+
+
+@app.post("/sentify/document")
+async def analyze_document(request: SentifyDocumentRequest):
+    """
+    Analyze a long document. The text is split into overlapping token windows that
+    are scored as bulk batches; the response combines them with a length-weighted
+    average and lists each window (segments). With stream=true the result is NDJSON:
+    one {"segment": ...} line per window as soon as it is scored, then a final
+    {"result": ...} line. Responds 429 with Retry-After when the bulk queue is full
+    and 503 with Retry-After when the model is not ready; once streaming, a failure
+    is reported as a final {"error", "status", "retry_after"} line.
+    """
+    slot = await _acquire_model(request.language)
+    _admit_bulk(slot)
+    try:
+        windows = await slot.runtime.windows(request.text, settings.document_overlap_tokens)
+    except ModelNotReady as e:
+        models.release(slot)
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except BaseException:
+        models.release(slot)
+        raise
+
+    score = DocumentScore(keep_segments=request.include_segments and not request.stream)
+    segments = score_windows(
+        request.text,
+        windows,
+        lambda texts: slot.cache.get_or_compute_many(texts, slot.batcher.run_batch),
+        score,
+        group_size=settings.bulk_batch_size
+    )
+
+    def response() -> SentifyDocumentResponse:
+        document = score.result()
+        result = document.result
+        analytics.record(result)
+        return SentifyDocumentResponse(
             sentiment=result.sentiment,
             score=result.score,
             confidence=result.confidence,
             emotions=result.emotions,
             intensity=result.intensity,
-            recommendation=recommendations, 
-            timestamp=datetime.utcnow()
+            recommendation=_enrich_cached(recommender.recommend(result)) if request.include_recommendation else None,
+            timestamp=datetime.utcnow(),
+            stars=document.stars,
+            tokens=document.tokens,
+            segments=document.segments if request.include_segments and not request.stream else None
+        )
+
+    if not request.stream:
+        try:
+            async for _ in segments:
+                pass
+            return response()
+        except Exception as e:
+            raise _document_error(e)
+        finally:
+            models.release(slot)
+
+    async def lines():
+        try:
+            async for segment in segments:
+                if request.include_segments:
+                    yield json.dumps({"segment": segment}, ensure_ascii=False) + "\n"
+            yield '{"result": ' + response().model_dump_json(exclude_none=True) + "}\n"
+        except Exception as e:
+            # La cabecera ya salió: el mismo error que sin stream, como última línea
+            error = _document_error(e)
+            line = {"error": error.detail, "status": error.status_code}
+            if error.headers:
+                line["retry_after"] = int(error.headers["Retry-After"])
+            yield json.dumps(line, ensure_ascii=False) + "\n"
+        finally:
+            models.release(slot)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+# Hasta este tamaño (el de SentifyRequest.text) un texto en vivo se analiza como
+# en /sentify; los más largos, por ventanas como en /sentify/document
+LIVE_SINGLE_TEXT_CHARS = 500
+
+
+def _parse_live_message(message: str, seq: int) -> Union[LiveUpdate, str]:
+    """Un mensaje del cliente: un objeto {text, language, include_recommendation, seq} o el texto tal cual"""
+    try:
+        data = json.loads(message)
+    except ValueError:
+        data = message
+    if isinstance(data, str):
+        data = {"text": data}
+    if not isinstance(data, dict) or not isinstance(data.get("text"), str):
+        return "Cada mensaje debe ser un texto o un objeto con 'text'"
+    text = data["text"]
+    if not 3 <= len(text) <= settings.document_max_chars:
+        return f"El texto debe tener entre 3 y {settings.document_max_chars} caracteres"
+    seq = data.get("seq", seq)
+    return LiveUpdate(
+        seq=seq if isinstance(seq, int) else 0,
+        text=text,
+        language=data.get("language", "es"),
+        include_recommendation=bool(data.get("include_recommendation", True))
+    )
+
+
+async def _live_analyze(update: LiveUpdate) -> SentimentResult:
+    slot = await models.acquire(update.language, settings.startup_wait_seconds)
+    try:
+        # Cancelable: si llega otro texto, este sale de la cola del micro-batching
+        async def compute(text: str) -> SentimentResult:
+            return await slot.cache.get_or_compute(text, slot.batcher.submit)
+
+        async def compute_many(texts: List[str]) -> List[SentimentResult]:
+            # Texto a texto, en el carril interactivo
+            return list(await asyncio.gather(*(compute(text) for text in texts)))
+
+        if len(update.text) <= LIVE_SINGLE_TEXT_CHARS:
+            return await cascade.analyze(update.text, update.language, compute)
+        # Al escribir al final de un texto largo sus primeras ventanas no cambian
+        # y salen de la caché: solo se puntúan las del final
+        windows = await slot.runtime.windows(update.text, settings.document_overlap_tokens)
+        score = DocumentScore(keep_segments=False)
+        async for _ in score_windows(update.text, windows, compute_many, score, group_size=settings.bulk_batch_size):
+            pass
+        return score.result().result
+    finally:
+        models.release(slot)
+
+
+def _live_render(update: LiveUpdate, result: SentimentResult) -> Dict:
+    response = SentifyResponse(
+        sentiment=result.sentiment,
+        score=result.score,
+        confidence=result.confidence,
+        emotions=result.emotions,
+        intensity=result.intensity,
+        recommendation=_enrich_cached(recommender.recommend(result)) if update.include_recommendation else None,
+        timestamp=datetime.utcnow()
+    )
+    return {"seq": update.seq, "result": response.model_dump(mode="json")}
+
+
+@app.websocket("/sentify/live")
+async def live_analysis(websocket: WebSocket):
+    """
+    Live analysis while the user types. Send the text on every change, either as a
+    bare text frame or as {"text", "language", "include_recommendation", "seq"}.
+    The server waits until the text stops changing, analyzes only the latest one
+    (dropping superseded texts, even in flight) and pushes {"seq", "result"} with a
+    SentifyResponse, or {"seq", "error"}. Each connection is rate limited.
+    """
+    await websocket.accept()
+    session = LiveSession(
+        _live_analyze,
+        _live_render,
+        websocket.send_json,
+        debounce_ms=settings.live_debounce_ms,
+        rate_per_second=settings.live_rate_per_second,
+        burst=settings.live_burst
+    )
+    runner = asyncio.create_task(session.run())
+    received = 0
+    try:
+        while True:
+            message = await websocket.receive_text()
+            received += 1
+            update = _parse_live_message(message, received)
+            if isinstance(update, str):
+                await websocket.send_json({"seq": received, "error": update})
+                continue
+            session.update(update)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        runner.cancel()
+        try:
+            await runner
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            # p.ej. enviar un resultado cuando el cliente ya había cerrado
+            logger.warning(f"Sesión en vivo terminada con error: {str(e)}")
+
+
+class PreloadModelRequest(BaseModel):
+    model: Optional[str] = Field(None, description="Nombre o ruta del modelo a cargar")
+    language: Optional[str] = Field(None, description="Cargar el modelo configurado para este idioma")
+
+
+async def _require_admin(x_admin_token: Optional[str] = Header(None)):
+    # Sin SENTIFY_ADMIN_TOKEN los endpoints /admin no existen
+    if not settings.admin_token:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest((x_admin_token or "").encode("utf-8"), settings.admin_token.encode("utf-8")):
+        raise HTTPException(status_code=401, detail="Token de administración inválido")
+
+
+@app.get("/admin/models", dependencies=[Depends(_require_admin)])
+async def list_models():
+    """ Loaded models (least recently used first), their memory and language routes """
+    return models.snapshot()
+
+
+@app.post("/admin/models/preload", dependencies=[Depends(_require_admin)])
+async def preload_model(request: PreloadModelRequest):
+    """ Load a model (by name, or the one routed for a language) and wait until it is warm """
+    if not request.model and not request.language:
+        raise HTTPException(status_code=422, detail="Indica model o language")
+    model_name = request.model or models.model_for(request.language)
+    if not models.is_allowed(model_name):
+        raise HTTPException(
+            status_code=403,
+            detail=f"El modelo {model_name} no está permitido (SENTIFY_LANGUAGE_MODELS o SENTIFY_ALLOWED_MODELS)"
         )
+    try:
+        slot = await models.preload(model_name, settings.startup_wait_seconds)
+    except ModelNotReady as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    return slot.snapshot()
+
+
+@app.delete("/admin/models/{model_name:path}", dependencies=[Depends(_require_admin)])
+async def evict_model(model_name: str):
+    """ Unload a model; the default model and models serving requests cannot be evicted """
+    try:
+        evicted = await models.evict(model_name)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if not evicted:
+        raise HTTPException(status_code=404, detail=f"El modelo {model_name} no está cargado")
+    return models.snapshot()
 
+
+@app.post("/admin/catalog/reload", dependencies=[Depends(_require_admin)])
+async def reload_catalog():
+    """ Reload the recommendation catalog from SENTIFY_CATALOG_PATH without a restart """
+    if not recommender.path:
+        raise HTTPException(status_code=409, detail="No hay un catálogo externo configurado (SENTIFY_CATALOG_PATH)")
+    try:
+        # La carga de un catálogo grande no debe bloquear el event loop
+        await asyncio.to_thread(recommender.reload)
     except Exception as e:
-        logger.error(f"Error processing request: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=422, detail=f"Catálogo inválido: {e}")
+    return recommender.snapshot()
 
 
 @app.get("/api/v1/emotions")
@@ -0,0 +1,57 @@
+from typing import Dict, Iterable, Union
+import os
+import resource
+
+
+# Campos de /proc/<pid>/smaps_rollup que se reportan, en bytes
+_SMAPS_FIELDS = {
+    "Rss": "rss",
+    "Pss": "pss",
+    "Shared_Clean": "shared",
+    "Shared_Dirty": "shared",
+    "Private_Clean": "private",
+    "Private_Dirty": "private",
+    "Swap": "swap",
+}
+
+
+def process_memory(pid: Union[int, str] = "self") -> Dict[str, int]:
+    """
+    Memoria de un proceso en bytes: residente (`rss`), compartida con otros
+    procesos (`shared`), privada (`private`) y proporcional (`pss`, la parte
+    compartida dividida entre los procesos que la usan).
+
+    Sumar `pss` de varios workers da la memoria real que ocupan juntos; sumar
+    `rss` cuenta varias veces las páginas compartidas. Fuera de Linux solo se
+    conoce el pico de memoria residente del propio proceso.
+    """
+    memory = {"rss": 0, "pss": 0, "shared": 0, "private": 0, "swap": 0}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                name, _, value = line.partition(":")
+                field = _SMAPS_FIELDS.get(name)
+                if field is not None:
+                    memory[field] += int(value.split()[0]) * 1024
+    except OSError:
+        if pid not in ("self", os.getpid()):
+            raise
+        # ru_maxrss está en KiB en Linux (y en bytes en macOS, donde no hay smaps)
+        memory["rss"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    return memory
+
+
+def memory_report(pids: Iterable[int]) -> Dict:
+    """Memoria por proceso y totales; `pss` total frente a `rss` total mide lo compartido"""
+    processes = {}
+    for pid in pids:
+        try:
+            processes[pid] = process_memory(pid)
+        except OSError:
+            # El proceso terminó entre listar los pids y leer su memoria
+            continue
+    totals = {
+        field: sum(memory[field] for memory in processes.values())
+        for field in ("rss", "pss", "shared", "private")
+    }
+    return {"processes": processes, "totals": totals}
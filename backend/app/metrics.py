@@ -0,0 +1,321 @@
+"""
+Métricas del servicio en formato de texto de Prometheus.
+
+Los histogramas y contadores del camino caliente (etapas de cada petición,
+peticiones en vuelo) se actualizan al momento; el resto (lotes, caché,
+memoria del proceso) se lee de sus `snapshot` solo cuando se consulta /metrics,
+así que no cuesta nada entre scrapes.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import threading
+import time
+
+
+# Buckets de latencia en segundos: de 0,5 ms (postproceso) a 10 s (lotes grandes en CPU)
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+# (nombre, tipo, ayuda, [(etiquetas, valor)]) de una familia de métricas
+Family = Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]
+Collector = Callable[[], Iterable[Family]]
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        # Las etapas de inferencia se observan desde los hilos del pool
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Labels:
+        return tuple((name, str(labels[name])) for name in self.labelnames)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name + "_total", dict(key), value) for key, value in self._values.items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        with self._lock:
+            return [(self.name, dict(key), value) for key, value in self._values.items()]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Por etiquetas: cuentas por bucket (no acumuladas; la última es +Inf), suma y total
+        self._values: Dict[Labels, List] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def count(self, **labels) -> int:
+        entry = self._values.get(self._key(labels))
+        return entry[2] if entry else 0
+
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        with self._lock:
+            for key, (counts, total, count) in self._values.items():
+                labels = dict(key)
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += bucket_count
+                    samples.append((self.name + "_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+                samples.append((self.name + "_sum", labels, total))
+                samples.append((self.name + "_count", labels, count))
+        return samples
+
+
+class Registry:
+    """Métricas propias más colectores que se evalúan en cada scrape"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._collectors: List[Collector] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self.register(Gauge(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            for name, kind, help, samples in collector():
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                suffix = "_total" if kind == "counter" else ""
+                for labels, value in samples:
+                    lines.append(f"{name}{suffix}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    "sentify_stage_seconds",
+    "Duración de cada etapa del procesamiento de una petición",
+    ["stage"]
+)
+REQUEST_SECONDS = registry.histogram(
+    "sentify_request_seconds",
+    "Duración total de las peticiones HTTP",
+    ["path", "status"]
+)
+REQUESTS_IN_FLIGHT = registry.gauge(
+    "sentify_requests_in_flight",
+    "Peticiones HTTP en curso",
+    ["path"]
+)
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "sentify_queue_wait_seconds",
+    "Espera en la cola de inferencia hasta entrar en un lote, por carril",
+    ["lane"]
+)
+REQUESTS_SHED = registry.counter(
+    "sentify_requests_shed",
+    "Peticiones rechazadas por la cola de inferencia saturada",
+    ["lane", "reason"]
+)
+
+
+# En los procesos del pool de inferencia (modo "process") nadie lee el
+# registro: las etapas se acumulan aquí y viajan al padre con cada resultado
+_stage_buffer: Optional[List[Tuple[str, float]]] = None
+
+
+@contextmanager
+def stage(name: str):
+    """Mide el bloque como la etapa `name` de sentify_stage_seconds"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        if _stage_buffer is not None:
+            _stage_buffer.append((name, time.perf_counter() - started))
+        else:
+            STAGE_SECONDS.observe(time.perf_counter() - started, stage=name)
+
+
+def collect_stages() -> None:
+    """A partir de ahora las etapas de este proceso se acumulan para `drain_stages`"""
+    global _stage_buffer
+    _stage_buffer = []
+
+
+def drain_stages() -> List[Tuple[str, float]]:
+    """Las etapas acumuladas desde la última llamada, como (etapa, segundos)"""
+    if _stage_buffer is None:
+        return []
+    stages = list(_stage_buffer)
+    _stage_buffer.clear()
+    return stages
+
+
+def observe_stages(stages: Iterable[Tuple[str, float]]) -> None:
+    """Registra en este proceso las etapas medidas en otro (ver `drain_stages`)"""
+    for name, seconds in stages:
+        STAGE_SECONDS.observe(seconds, stage=name)
+
+
+class RequestTrace:
+    """Marcas de tiempo de la petición en curso, para las etapas que rodean al handler"""
+    __slots__ = ("started", "handler_done")
+
+    def __init__(self, started: float):
+        self.started = started
+        self.handler_done: Optional[float] = None
+
+
+_current_trace: ContextVar[Optional[RequestTrace]] = ContextVar("sentify_request_trace", default=None)
+
+
+def handler_started() -> None:
+    """
+    Llamar al entrar en el handler: el tiempo desde que llegó la petición es la
+    etapa "validation" (lectura del cuerpo, JSON y validación de pydantic).
+    """
+    trace = _current_trace.get()
+    if trace is not None:
+        STAGE_SECONDS.observe(time.perf_counter() - trace.started, stage="validation")
+
+
+def handler_finished() -> None:
+    """Llamar al salir del handler: lo que falte hasta la respuesta es "serialization" """
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.handler_done = time.perf_counter()
+
+
+class MetricsMiddleware:
+    """
+    Middleware ASGI: peticiones en vuelo y duración por ruta y estado, y la
+    etapa de serialización (del final del handler al inicio de la respuesta).
+
+    `profiler` (opcional) recibe cada petición terminada para decidir si
+    volcar un perfil por lenta.
+    """
+
+    def __init__(self, app, paths: Sequence[str] = (), profiler=None):
+        self.app = app
+        # Solo las rutas conocidas como etiqueta; el resto se agrupa para no
+        # crear una serie por cada URL que pruebe un cliente
+        self.paths = frozenset(paths)
+        self.profiler = profiler
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "websocket":
+            # Solo sesiones abiertas: su duración no es una latencia
+            path = scope["path"] if scope["path"] in self.paths else "other"
+            REQUESTS_IN_FLIGHT.inc(path=path)
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                REQUESTS_IN_FLIGHT.dec(path=path)
+            return
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"] if scope["path"] in self.paths else "other"
+        trace = RequestTrace(time.perf_counter())
+        token = _current_trace.set(trace)
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if trace.handler_done is not None:
+                    STAGE_SECONDS.observe(time.perf_counter() - trace.handler_done, stage="serialization")
+            await send(message)
+
+        REQUESTS_IN_FLIGHT.inc(path=path)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finished = time.perf_counter()
+            REQUESTS_IN_FLIGHT.dec(path=path)
+            REQUEST_SECONDS.observe(finished - trace.started, path=path, status=str(status))
+            _current_trace.reset(token)
+            if self.profiler is not None:
+                self.profiler.request_finished(scope["path"], trace.started, finished)
@@ -0,0 +1,249 @@
+"""
+Espacio de "mood" para las recomendaciones por similitud.
+
+Un mood es la distribución de probabilidad sobre 1-5 estrellas más la
+intensidad. Los resultados del análisis se proyectan ahí desde sus
+`raw_scores`, y cada elemento del catálogo lleva su propio vector (o el de su
+categoría). Recomendar es buscar los vecinos más cercanos por coseno con
+NumPy: un producto de matrices para todo un lote de resultados. Con catálogos
+grandes se usa un índice IVF (k-means sobre los vectores y búsqueda solo en
+las listas más cercanas), que es aproximado pero no recorre todo el catálogo.
+"""
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+import numpy as np
+
+from app.sentiment_analyzer import POLARITY_LABELS, SentimentResult
+
+
+STARS = 5
+DIMENSIONS = STARS + 1
+# La intensidad pesa menos que la distribución de estrellas en la similitud
+INTENSITY_WEIGHT = 0.5
+INTENSITY_LEVELS = {"Baja": 0.25, "Media": 0.5, "Alta": 0.75, "Extrema": 1.0}
+
+# Mood de cada categoría del catálogo: ([P(1 estrella) .. P(5 estrellas)], intensidad).
+# Es el de los elementos que no traen uno propio
+CATEGORY_MOODS: Dict[str, Tuple[Sequence[float], float]] = {
+    "alegría": ((0.0, 0.0, 0.05, 0.35, 0.6), 0.9),
+    "tristeza": ((0.35, 0.45, 0.15, 0.05, 0.0), 0.6),
+    "enojo": ((0.6, 0.3, 0.1, 0.0, 0.0), 1.0),
+    "miedo": ((0.3, 0.4, 0.25, 0.05, 0.0), 0.7),
+    "neutral": ((0.05, 0.15, 0.6, 0.15, 0.05), 0.4),
+}
+_NEUTRAL_MOOD = CATEGORY_MOODS["neutral"]
+
+# Con la polaridad de los modelos de 3 clases, la probabilidad se reparte entre sus estrellas
+_POLARITY_STARS = {-1: (0, 1), 0: (2,), 1: (3, 4)}
+
+
+def mood_vector(stars: Sequence[float], intensity: float) -> np.ndarray:
+    """Vector normalizado (norma 1) de una distribución por estrellas y una intensidad en [0, 1]"""
+    vector = np.zeros(DIMENSIONS, dtype=np.float32)
+    vector[:STARS] = stars
+    vector[STARS] = intensity * INTENSITY_WEIGHT
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+def category_mood(category: str) -> np.ndarray:
+    return mood_vector(*CATEGORY_MOODS.get(category, _NEUTRAL_MOOD))
+
+
+def _star_index(label: str) -> Tuple[int, ...]:
+    """Posiciones (0-4) de las estrellas a las que corresponde una etiqueta del modelo"""
+    label = label.lower()
+    if label in POLARITY_LABELS:
+        return _POLARITY_STARS[POLARITY_LABELS[label]]
+    digits = [c for c in label if c.isdigit()]
+    if digits and 1 <= int(digits[0]) <= STARS:
+        return (int(digits[0]) - 1,)
+    return ()
+
+
+# Las etiquetas de un modelo son siempre las mismas: se resuelven una vez
+_LABEL_STARS: Dict[str, Tuple[int, ...]] = {}
+
+
+def _mood_row(result: SentimentResult) -> List[float]:
+    """Estrellas e intensidad sin normalizar; sin puntuaciones (p.ej. un error) es el neutral"""
+    row = [0.0] * DIMENSIONS
+    for label, score in (result.raw_scores or {}).items():
+        positions = _LABEL_STARS.get(label)
+        if positions is None:
+            positions = _LABEL_STARS[label] = _star_index(label)
+        for position in positions:
+            row[position] += score / len(positions)
+    total = sum(row)
+    if total <= 0:
+        stars, intensity = _NEUTRAL_MOOD
+        return [*stars, intensity * INTENSITY_WEIGHT]
+    row = [value / total for value in row]
+    row[STARS] = INTENSITY_LEVELS.get(result.intensity, 0.5) * INTENSITY_WEIGHT
+    return row
+
+
+def result_mood(result: SentimentResult) -> np.ndarray:
+    return result_moods([result])[0]
+
+
+def result_moods(results: Iterable[SentimentResult]) -> np.ndarray:
+    """Matriz (n, DIMENSIONS) con el mood normalizado de cada resultado"""
+    moods = np.array([_mood_row(result) for result in results], dtype=np.float32).reshape(-1, DIMENSIONS)
+    return moods / np.linalg.norm(moods, axis=1, keepdims=True)
+
+
+def _kmeans(vectors: np.ndarray, clusters: int, rng: np.random.Generator, iterations: int = 10) -> np.ndarray:
+    """Centroides (normalizados) de k-means esférico sobre una muestra de los vectores"""
+    sample = vectors[rng.choice(len(vectors), size=min(len(vectors), clusters * 64), replace=False)]
+    centroids = sample[rng.choice(len(sample), size=clusters, replace=False)]
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, sample)
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        # Un centroide sin puntos se queda donde estaba
+        centroids = np.where(norms > 0, sums / np.maximum(norms, 1e-12), centroids)
+    return centroids.astype(np.float32)
+
+
+class MoodIndex:
+    """
+    Vecinos más cercanos por coseno sobre los vectores de mood de un catálogo.
+
+    Hasta `ann_threshold` elementos la búsqueda es exacta (una multiplicación
+    de matrices por bloques de consultas). Por encima se agrupan los vectores
+    en ~sqrt(n) listas con k-means y cada consulta solo mira sus `nprobe`
+    listas más cercanas; las consultas que comparten listas se resuelven juntas.
+
+    `groups` (opcional) identifica el artista o autor de cada elemento para
+    la diversidad: con `diverse=True` no se repite grupo en un mismo top-k.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        groups: Optional[np.ndarray] = None,
+        ann_threshold: int = 50000,
+        nprobe: int = 4,
+        seed: int = 0
+    ):
+        self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        self.groups = groups
+        self.nprobe = nprobe
+        self.centroids: Optional[np.ndarray] = None
+        self._lists: List[np.ndarray] = []
+        if len(self.vectors) > ann_threshold:
+            rng = np.random.default_rng(seed)
+            self.centroids = _kmeans(self.vectors, max(nprobe, int(np.sqrt(len(self.vectors)))), rng)
+            assignment = np.empty(len(self.vectors), dtype=np.int32)
+            # Por bloques para no materializar una matriz (n, listas) entera
+            for start in range(0, len(self.vectors), 65536):
+                block = self.vectors[start:start + 65536]
+                assignment[start:start + len(block)] = np.argmax(block @ self.centroids.T, axis=1)
+            order = np.argsort(assignment, kind="stable")
+            bounds = np.searchsorted(assignment[order], np.arange(len(self.centroids) + 1))
+            self._lists = [order[bounds[i]:bounds[i + 1]] for i in range(len(self.centroids))]
+
+    def __len__(self) -> int:
+        return len(self.vectors)
+
+    @property
+    def approximate(self) -> bool:
+        return self.centroids is not None
+
+    @property
+    def nbytes(self) -> int:
+        size = self.vectors.nbytes + (self.groups.nbytes if self.groups is not None else 0)
+        if self.centroids is not None:
+            size += self.centroids.nbytes + sum(ids.nbytes for ids in self._lists)
+        return size
+
+    def _candidates(self, queries: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Índices (b, count) de los `count` más similares de cada consulta, y su similitud"""
+        if self.centroids is None:
+            return self._top(queries, None, count)
+        indices = np.empty((len(queries), count), dtype=np.int64)
+        scores = np.full((len(queries), count), -np.inf, dtype=np.float32)
+        probes = np.argsort(-(queries @ self.centroids.T), axis=1)[:, :self.nprobe]
+        probes.sort(axis=1)
+        # Los moods de los resultados se parecen mucho entre sí: pocas
+        # combinaciones de listas cubren casi todo un lote
+        keys, inverse = np.unique(probes, axis=0, return_inverse=True)
+        for key, members in zip(keys, (np.flatnonzero(inverse.ravel() == i) for i in range(len(keys)))):
+            ids = np.concatenate([self._lists[probe] for probe in key])
+            found, found_scores = self._top(queries[members], ids, min(count, len(ids)))
+            indices[members, :found.shape[1]] = found
+            scores[members, :found.shape[1]] = found_scores
+            indices[members, found.shape[1]:] = -1
+        return indices, scores
+
+    def _top(self, queries: np.ndarray, ids: Optional[np.ndarray], count: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Top `count` de cada consulta entre `ids` (None = todo el catálogo), ordenados"""
+        vectors = self.vectors if ids is None else self.vectors[ids]
+        total = len(vectors)
+        count = min(count, total)
+        indices = np.empty((len(queries), count), dtype=np.int64)
+        scores = np.empty((len(queries), count), dtype=np.float32)
+        # Bloques de consultas para acotar la matriz de similitudes a ~16M floats
+        step = max(1, (1 << 24) // max(1, total))
+        for start in range(0, len(queries), step):
+            similarity = queries[start:start + step] @ vectors.T
+            rows = np.arange(len(similarity))[:, None]
+            if count < total:
+                top = np.argpartition(similarity, total - count, axis=1)[:, total - count:]
+                order = np.argsort(-similarity[rows, top], axis=1)
+                top = top[rows, order]
+            else:
+                top = np.argsort(-similarity, axis=1)
+            indices[start:start + step] = top if ids is None else ids[top]
+            scores[start:start + step] = similarity[rows, top]
+        return indices, scores
+
+    def search(
+        self,
+        queries: np.ndarray,
+        k: int,
+        diverse: bool = False,
+        exclude: Optional[Set[int]] = None,
+        oversample: int = 8
+    ) -> List[List[Tuple[int, float]]]:
+        """
+        Top-k (índice, similitud) de cada consulta de `queries` (b, DIMENSIONS).
+        Sin diversidad ni exclusiones es todo vectorizado; con ellas se piden
+        `oversample` veces más candidatos y se filtran por consulta.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        if not len(self.vectors) or not len(queries):
+            return [[] for _ in range(len(queries))]
+        filtered = diverse and self.groups is not None or bool(exclude)
+        indices, scores = self._candidates(queries, k * oversample if filtered else k)
+        if not filtered:
+            return [
+                [(int(i), float(s)) for i, s in zip(row, row_scores) if i >= 0]
+                for row, row_scores in zip(indices, scores)
+            ]
+
+        picked: List[List[Tuple[int, float]]] = []
+        for row, row_scores in zip(indices.tolist(), scores.tolist()):
+            chosen: List[Tuple[int, float]] = []
+            seen_groups: Set[int] = set()
+            skipped: List[Tuple[int, float]] = []
+            for index, score in zip(row, row_scores):
+                if index < 0:
+                    break
+                if exclude and index in exclude:
+                    skipped.append((index, score))
+                    continue
+                if diverse and self.groups is not None:
+                    group = int(self.groups[index])
+                    if group in seen_groups:
+                        skipped.append((index, score))
+                        continue
+                    seen_groups.add(group)
+                chosen.append((index, score))
+                if len(chosen) == k:
+                    break
+            # Mejor repetir que devolver menos de k
+            chosen += skipped[:k - len(chosen)]
+            picked.append(chosen)
+        return picked
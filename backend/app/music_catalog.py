@@ -0,0 +1,395 @@
+"""
+Enriquecimiento de las canciones recomendadas con un catálogo musical externo.
+
+Las canciones del catálogo propio llevan título, artista y una URL de
+Spotify; `MusicCatalogClient` completa álbum, portada, preview y duración
+con la API del catálogo (la de Spotify Web API: GET /v1/tracks?ids=...,
+con token de client credentials si hay credenciales). Para no cargar ni
+esperar al servicio externo:
+
+- un único cliente HTTP con conexiones keep-alive y límite de conexiones y
+  de peticiones simultáneas, con timeout;
+- metadatos en una caché LRU acotada con TTL (también los "no encontrado");
+- las búsquedas de peticiones concurrentes se deduplican por id y se juntan
+  en una sola llamada de hasta `batch_size` ids;
+- un circuit breaker deja de llamar tras `failure_threshold` fallos seguidos
+  y vuelve a probar con una sola llamada pasados `reset_seconds`.
+
+`enrich` espera como mucho `budget_seconds`: si los metadatos no llegan a
+tiempo (o el catálogo está caído) la recomendación sale con los datos del
+catálogo propio y la búsqueda sigue en segundo plano para las siguientes.
+
+Para probar sin red: `python -m app.catalog_stub` levanta un catálogo local.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set
+from collections import OrderedDict
+import asyncio
+import logging
+import re
+import time
+
+
+logger = logging.getLogger(__name__)
+
+TRACK_URL = re.compile(r"open\.spotify\.com/(?:intl-[a-z]+/)?track/([A-Za-z0-9]{22})")
+# Campos de la API que se añaden a cada canción
+TRACK_FIELDS = ("album", "image", "preview_url", "duration_ms")
+
+# Metadatos de un id: dict con TRACK_FIELDS y "url", o None si el catálogo no lo tiene
+TrackInfo = Optional[Dict]
+
+
+class CatalogUnavailable(Exception):
+    """El catálogo externo no responde (o el circuit breaker está abierto)"""
+
+
+def track_id(url: Optional[str]) -> Optional[str]:
+    match = TRACK_URL.search(url or "")
+    return match.group(1) if match else None
+
+
+def parse_track(track: Dict) -> Dict:
+    """Los campos que interesan de un objeto track de la API"""
+    images = (track.get("album") or {}).get("images") or []
+    return {
+        "url": (track.get("external_urls") or {}).get("spotify"),
+        "album": (track.get("album") or {}).get("name"),
+        "image": images[0]["url"] if images else None,
+        "preview_url": track.get("preview_url"),
+        "duration_ms": track.get("duration_ms"),
+    }
+
+
+class TTLCache:
+    """LRU de `max_entries` entradas que caducan a los `ttl_seconds`"""
+
+    def __init__(self, max_entries: int, ttl_seconds: float, clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return self._lookup(key) is not None
+
+    def _lookup(self, key: str) -> Optional[tuple]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[1] <= self._clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: str, default=None):
+        entry = self._lookup(key)
+        return entry[0] if entry is not None else default
+
+    def put(self, key: str, value, ttl_seconds: Optional[float] = None) -> None:
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (value, self._clock() + (self.ttl if ttl_seconds is None else ttl_seconds))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+class CircuitBreaker:
+    """
+    Cerrado: pasan todas las llamadas. Tras `failure_threshold` fallos
+    seguidos se abre y no pasa ninguna durante `reset_seconds`; después deja
+    pasar una (semiabierto) y según su resultado se cierra o vuelve a abrirse.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_seconds: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.failures = 0
+        self.opened = 0
+        self._clock = clock
+        self._open_until: Optional[float] = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        if self._open_until is None:
+            return "closed"
+        return "open" if self._clock() < self._open_until or self._probing else "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open":
+            self._probing = True
+            return True
+        return False
+
+    def success(self) -> None:
+        self.failures = 0
+        self._open_until = None
+        self._probing = False
+
+    def failure(self) -> None:
+        self.failures += 1
+        if self._probing or self.failures >= self.failure_threshold:
+            if self._open_until is None or self._probing:
+                self.opened += 1
+            self._open_until = self._clock() + self.reset_seconds
+            self._probing = False
+
+
+class MusicCatalogClient:
+    """
+    Cliente del catálogo externo compartido por todas las peticiones. Se usa
+    desde el event loop; el cliente HTTP se crea con el primer uso y se
+    cierra con `close`. `transport` permite inyectar uno (p.ej. un
+    httpx.ASGITransport del catálogo de pruebas).
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        token_url: Optional[str] = None,
+        client_id: str = "",
+        client_secret: str = "",
+        timeout_seconds: float = 2.0,
+        max_connections: int = 8,
+        batch_size: int = 50,
+        batch_wait_ms: float = 5.0,
+        cache_entries: int = 10000,
+        cache_ttl_seconds: float = 3600.0,
+        failure_threshold: int = 5,
+        reset_seconds: float = 30.0,
+        transport=None
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.timeout = timeout_seconds
+        self.max_connections = max(1, max_connections)
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000.0
+        self.cache = TTLCache(cache_entries, cache_ttl_seconds)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.stats: Dict[str, int] = {
+            "hits": 0, "misses": 0, "coalesced": 0, "requests": 0, "failures": 0, "fallbacks": 0, "rejected": 0,
+        }
+        self._transport = transport
+        self._http = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._pending: List[str] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._token: Optional[str] = None
+        self._token_expires = 0.0
+
+    def _ensure_client(self):
+        loop = asyncio.get_running_loop()
+        if self._http is not None and self._loop is loop:
+            return self._http
+        import httpx
+
+        # Primer uso, o un event loop nuevo (p.ej. otro TestClient)
+        self._loop = loop
+        self._slots = asyncio.Semaphore(self.max_connections)
+        self._in_flight.clear()
+        self._pending.clear()
+        self._http = httpx.AsyncClient(
+            transport=self._transport,
+            timeout=httpx.Timeout(self.timeout),
+            limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections),
+        )
+        return self._http
+
+    async def close(self) -> None:
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for future in self._in_flight.values():
+            future.cancel()
+        self._in_flight.clear()
+        self._pending.clear()
+        if self._http is not None:
+            await self._http.aclose()
+        self._http = None
+        self._loop = None
+
+    def cached(self, ids: Iterable[str]) -> Dict[str, TrackInfo]:
+        """Los metadatos que ya están en caché (sin esperar ni llamar a la API)"""
+        found = {}
+        for id_ in ids:
+            if id_ in self.cache:
+                self.stats["hits"] += 1
+                found[id_] = self.cache.get(id_)
+        return found
+
+    def lookup(self, ids: Iterable[str]) -> Dict[str, asyncio.Future]:
+        """
+        Un future por id con sus metadatos. Los ids en caché se resuelven ya;
+        los que están en vuelo comparten el future de la búsqueda en curso, y
+        el resto se juntan en la siguiente llamada a la API.
+        """
+        self._ensure_client()
+        futures: Dict[str, asyncio.Future] = {}
+        for id_ in dict.fromkeys(ids):
+            if id_ in self.cache:
+                self.stats["hits"] += 1
+                future = self._loop.create_future()
+                future.set_result(self.cache.get(id_))
+            elif id_ in self._in_flight:
+                self.stats["coalesced"] += 1
+                future = self._in_flight[id_]
+            else:
+                self.stats["misses"] += 1
+                future = self._in_flight[id_] = self._loop.create_future()
+                # Nadie tiene por qué recoger el error si todos dejaron de esperar
+                future.add_done_callback(lambda done: done.cancelled() or done.exception())
+                self._pending.append(id_)
+            futures[id_] = future
+        if self._pending and self._flush_handle is None:
+            self._flush_handle = self._loop.call_later(self.batch_wait, self._flush)
+        return futures
+
+    def _flush(self) -> None:
+        self._flush_handle = None
+        pending, self._pending = self._pending, []
+        for start in range(0, len(pending), self.batch_size):
+            task = self._loop.create_task(self._fetch(pending[start:start + self.batch_size]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fetch(self, ids: List[str]) -> None:
+        try:
+            if not self.breaker.allow():
+                self.stats["rejected"] += 1
+                raise CatalogUnavailable("Circuit breaker abierto")
+            try:
+                async with self._slots:
+                    found = await self._request_tracks(ids)
+            except Exception as e:
+                self.breaker.failure()
+                self.stats["failures"] += 1
+                logger.warning(f"Catálogo musical no disponible: {type(e).__name__}: {e}")
+                raise CatalogUnavailable(str(e)) from e
+            self.breaker.success()
+        except CatalogUnavailable as e:
+            for id_ in ids:
+                future = self._in_flight.pop(id_, None)
+                if future is not None and not future.done():
+                    future.set_exception(e)
+            return
+        for id_ in ids:
+            info = found.get(id_)
+            # Los que no existen se recuerdan menos tiempo
+            self.cache.put(id_, info, None if info is not None else min(self.cache.ttl, 300.0))
+            future = self._in_flight.pop(id_, None)
+            if future is not None and not future.done():
+                future.set_result(info)
+
+    async def _request_tracks(self, ids: List[str]) -> Dict[str, Dict]:
+        headers = {}
+        if self.client_id:
+            headers["Authorization"] = f"Bearer {await self._access_token()}"
+        self.stats["requests"] += 1
+        response = await self._http.get(f"{self.base_url}/v1/tracks", params={"ids": ",".join(ids)}, headers=headers)
+        response.raise_for_status()
+        tracks = response.json().get("tracks") or []
+        # La API devuelve null en la posición de los ids que no existen
+        return {track["id"]: parse_track(track) for track in tracks if track}
+
+    async def _access_token(self) -> str:
+        """Token de client credentials, renovado un minuto antes de caducar"""
+        if self._token is not None and time.monotonic() < self._token_expires:
+            return self._token
+        response = await self._http.post(
+            self.token_url or f"{self.base_url}/api/token",
+            data={"grant_type": "client_credentials"},
+            auth=(self.client_id, self.client_secret)
+        )
+        response.raise_for_status()
+        data = response.json()
+        self._token = data["access_token"]
+        self._token_expires = time.monotonic() + max(0, data.get("expires_in", 3600) - 60)
+        return self._token
+
+    @staticmethod
+    def _track_ids(recommendation: Dict) -> List[str]:
+        """Ids de las canciones de una recomendación, sin repetir ("song" suele ser también la primera de "songs")"""
+        songs = [recommendation.get("song")] + list(recommendation.get("songs") or [])
+        return list(dict.fromkeys(id_ for id_ in (track_id(song.get("url")) for song in songs if song) if id_))
+
+    def _apply(self, recommendation: Dict, found: Dict[str, TrackInfo]) -> Dict:
+        # Las canciones del catálogo se comparten entre respuestas: se copian
+        enriched: Dict[int, Dict] = {}
+
+        def song_with_metadata(song: Optional[Dict]) -> Optional[Dict]:
+            info = found.get(track_id(song.get("url"))) if song else None
+            if info is None:
+                return song
+            if id(song) not in enriched:
+                enriched[id(song)] = {**song, **{k: v for k, v in info.items() if v is not None}}
+            return enriched[id(song)]
+
+        result = dict(recommendation)
+        if "song" in result:
+            result["song"] = song_with_metadata(result["song"])
+        if result.get("songs"):
+            result["songs"] = [song_with_metadata(song) for song in result["songs"]]
+        return result
+
+    async def enrich(self, recommendation: Optional[Dict], budget_seconds: float) -> Optional[Dict]:
+        """
+        La recomendación con los metadatos del catálogo de sus canciones, si
+        llegan en `budget_seconds`; si no, tal cual (o con los que haya).
+        """
+        if not recommendation:
+            return recommendation
+        ids = self._track_ids(recommendation)
+        if not ids:
+            return recommendation
+        futures = self.lookup(ids)
+        waiting = [future for future in futures.values() if not future.done()]
+        if waiting and budget_seconds > 0:
+            # asyncio.wait no cancela al agotar el plazo: la búsqueda sigue y queda en caché para la próxima
+            await asyncio.wait(waiting, timeout=budget_seconds)
+        found = {
+            id_: future.result() for id_, future in futures.items()
+            if future.done() and not future.cancelled() and future.exception() is None
+        }
+        if len(found) < len(ids):
+            self.stats["fallbacks"] += 1
+        return self._apply(recommendation, found)
+
+    def enrich_nowait(self, recommendation: Optional[Dict]) -> Optional[Dict]:
+        """Como `enrich` pero solo con la caché; los ids que faltan se buscan en segundo plano"""
+        if not recommendation:
+            return recommendation
+        ids = self._track_ids(recommendation)
+        if not ids:
+            return recommendation
+        found = self.cached(ids)
+        if len(found) < len(ids):
+            self.stats["fallbacks"] += 1
+            self.lookup(id_ for id_ in ids if id_ not in found)
+        return self._apply(recommendation, found)
+
+    def snapshot(self) -> Dict:
+        return {
+            "url": self.base_url,
+            "circuit": self.breaker.state,
+            "circuit_opened": self.breaker.opened,
+            "cache_entries": len(self.cache),
+            "in_flight": len(self._in_flight),
+            **self.stats,
+        }
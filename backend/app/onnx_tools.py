@@ -0,0 +1,160 @@
+"""
+Exportación del modelo a ONNX y comprobación de paridad con el modelo de referencia.
+
+    python -m app.onnx_tools export --output models/onnx --quantize
+    python -m app.onnx_tools export --model org/modelo-en --quantize    # en models/onnx/org__modelo-en
+    python -m app.onnx_tools parity --onnx-dir models/onnx --backend onnx-int8 --texts textos.txt
+"""
+from typing import Dict, List, Optional
+import argparse
+import json
+import logging
+import os
+import sys
+
+from app.backends import ONNX_INT8_MODEL_FILE, ONNX_MODEL_FILE
+from app.config import settings
+from app.lifecycle import onnx_model_dir
+from app.sentiment_analyzer import SentimentAnalyzer
+
+
+logger = logging.getLogger(__name__)
+
+# Textos por defecto para la comprobación de paridad si no se pasa --texts
+DEFAULT_PARITY_TEXTS = [
+    "Me encanta este producto, es increíble.",
+    "Está bien, cumple su función.",
+    "No me convenció del todo, tiene varios fallos.",
+    "Es una basura total, no lo compren.",
+    "El envío llegó a tiempo pero la caja estaba rota.",
+    "I absolutely love this new feature! It's amazing.",
+    "This is the worst experience I've ever had.",
+    "It's okay, nothing special but it works.",
+]
+
+
+def export_onnx(model_name: str, output_dir: str, quantize: bool = False, opset: int = 17) -> Dict[str, str]:
+    """
+    Exporta el modelo de transformers a `output_dir/model.onnx` (con ejes
+    dinámicos de lote y secuencia) junto al tokenizer y la config. Con
+    `quantize`, genera también `model.int8.onnx` con cuantización dinámica int8.
+    """
+    import torch
+    from transformers import AutoModelForSequenceClassification, AutoTokenizer
+
+    os.makedirs(output_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModelForSequenceClassification.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["texto de ejemplo", "otro"], padding=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["logits"] = {0: "batch"}
+
+    path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.inference_mode():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            path,
+            input_names=input_names,
+            output_names=["logits"],
+            dynamic_axes=dynamic_axes,
+            opset_version=opset,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(output_dir)
+    model.config.save_pretrained(output_dir)
+    outputs = {"onnx": path}
+    logger.info(f"Modelo exportado a {path}")
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        int8_path = os.path.join(output_dir, ONNX_INT8_MODEL_FILE)
+        quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+        outputs["onnx-int8"] = int8_path
+        logger.info(f"Modelo cuantizado a int8 en {int8_path}")
+
+    return outputs
+
+
+def parity_report(reference: SentimentAnalyzer, candidate: SentimentAnalyzer, texts: List[str], batch_size: int = 16) -> Dict:
+    """
+    Compara un motor con el de referencia sobre `texts`: acuerdo de etiqueta
+    (estrellas y sentimiento final) y deriva de las probabilidades por clase.
+    """
+    agree_label = agree_sentiment = 0
+    drifts: List[float] = []
+    disagreements = []
+
+    for start in range(0, len(texts), batch_size):
+        batch = texts[start:start + batch_size]
+        expected = reference.analyze_batch(batch)
+        actual = candidate.analyze_batch(batch)
+        for text, ref, cand in zip(batch, expected, actual):
+            ref_label = max(ref.raw_scores, key=ref.raw_scores.get)
+            cand_label = max(cand.raw_scores, key=cand.raw_scores.get)
+            agree_label += ref_label == cand_label
+            agree_sentiment += ref.sentiment == cand.sentiment
+            drifts.extend(abs(ref.raw_scores[label] - cand.raw_scores.get(label, 0.0)) for label in ref.raw_scores)
+            if ref.sentiment != cand.sentiment:
+                disagreements.append({"text": text, "reference": ref.sentiment, "candidate": cand.sentiment})
+
+    total = len(texts)
+    return {
+        "texts": total,
+        "label_agreement": agree_label / total if total else 1.0,
+        "sentiment_agreement": agree_sentiment / total if total else 1.0,
+        "max_score_drift": max(drifts, default=0.0),
+        "mean_score_drift": sum(drifts) / len(drifts) if drifts else 0.0,
+        "disagreements": disagreements,
+    }
+
+
+def _read_texts(path: Optional[str]) -> List[str]:
+    if path is None:
+        return list(DEFAULT_PARITY_TEXTS)
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.onnx_tools", description=__doc__.strip().splitlines()[0])
+    subcommands = parser.add_subparsers(dest="command", required=True)
+
+    export = subcommands.add_parser("export", help="Exporta el modelo a ONNX (y opcionalmente int8)")
+    export.add_argument("--model", default=settings.model_name)
+    export.add_argument("--output", help="Por defecto el directorio en el que lo busca el servicio (ver onnx_model_dir)")
+    export.add_argument("--quantize", action="store_true", help="Genera también la variante int8")
+    export.add_argument("--opset", type=int, default=17)
+
+    parity = subcommands.add_parser("parity", help="Compara un motor ONNX con el modelo de referencia")
+    parity.add_argument("--model", default=settings.model_name)
+    parity.add_argument("--onnx-dir")
+    parity.add_argument("--backend", choices=("onnx", "onnx-int8"), default="onnx-int8")
+    parity.add_argument("--texts", help="Fichero con un texto por línea")
+    parity.add_argument("--min-agreement", type=float, default=0.0,
+                        help="Sale con código 1 si el acuerdo de sentimiento queda por debajo")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "export":
+        output = args.output or onnx_model_dir(settings.onnx_dir, args.model, settings.model_name)
+        outputs = export_onnx(args.model, output, quantize=args.quantize, opset=args.opset)
+        print(json.dumps(outputs, indent=2))
+        return 0
+
+    reference = SentimentAnalyzer(args.model, backend="transformers")
+    onnx_dir = args.onnx_dir or onnx_model_dir(settings.onnx_dir, args.model, settings.model_name)
+    candidate = SentimentAnalyzer(args.model, backend=args.backend, onnx_dir=onnx_dir)
+    report = parity_report(reference, candidate, _read_texts(args.texts))
+    report["backend"] = args.backend
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if report["sentiment_agreement"] >= args.min_agreement else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,189 @@
+"""
+Servidor pre-fork: carga el modelo una vez y hace fork de N workers de uvicorn.
+
+    python -m app.prefork --workers 4 --port 8000
+
+Los workers heredan los pesos del padre y los comparten copy-on-write: la
+inferencia no escribe en ellos, así que sus páginas nunca se duplican y N
+workers ocupan cerca de 1× la memoria del modelo en vez de N×. Con
+--share-memory (motor transformers) los pesos se mueven además a memoria
+compartida. El padre registra periódicamente la memoria residente y
+compartida de cada worker.
+"""
+from typing import Dict, List, Optional
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+import uvicorn
+
+from app import lifecycle
+from app.config import settings
+from app.executor import configure_torch_threads
+from app.memory import memory_report
+
+
+logger = logging.getLogger(__name__)
+
+
+def _mb(value: int) -> str:
+    return f"{value / (1024 * 1024):.1f}MB"
+
+
+def preload_model(share_memory: bool = False):
+    """
+    Carga el analizador en el proceso actual sin ejecutar ninguna inferencia:
+    un forward crearía el pool de hilos de OpenMP, que no sobrevive al fork.
+    El warm-up lo hace cada worker después del fork.
+    """
+    started = time.perf_counter()
+    analyzer = lifecycle.analyzer_factory(settings)(settings.model_name)
+    model = getattr(analyzer.backend, "model", None)
+    if share_memory and model is not None:
+        # Pesos en memoria compartida (/dev/shm): ni siquiera una escritura
+        # accidental crearía una copia privada en un worker
+        model.share_memory()
+    return analyzer, {"preload_s": time.perf_counter() - started}
+
+
+class PreforkSupervisor:
+    """
+    Proceso padre: abre el socket, hace fork de los workers (que comparten el
+    socket y el modelo precargado), reemplaza los que mueran y reenvía
+    SIGTERM/SIGINT para un apagado ordenado.
+    """
+
+    def __init__(self, host: str, port: int, workers: int, memory_report_seconds: float = 60.0):
+        if workers < 1:
+            raise ValueError("workers debe ser >= 1")
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.memory_report_seconds = memory_report_seconds
+        self.children: Dict[int, int] = {}  # pid -> índice de worker
+        self._stopping = False
+        self._socket: Optional[socket.socket] = None
+
+    def run(self) -> int:
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._socket.bind((self.host, self.port))
+        self._socket.listen(2048)
+        self._socket.set_inheritable(True)
+
+        # Lo que ya existe al hacer fork no debe recorrerlo el GC de cada hijo:
+        # actualizar sus cabeceras copiaría páginas que podrían compartirse
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        for index in range(self.workers):
+            self._spawn(index)
+        logger.info(f"Pre-fork en http://{self.host}:{self.port} con {self.workers} workers")
+
+        next_report = time.monotonic() + self.memory_report_seconds
+        while self.children:
+            self._reap()
+            if self.memory_report_seconds > 0 and time.monotonic() >= next_report:
+                self.log_memory()
+                next_report = time.monotonic() + self.memory_report_seconds
+            time.sleep(0.2)
+
+        self._socket.close()
+        return 0
+
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = self._run_worker(index)
+            finally:
+                os._exit(code)
+        self.children[pid] = index
+
+    def _run_worker(self, index: int) -> int:
+        # uvicorn instala sus propios manejadores de señales
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        if settings.torch_intra_op_threads == 0:
+            # Sin ajuste explícito, los núcleos se reparten entre los workers
+            configure_torch_threads(max(1, (os.cpu_count() or 1) // self.workers))
+        logger.info(f"Worker {index} (pid {os.getpid()}) arrancando")
+        config = uvicorn.Config("app.main:app", log_level="info")
+        uvicorn.Server(config).run(sockets=[self._socket])
+        return 0
+
+    def _reap(self) -> None:
+        while self.children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                self.children.clear()
+                return
+            if pid == 0:
+                return
+            index = self.children.pop(pid, None)
+            if index is None:
+                continue
+            if not self._stopping:
+                logger.warning(f"Worker {index} (pid {pid}) terminó con estado {status}; se reemplaza")
+                self._spawn(index)
+
+    def _handle_stop(self, signum, frame) -> None:
+        if self._stopping:
+            return
+        self._stopping = True
+        logger.info("Apagando workers")
+        for pid in list(self.children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def log_memory(self) -> Dict:
+        report = memory_report([os.getpid(), *self.children])
+        for pid, memory in report["processes"].items():
+            role = "padre" if pid == os.getpid() else f"worker {self.children.get(pid)}"
+            logger.info(
+                f"Memoria {role} (pid {pid}): rss={_mb(memory['rss'])} shared={_mb(memory['shared'])} "
+                f"private={_mb(memory['private'])} pss={_mb(memory['pss'])}"
+            )
+        totals = report["totals"]
+        logger.info(f"Memoria total: rss={_mb(totals['rss'])} pss={_mb(totals['pss'])} (pss = ocupación real)")
+        return report
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.prefork", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=settings.prefork_workers)
+    parser.add_argument("--memory-report-seconds", type=float, default=60.0,
+                        help="Intervalo del informe de memoria por worker (0 lo desactiva)")
+    parser.add_argument("--share-memory", action="store_true",
+                        help="Mover los pesos a memoria compartida en vez de confiar solo en copy-on-write")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    if settings.inference_mode != "thread":
+        logger.warning("En modo pre-fork cada worker infiere con hilos; se ignora inference_mode")
+
+    analyzer, timings = preload_model(share_memory=args.share_memory)
+    lifecycle.install_preloaded(analyzer, timings)
+    logger.info(f"Modelo precargado en {timings['preload_s']:.2f}s")
+    # Importar la app en el padre: los workers heredan también los módulos ya cargados
+    import app.main  # noqa: F401
+
+    supervisor = PreforkSupervisor(args.host, args.port, args.workers, args.memory_report_seconds)
+    return supervisor.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+from typing import Deque, Dict, List, Optional, Tuple
+from collections import Counter, deque
+from datetime import datetime
+import logging
+import os
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# (instante, [(hilo, pila colapsada)]) de una muestra
+Sample = Tuple[float, List[Tuple[str, str]]]
+
+
+def _collapse(frame) -> str:
+    stack = []
+    while frame is not None:
+        code = frame.f_code
+        stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class SlowRequestProfiler:
+    """
+    Profiler de muestreo para peticiones lentas (opt-in).
+
+    Un hilo toma cada `interval_ms` la pila de todos los hilos del proceso y
+    guarda las muestras de los últimos `window_s` segundos. Cuando una petición
+    tarda más de `threshold_ms`, las muestras de su intervalo se vuelcan a
+    `output_dir` en formato "collapsed stacks" (una pila por línea con su
+    número de muestras), que leen flamegraph.pl o speedscope.
+
+    Con varias peticiones concurrentes el perfil incluye lo que hicieron todos
+    los hilos en ese intervalo, no solo esa petición: sirve para ver dónde se
+    fue el tiempo mientras la petición estaba lenta. Sin activar no se crea el
+    hilo y el coste es nulo.
+    """
+
+    def __init__(
+        self,
+        threshold_ms: float,
+        output_dir: str = "profiles",
+        interval_ms: float = 10.0,
+        window_s: float = 60.0,
+        min_dump_interval_s: float = 10.0
+    ):
+        self.threshold = threshold_ms / 1000.0
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000.0
+        self.min_dump_interval = min_dump_interval_s
+        self.dumps = 0
+        self._samples: Deque[Sample] = deque(maxlen=max(1, int(window_s / self.interval)))
+        self._last_dump = float("-inf")
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="sentify-profiler", daemon=True)
+        self._thread.start()
+        logger.info(f"Profiler de peticiones lentas activo (> {self.threshold * 1000:.0f} ms) en {self.output_dir}")
+
+    def stop(self) -> None:
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+
+    def _sample_loop(self) -> None:
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            stacks = [
+                (names.get(ident, str(ident)), _collapse(frame))
+                for ident, frame in sys._current_frames().items()
+                if ident != own
+            ]
+            self._samples.append((time.perf_counter(), stacks))
+
+    def request_finished(self, path: str, started: float, finished: float) -> Optional[str]:
+        """Vuelca el perfil si la petición fue lenta; devuelve la ruta del fichero"""
+        if self._thread is None or finished - started < self.threshold:
+            return None
+        if finished - self._last_dump < self.min_dump_interval:
+            return None
+        self._last_dump = finished
+
+        counts: Dict[str, int] = Counter()
+        for at, stacks in list(self._samples):
+            if started <= at <= finished:
+                for thread, stack in stacks:
+                    counts[f"{thread};{stack}"] += 1
+        if not counts:
+            return None
+
+        name = f"slow-{datetime.now():%Y%m%d-%H%M%S}-{path.strip('/').replace('/', '_') or 'root'}-{(finished - started) * 1000:.0f}ms.folded"
+        filename = os.path.join(self.output_dir, name)
+        with open(filename, "w", encoding="utf-8") as f:
+            for stack, count in sorted(counts.items()):
+                f.write(f"{stack} {count}\n")
+        self.dumps += 1
+        logger.warning(f"Petición lenta a {path} ({(finished - started) * 1000:.0f} ms): perfil en {filename}")
+        return filename
@@ -1,101 +1,655 @@
-from typing import List, Dict
+"""
+Catálogo de recomendaciones (canciones, colores y frases) por categoría de emoción.
+
+El catálogo incluido es pequeño; SENTIFY_CATALOG_PATH apunta a uno propio en
+JSON (con la forma de DEFAULT_CATALOG) o SQLite (ver SQLITE_SCHEMA), que se
+recarga en caliente cuando cambia el fichero.
+
+    python -m app.recommendations stats catalogo.db
+    python -m app.recommendations convert catalogo.json catalogo.db
+"""
+from typing import Deque, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from array import array
+from bisect import bisect_right
+from collections import deque
+import argparse
+import json
+import logging
+import os
 import random
+import sqlite3
+import sys
+import threading
+import time
 
-class RecommendationEngine:
-    def __init__(self):
-        self.recommendations_db = {
-            "alegría": {
-                "songs": [
-                    {"title": "Vivir Mi Vida", "artist": "Marc Anthony", "url": "https://open.spotify.com/track/3Q3myFA7q4Op95DOpHplaY"},
-                    {"title": "Color Esperanza", "artist": "Diego Torres", "url": "https://open.spotify.com/track/4j1lKjTNnsX0r0gnF0wR8c"},
-                    {"title": "La Vida Es Un Carnaval", "artist": "Celia Cruz", "url": "https://open.spotify.com/track/1a2R0g95tC5C2yXz5p7R3G"}
-                ],
-                "colors": {"hex": "#FFD700", "name": "Dorado", "meaning": "Resplandor y felicidad"},
-                "quotes": [
-                    {"text": "La alegría es la forma más simple de gratitud.", "author": "Karl Barth"},
-                    {"text": "El día más desperdiciado de todos es aquel sin risas.", "author": "E. E. Cummings"}
-                ]
-            },
-            "tristeza": {
-                "songs": [
-                    {"title": "Corazón Partío", "artist": "Alejandro Sanz", "url": "https://open.spotify.com/track/0wQ9G3uB5RJ9r5z8r4i8y1"},
-                    {"title": "Corre", "artist": "Jesse & Joy", "url": "https://open.spotify.com/track/1v6IL7E19BwRrd7Wveb2uv"}, 
-                    {"title": "El Triste", "artist": "José José", "url": "https://open.spotify.com/track/3LFfaAcLmpoXq4b2LyoHbi"}
-                ],
-                "colors": {"hex": "#4682B4", "name": "Azul Acero", "meaning": "Calma y sanación"},
-                "quotes": [
-                    {"text": "Las lágrimas vienen del corazón y no del cerebro.", "author": "Leonardo da Vinci"},
-                    {"text": "La tristeza se aleja con las alas del tiempo.", "author": "Jean de La Fontaine"}
-                ]
-            },
-            "enojo": {
-                "songs": [
-                    {"title": "Matador", "artist": "Los Fabulosos Cadillacs", "url": "https://open.spotify.com/track/3EsjrObXPhXA79Cr4QixY8"},
-                    {"title": "Frijolero", "artist": "Molotov", "url": "https://open.spotify.com/track/4yM8M0Jv8F0p4d3X6Kz4J9"},
-                    {"title": "Gimme Tha Power", "artist": "Molotov", "url": "https://open.spotify.com/track/3t5O1pY0zN8D9mP2f3X9fH"}
-                ],
-                "colors": {"hex": "#DC143C", "name": "Carmesí", "meaning": "Energía y pasión intensa"},
-                "quotes": [
-                    {"text": "Por cada minuto que permaneces enojado, renuncias a sesenta segundos de paz mental.", "author": "Ralph Waldo Emerson"},
-                    {"text": "El que te enfada te vence.", "author": "Elizabeth Kenny"}
-                ]
-            },
-             "miedo": {
-                "songs": [
-                    {"title": "Color Esperanza", "artist": "Diego Torres", "url": "https://open.spotify.com/track/4j1lKjTNnsX0r0gnF0wR8c"},
-                    {"title": "El Virus Del Miedo", "artist": "Ismael Serrano", "url": "https://open.spotify.com/track/0UuL5wXmXmXmXmXmXmXmXm"},
-                    {"title": "Sin Miedo", "artist": "Rosana", "url": "https://open.spotify.com/track/0vPvPvPvPvPvPvPvPvPvPv"}
-                ],
-                "colors": {"hex": "#98FB98", "name": "Verde Pálido", "meaning": "Seguridad y renovación"},
-                "quotes": [
-                    {"text": "A lo único que tenemos que temer es al miedo mismo.", "author": "Franklin D. Roosevelt"},
-                    {"text": "El miedo es una reacción. El coraje es una decisión.", "author": "Winston Churchill"}
-                ]
-            },
-            "neutral": {
-                 "songs": [
-                    {"title": "De Música Ligera", "artist": "Soda Stereo", "url": "https://open.spotify.com/track/2WD9ggmpZE7Wodh3qVVCgg"},
-                    {"title": "Mediterráneo", "artist": "Joan Manuel Serrat", "url": "https://open.spotify.com/track/3p1zG6L7yU4p9E9o3W5r8p"},
-                    {"title": "Bésame Mucho", "artist": "Andrea Bocelli", "url": "https://open.spotify.com/track/0pNpNpNpNpNpNpNpNpNpNp"}
-                ],
-
-                "colors": {"hex": "#D3D3D3", "name": "Gris Claro", "meaning": "Equilibrio y neutralidad"},
-                "quotes": [
-                    {"text": "La vida es lo que pasa mientras estás ocupado haciendo otros planes.", "author": "John Lennon"},
-                    {"text": "El equilibrio no es algo que encuentras, es algo que creas.", "author": "Jana Kingsford"}
-                ]
+import numpy as np
+
+from app.mood import DIMENSIONS, MoodIndex, category_mood, mood_vector, result_moods
+from app.sentiment_analyzer import SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+# Emociones que devuelve el análisis (SentimentAnalyzer.build_result y versiones
+# anteriores del servicio) -> categoría del catálogo
+EMOTION_CATEGORIES: Dict[str, str] = {
+    # 5 y 4 estrellas
+    "alegría": "alegría", "entusiasmo": "alegría", "felicidad": "alegría", "excelente": "alegría",
+    "satisfacción": "alegría", "agrado": "alegría", "confianza": "alegría", "optimismo": "alegría",
+    "amor": "alegría", "gratitud": "alegría",
+    # 3 estrellas
+    "indiferencia": "neutral", "calma": "neutral", "duda": "neutral", "ambivalencia": "neutral",
+    "reflexivo": "neutral",
+    # 2 y 1 estrellas
+    "molestia": "enojo", "desagrado": "enojo", "irritación": "enojo", "odio": "enojo", "rabia": "enojo",
+    "frustración extrema": "enojo", "frustración": "enojo", "juicio": "enojo", "enojo": "enojo",
+    "decepción": "tristeza", "tristeza": "tristeza",
+    "ansiedad": "miedo", "preocupación": "miedo", "miedo": "miedo",
+}
+
+DEFAULT_CATALOG: Dict = {
+    "default": "neutral",
+    "emotions": EMOTION_CATEGORIES,
+    "categories": {
+        "alegría": {
+            "songs": [
+                {"title": "Vivir Mi Vida", "artist": "Marc Anthony", "url": "https://open.spotify.com/track/3Q3myFA7q4Op95DOpHplaY"},
+                {"title": "Color Esperanza", "artist": "Diego Torres", "url": "https://open.spotify.com/track/4j1lKjTNnsX0r0gnF0wR8c"},
+                {"title": "La Vida Es Un Carnaval", "artist": "Celia Cruz", "url": "https://open.spotify.com/track/1a2R0g95tC5C2yXz5p7R3G"}
+            ],
+            "colors": {"hex": "#FFD700", "name": "Dorado", "meaning": "Resplandor y felicidad"},
+            "quotes": [
+                {"text": "La alegría es la forma más simple de gratitud.", "author": "Karl Barth"},
+                {"text": "El día más desperdiciado de todos es aquel sin risas.", "author": "E. E. Cummings"}
+            ]
+        },
+        "tristeza": {
+            "songs": [
+                {"title": "Corazón Partío", "artist": "Alejandro Sanz", "url": "https://open.spotify.com/track/0wQ9G3uB5RJ9r5z8r4i8y1"},
+                {"title": "Corre", "artist": "Jesse & Joy", "url": "https://open.spotify.com/track/1v6IL7E19BwRrd7Wveb2uv"},
+                {"title": "El Triste", "artist": "José José", "url": "https://open.spotify.com/track/3LFfaAcLmpoXq4b2LyoHbi"}
+            ],
+            "colors": {"hex": "#4682B4", "name": "Azul Acero", "meaning": "Calma y sanación"},
+            "quotes": [
+                {"text": "Las lágrimas vienen del corazón y no del cerebro.", "author": "Leonardo da Vinci"},
+                {"text": "La tristeza se aleja con las alas del tiempo.", "author": "Jean de La Fontaine"}
+            ]
+        },
+        "enojo": {
+            "songs": [
+                {"title": "Matador", "artist": "Los Fabulosos Cadillacs", "url": "https://open.spotify.com/track/3EsjrObXPhXA79Cr4QixY8"},
+                {"title": "Frijolero", "artist": "Molotov", "url": "https://open.spotify.com/track/4yM8M0Jv8F0p4d3X6Kz4J9"},
+                {"title": "Gimme Tha Power", "artist": "Molotov", "url": "https://open.spotify.com/track/3t5O1pY0zN8D9mP2f3X9fH"}
+            ],
+            "colors": {"hex": "#DC143C", "name": "Carmesí", "meaning": "Energía y pasión intensa"},
+            "quotes": [
+                {"text": "Por cada minuto que permaneces enojado, renuncias a sesenta segundos de paz mental.", "author": "Ralph Waldo Emerson"},
+                {"text": "El que te enfada te vence.", "author": "Elizabeth Kenny"}
+            ]
+        },
+        "miedo": {
+            "songs": [
+                {"title": "Color Esperanza", "artist": "Diego Torres", "url": "https://open.spotify.com/track/4j1lKjTNnsX0r0gnF0wR8c"},
+                {"title": "El Virus Del Miedo", "artist": "Ismael Serrano", "url": "https://open.spotify.com/track/0UuL5wXmXmXmXmXmXmXmXm"},
+                {"title": "Sin Miedo", "artist": "Rosana", "url": "https://open.spotify.com/track/0vPvPvPvPvPvPvPvPvPvPv"}
+            ],
+            "colors": {"hex": "#98FB98", "name": "Verde Pálido", "meaning": "Seguridad y renovación"},
+            "quotes": [
+                {"text": "A lo único que tenemos que temer es al miedo mismo.", "author": "Franklin D. Roosevelt"},
+                {"text": "El miedo es una reacción. El coraje es una decisión.", "author": "Winston Churchill"}
+            ]
+        },
+        "neutral": {
+            "songs": [
+                {"title": "De Música Ligera", "artist": "Soda Stereo", "url": "https://open.spotify.com/track/2WD9ggmpZE7Wodh3qVVCgg"},
+                {"title": "Mediterráneo", "artist": "Joan Manuel Serrat", "url": "https://open.spotify.com/track/3p1zG6L7yU4p9E9o3W5r8p"},
+                {"title": "Bésame Mucho", "artist": "Andrea Bocelli", "url": "https://open.spotify.com/track/0pNpNpNpNpNpNpNpNpNpNp"}
+            ],
+            "colors": {"hex": "#D3D3D3", "name": "Gris Claro", "meaning": "Equilibrio y neutralidad"},
+            "quotes": [
+                {"text": "La vida es lo que pasa mientras estás ocupado haciendo otros planes.", "author": "John Lennon"},
+                {"text": "El equilibrio no es algo que encuentras, es algo que creas.", "author": "Jana Kingsford"}
+            ]
+        }
+    }
+}
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS songs (category TEXT NOT NULL, title TEXT NOT NULL, artist TEXT NOT NULL, url TEXT NOT NULL, weight REAL NOT NULL DEFAULT 1, mood TEXT);
+CREATE TABLE IF NOT EXISTS quotes (category TEXT NOT NULL, text TEXT NOT NULL, author TEXT NOT NULL, weight REAL NOT NULL DEFAULT 1, mood TEXT);
+CREATE TABLE IF NOT EXISTS colors (category TEXT PRIMARY KEY, hex TEXT NOT NULL, name TEXT NOT NULL, meaning TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS emotions (emotion TEXT PRIMARY KEY, category TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+SONG_FIELDS = ("title", "artist", "url")
+QUOTE_FIELDS = ("text", "author")
+SQLITE_SUFFIXES = (".db", ".sqlite", ".sqlite3")
+RECOMMENDATION_MODES = ("category", "vector")
+
+# Separador de campos dentro de una fila codificada (no aparece en texto normal)
+_SEP = "\x1f"
+
+
+class _Pool:
+    """
+    Elementos de una categoría (canciones o frases) con muestreo ponderado O(1).
+
+    Las categorías grandes guardan sus filas codificadas en UTF-8 en un único
+    bloque de bytes con sus desplazamientos en un array, en vez de un dict por
+    elemento: cientos de miles de canciones ocupan poco más que su texto. Las
+    pequeñas (hasta `EXPANDED_ROWS`) guardan los dicts ya hechos, que es más
+    rápido y apenas ocupa. El muestreo usa el método alias de Walker; con
+    pesos iguales basta un índice al azar.
+    """
+    __slots__ = ("fields", "size", "groups", "moods", "_rows", "_data", "_offsets", "_prob", "_alias")
+
+    EXPANDED_ROWS = 1024
+
+    def __init__(
+        self,
+        fields: Sequence[str],
+        data: bytes,
+        offsets: array,
+        weights: Optional[Sequence[float]] = None,
+        groups: Optional[array] = None,
+        moods: Optional[np.ndarray] = None
+    ):
+        self.fields = tuple(fields)
+        self.size = len(offsets) - 1
+        # Artista o autor de cada fila (para la diversidad) y su mood propio
+        # (NaN si no trae, y entonces vale el de la categoría)
+        self.groups = groups
+        self.moods = moods
+        self._rows: Optional[Tuple[Dict[str, str], ...]] = None
+        self._data = data
+        self._offsets = offsets
+        if self.size <= self.EXPANDED_ROWS:
+            self._rows = tuple(self.row(index) for index in range(self.size))
+            self._data, self._offsets = b"", array("Q")
+        self._prob: Optional[array] = None
+        self._alias: Optional[array] = None
+        if weights is not None and min(weights, default=1.0) != max(weights, default=1.0):
+            self._build_alias(weights)
+
+    def __len__(self) -> int:
+        return self.size
+
+    @property
+    def nbytes(self) -> int:
+        if self._rows is not None:
+            size = sys.getsizeof(self._rows) + sum(
+                sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row.values()) for row in self._rows
+            )
+        else:
+            size = len(self._data) + self._offsets.itemsize * len(self._offsets)
+        if self._prob is not None:
+            size += self._prob.itemsize * len(self._prob) + self._alias.itemsize * len(self._alias)
+        if self.groups is not None:
+            size += self.groups.itemsize * len(self.groups)
+        if self.moods is not None:
+            size += self.moods.nbytes
+        return size
+
+    def _build_alias(self, weights: Sequence[float]) -> None:
+        n = self.size
+        if len(weights) != n:
+            raise ValueError("Hay distinto número de pesos que de elementos")
+        total = sum(weights)
+        if any(w < 0 for w in weights) or not total:
+            raise ValueError("Los pesos deben ser >= 0 y no todos 0")
+        scaled = [w * n / total for w in weights]
+        prob = array("d", [1.0]) * n
+        alias = array("L", range(n))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+        while small and large:
+            less, more = small.pop(), large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            (small if scaled[more] < 1.0 else large).append(more)
+        # Lo que quede (por redondeo) se elige siempre a sí mismo
+        self._prob, self._alias = prob, alias
+
+    def row(self, index: int) -> Dict[str, str]:
+        # Los dicts ya hechos se comparten entre respuestas: no modificarlos
+        if self._rows is not None:
+            return self._rows[index]
+        raw = self._data[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+        return dict(zip(self.fields, raw.split(_SEP)))
+
+    def sample(self, rng: random.Random) -> Dict[str, str]:
+        index = int(rng.random() * self.size)
+        if self._prob is not None and rng.random() >= self._prob[index]:
+            index = self._alias[index]
+        return self.row(index)
+
+
+class _PoolBuilder:
+    """
+    Codifica las filas de una categoría según se leen, sin guardar un objeto
+    por fila. `groups` numera los artistas o autores (el segundo campo) y se
+    comparte entre las categorías de un mismo tipo.
+    """
+
+    def __init__(self, fields: Sequence[str], groups: Dict[str, int]):
+        self.fields = fields
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.weights = array("d")
+        self.group_ids = groups
+        self.groups = array("I")
+        self.moods = array("f")
+        self.has_moods = False
+
+    def add(self, values: Sequence[str], weight: float = 1.0, mood: Optional[Sequence[float]] = None) -> None:
+        values = [str(value) for value in values]
+        raw = _SEP.join(values)
+        if raw.count(_SEP) != len(self.fields) - 1:
+            raise ValueError(f"Carácter no permitido en {values!r}")
+        if mood is not None and len(mood) != DIMENSIONS:
+            raise ValueError(f"El mood de {values!r} debe tener {DIMENSIONS} valores (5 estrellas e intensidad)")
+        self.data += raw.encode("utf-8")
+        self.offsets.append(len(self.data))
+        self.weights.append(float(weight))
+        self.groups.append(self.group_ids.setdefault(values[1], len(self.group_ids)))
+        if mood is None:
+            self.moods.extend([float("nan")] * DIMENSIONS)
+        else:
+            self.moods.extend(mood_vector(mood[:-1], mood[-1]))
+            self.has_moods = True
+
+    def build(self) -> _Pool:
+        moods = np.frombuffer(self.moods, dtype=np.float32).reshape(-1, DIMENSIONS).copy() if self.has_moods else None
+        return _Pool(self.fields, bytes(self.data), self.offsets, self.weights, self.groups, moods)
+
+
+class Catalog:
+    """
+    Catálogo ya indexado e inmutable: se sustituye entero al recargar.
+
+    `emotions` es el índice emoción -> categoría; la categoría de una lista de
+    emociones es la de la primera que aparece en el índice, o `default`.
+
+    Para el modo "vector", `build_mood_index` prepara un MoodIndex por tipo
+    de elemento con todas las categorías juntas.
+    """
+
+    def __init__(self, categories: Dict[str, Tuple[Dict, _Pool, _Pool]], emotions: Dict[str, str], default: str):
+        if default not in categories:
+            raise ValueError(f"La categoría por defecto {default!r} no está en el catálogo")
+        _, songs, quotes = categories[default]
+        if not songs.size or not quotes.size:
+            raise ValueError(f"La categoría por defecto {default!r} necesita canciones y frases")
+        self.categories = categories
+        self.default = default
+        # Cada categoría también vale como emoción
+        self.emotions = {**{category: category for category in categories}, **{
+            emotion: category for emotion, category in emotions.items() if category in categories
+        }}
+        self.category_names = list(categories)
+        self.category_moods = np.stack([category_mood(category) for category in self.category_names])
+        # tipo -> (índice, pools en orden, posición global de la primera fila de cada pool)
+        self.mood_indexes: Dict[str, Tuple[MoodIndex, List[_Pool], List[int]]] = {}
+
+    def category_for(self, emotions: Iterable[str]) -> str:
+        index = self.emotions
+        for emotion in emotions:
+            category = index.get(emotion)
+            if category is not None:
+                return category
+        return self.default
+
+    def recommend(self, emotions: Iterable[str], rng: random.Random) -> Dict:
+        color, songs, quotes = self.categories[self.category_for(emotions)]
+        # Una categoría sin canciones o sin frases toma las de la categoría por defecto
+        _, default_songs, default_quotes = self.categories[self.default]
+        return {
+            "song": (songs if songs.size else default_songs).sample(rng),
+            "color": color,
+            "quote": (quotes if quotes.size else default_quotes).sample(rng),
+        }
+
+    def build_mood_index(self, ann_threshold: int = 50000, jitter: float = 0.01, seed: int = 0) -> None:
+        """
+        Los elementos sin mood propio toman el de su categoría con un pequeño
+        ruido fijo, para que los empates se repartan entre todos ellos.
+        """
+        rng = np.random.default_rng(seed)
+        for kind, position in (("songs", 1), ("quotes", 2)):
+            pools = [self.categories[category][position] for category in self.category_names]
+            vectors = []
+            for category, pool in zip(self.category_names, pools):
+                moods = np.broadcast_to(category_mood(category), (pool.size, DIMENSIONS))
+                moods = moods + rng.normal(0.0, jitter, moods.shape).astype(np.float32)
+                if pool.moods is not None:
+                    own = ~np.isnan(pool.moods).any(axis=1)
+                    moods[own] = pool.moods[own]
+                vectors.append(moods / np.linalg.norm(moods, axis=1, keepdims=True))
+            groups = np.concatenate([np.frombuffer(pool.groups, dtype=np.uint32) for pool in pools])
+            starts = np.cumsum([0] + [pool.size for pool in pools]).tolist()
+            index = MoodIndex(np.concatenate(vectors), groups, ann_threshold=ann_threshold, seed=seed)
+            self.mood_indexes[kind] = (index, pools, starts)
+
+    def _item(self, kind: str, index: int, score: float) -> Dict:
+        _, pools, starts = self.mood_indexes[kind]
+        position = bisect_right(starts, index) - 1
+        return {**pools[position].row(index - starts[position]), "similarity": round(score, 4)}
+
+    def recommend_moods(
+        self,
+        queries: np.ndarray,
+        k: int = 1,
+        diverse: bool = False,
+        exclude: Optional[Dict[str, Set[int]]] = None
+    ) -> Tuple[List[Dict], Dict[str, List[List[int]]]]:
+        """
+        Recomendaciones para cada mood de `queries` (n, DIMENSIONS) en una sola
+        búsqueda por tipo. Devuelve también los índices elegidos por tipo, para
+        no repetirlos después.
+        """
+        colors = np.argmax(queries @ self.category_moods.T, axis=1) if len(queries) else []
+        found = {
+            kind: index.search(queries, k, diverse=diverse, exclude=(exclude or {}).get(kind))
+            for kind, (index, _, _) in self.mood_indexes.items()
+        }
+        recommendations = []
+        for row, color in enumerate(colors):
+            recommendation = {"color": self.categories[self.category_names[color]][0]}
+            for kind, single in (("songs", "song"), ("quotes", "quote")):
+                items = [self._item(kind, index, score) for index, score in found[kind][row]]
+                recommendation[single] = items[0] if items else None
+                if k > 1:
+                    recommendation[kind] = items
+            recommendations.append(recommendation)
+        picked = {kind: [[index for index, _ in row] for row in rows] for kind, rows in found.items()}
+        return recommendations, picked
+
+    def stats(self) -> Dict:
+        stats = {
+            "categories": len(self.categories),
+            "emotions": len(self.emotions),
+            "songs": sum(len(songs) for _, songs, _ in self.categories.values()),
+            "quotes": sum(len(quotes) for _, _, quotes in self.categories.values()),
+            "bytes": sum(songs.nbytes + quotes.nbytes for _, songs, quotes in self.categories.values()),
+        }
+        if self.mood_indexes:
+            stats["mood_index"] = {
+                kind: {"items": len(index), "approximate": index.approximate, "bytes": index.nbytes}
+                for kind, (index, _, _) in self.mood_indexes.items()
             }
+        return stats
+
+
+class _PoolBuilders:
+    """Un _PoolBuilder por categoría para un tipo de elemento (canciones o frases)"""
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = fields
+        self.groups: Dict[str, int] = {}
+        self.pools: Dict[str, _PoolBuilder] = {}
+
+    def __getitem__(self, category: str) -> _PoolBuilder:
+        builder = self.pools.get(category)
+        if builder is None:
+            builder = self.pools[category] = _PoolBuilder(self.fields, self.groups)
+        return builder
+
+
+def _build(colors: Dict[str, Dict], songs: _PoolBuilders, quotes: _PoolBuilders,
+           emotions: Dict[str, str], default: str) -> Catalog:
+    categories = {}
+    for category in colors.keys() | songs.pools.keys() | quotes.pools.keys():
+        if category not in colors:
+            raise ValueError(f"La categoría {category!r} no tiene color")
+        categories[category] = (colors[category], songs[category].build(), quotes[category].build())
+    return Catalog(categories, emotions, default)
+
 
+def catalog_from_dict(data: Dict) -> Catalog:
+    """Catálogo a partir de un dict con la forma de DEFAULT_CATALOG"""
+    colors: Dict[str, Dict] = {}
+    songs, quotes = _PoolBuilders(SONG_FIELDS), _PoolBuilders(QUOTE_FIELDS)
+    for category, entry in data["categories"].items():
+        colors[category] = {key: entry["colors"][key] for key in ("hex", "name", "meaning")}
+        for builders, items in ((songs, entry.get("songs", ())), (quotes, entry.get("quotes", ()))):
+            builder = builders[category]
+            for item in items:
+                builder.add([item[field] for field in builders.fields], item.get("weight", 1.0), item.get("mood"))
+    emotions = {**EMOTION_CATEGORIES, **data.get("emotions", {})}
+    return _build(colors, songs, quotes, emotions, data.get("default", "neutral"))
+
+
+def _load_sqlite(path: str) -> Catalog:
+    # Solo lectura: el fichero puede estar regenerándose mientras tanto
+    connection = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        colors = {
+            category: {"hex": hex, "name": name, "meaning": meaning}
+            for category, hex, name, meaning in connection.execute("SELECT category, hex, name, meaning FROM colors")
         }
-    
+        songs, quotes = _PoolBuilders(SONG_FIELDS), _PoolBuilders(QUOTE_FIELDS)
+        for table, builders in (("songs", songs), ("quotes", quotes)):
+            # Las bases anteriores a la columna mood siguen valiendo
+            columns = {row[1] for row in connection.execute(f"PRAGMA table_info({table})")}
+            mood = "mood" if "mood" in columns else "NULL"
+            query = f"SELECT category, {', '.join(builders.fields)}, weight, {mood} FROM {table}"
+            for row in connection.execute(query):
+                builders[row[0]].add(row[1:-2], row[-2], json.loads(row[-1]) if row[-1] else None)
+        emotions = {**EMOTION_CATEGORIES, **dict(connection.execute("SELECT emotion, category FROM emotions"))}
+        default = dict(connection.execute("SELECT key, value FROM settings")).get("default", "neutral")
+    finally:
+        connection.close()
+    return _build(colors, songs, quotes, emotions, default)
+
+
+def load_catalog(path: Optional[str] = None) -> Catalog:
+    """Catálogo incluido, o el de un fichero JSON o SQLite (por extensión)"""
+    if not path:
+        return catalog_from_dict(DEFAULT_CATALOG)
+    if path.lower().endswith(SQLITE_SUFFIXES):
+        return _load_sqlite(path)
+    with open(path, encoding="utf-8") as f:
+        return catalog_from_dict(json.load(f))
+
+
+def write_sqlite(data: Dict, path: str) -> None:
+    """Guarda un catálogo con la forma de DEFAULT_CATALOG en una base SQLite nueva"""
+    if os.path.exists(path):
+        os.remove(path)
+    connection = sqlite3.connect(path)
+    try:
+        connection.executescript(SQLITE_SCHEMA)
+        categories = data["categories"]
+        connection.executemany("INSERT INTO colors VALUES (?, ?, ?, ?)", (
+            (category, entry["colors"]["hex"], entry["colors"]["name"], entry["colors"]["meaning"])
+            for category, entry in categories.items()
+        ))
+        for table, fields in (("songs", SONG_FIELDS), ("quotes", QUOTE_FIELDS)):
+            connection.executemany(f"INSERT INTO {table} VALUES ({', '.join('?' * (len(fields) + 3))})", (
+                (category, *(item[field] for field in fields), item.get("weight", 1.0),
+                 json.dumps(item["mood"]) if item.get("mood") else None)
+                for category, entry in categories.items() for item in entry.get(table, ())
+            ))
+        connection.executemany("INSERT INTO emotions VALUES (?, ?)", data.get("emotions", {}).items())
+        connection.execute("INSERT INTO settings VALUES ('default', ?)", (data.get("default", "neutral"),))
+        connection.commit()
+    finally:
+        connection.close()
+
+
+class RecommendationEngine:
+    """
+    Recomendaciones a partir de las emociones de un SentimentResult.
+
+    Con `path` el catálogo se lee de ese fichero y, si `reload_seconds` > 0,
+    se comprueba como mucho cada `reload_seconds` si el fichero ha cambiado;
+    la recarga se hace en un hilo y el catálogo nuevo sustituye al anterior de
+    una vez, así que las peticiones nunca esperan a la carga. Si la recarga
+    falla se sigue sirviendo el catálogo anterior.
+
+    En modo "vector" `recommend_many` usa la distribución completa de
+    puntuaciones (app.mood) en vez de la categoría de la emoción: devuelve los
+    `top_k` elementos más cercanos, con artistas/autores distintos si
+    `diversity`, sin repetir los últimos `no_repeat` recomendados y con algo
+    de ruido (`exploration`) en la consulta para no dar siempre lo mismo.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        reload_seconds: float = 0.0,
+        rng: Optional[random.Random] = None,
+        mode: str = "category",
+        top_k: int = 1,
+        diversity: bool = True,
+        no_repeat: int = 0,
+        exploration: float = 0.02,
+        ann_threshold: int = 50000
+    ):
+        if mode not in RECOMMENDATION_MODES:
+            raise ValueError(f"Modo de recomendación desconocido: {mode} (opciones: {', '.join(RECOMMENDATION_MODES)})")
+        self.path = path
+        self.reload_seconds = reload_seconds
+        self.mode = mode
+        self.top_k = max(1, top_k)
+        self.diversity = diversity
+        self.no_repeat = no_repeat
+        self.exploration = exploration
+        self.ann_threshold = ann_threshold
+        self.reloads = 0
+        self.reload_errors = 0
+        self.last_error: Optional[str] = None
+        self._random = rng or random.Random()
+        self._np_random = np.random.default_rng(self._random.getrandbits(64))
+        self._recent: Dict[str, Deque[int]] = {kind: deque(maxlen=no_repeat) for kind in ("songs", "quotes")}
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._mtime = self._file_mtime()
+        self._next_check = time.monotonic() + reload_seconds
+        started = time.perf_counter()
+        self.catalog = self._load()
+        self.load_seconds = time.perf_counter() - started
+
+    def _load(self) -> Catalog:
+        catalog = load_catalog(self.path)
+        if self.mode == "vector":
+            catalog.build_mood_index(self.ann_threshold)
+        return catalog
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.path).st_mtime_ns if self.path else None
+        except OSError:
+            return None
+
     def get_recommendations(self, emotions: List[str]) -> Dict:
-        primary_emotion = "neutral"
-        
-        for emotion in emotions:
-            if emotion in self.recommendations_db:
-                primary_emotion = emotion
-                break
-            
-            if emotion in ["entusiasmo", "amor", "gratitud", "satisfacción"]:
-                primary_emotion = "alegría"
-                break
-            elif emotion in ["molestia", "juicio", "frustración"]:
-                primary_emotion = "enojo"
-                break
-            elif emotion in ["ansiedad", "preocupación"]:
-                primary_emotion = "miedo"
-                break
-            elif emotion in ["calma", "indiferencia"]:
-                primary_emotion = "neutral"
-                break
-            elif emotion in ["tristeza"]:
-                primary_emotion = "tristeza"
-                break
-        
-        data = self.recommendations_db.get(primary_emotion, self.recommendations_db["neutral"])
-        
+        if self.reload_seconds > 0 and self.path and time.monotonic() >= self._next_check:
+            self._check_for_changes()
+        return self.catalog.recommend(emotions, self._random)
+
+    def recommend(self, result: SentimentResult) -> Dict:
+        return self.recommend_many([result])[0]
+
+    def recommend_many(self, results: Sequence[SentimentResult]) -> List[Dict]:
+        """
+        Recomendaciones de varios resultados a la vez. En modo "vector" es una
+        única búsqueda matricial para todo el lote; los elementos de un mismo
+        lote no se excluyen entre sí por `no_repeat`.
+        """
+        if self.mode != "vector":
+            return [self.get_recommendations(result.emotions) for result in results]
+        if self.reload_seconds > 0 and self.path and time.monotonic() >= self._next_check:
+            self._check_for_changes()
+
+        queries = result_moods(results)
+        if self.exploration > 0 and len(queries):
+            queries = queries + self._np_random.normal(0.0, self.exploration, queries.shape).astype(np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+        exclude = {kind: set(recent) for kind, recent in self._recent.items()} if self.no_repeat else None
+        recommendations, picked = self.catalog.recommend_moods(queries, self.top_k, self.diversity, exclude)
+        if self.no_repeat:
+            for kind, rows in picked.items():
+                for row in rows:
+                    self._recent[kind].extend(row)
+        return recommendations
+
+    def _check_for_changes(self) -> None:
+        self._next_check = time.monotonic() + self.reload_seconds
+        mtime = self._file_mtime()
+        if mtime is None or mtime == self._mtime:
+            return
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload_in_background, name="sentify-catalog-reload", daemon=True).start()
+
+    def _reload_in_background(self) -> None:
+        try:
+            self.reload()
+        except Exception:
+            # reload ya lo ha registrado y se sigue con el catálogo anterior
+            pass
+        finally:
+            self._reloading = False
+
+    def reload(self) -> Dict:
+        """Vuelve a leer el fichero del catálogo; devuelve sus estadísticas"""
+        mtime = self._file_mtime()
+        started = time.perf_counter()
+        try:
+            catalog = self._load()
+        except Exception as e:
+            self.reload_errors += 1
+            self.last_error = str(e)
+            # No volver a intentarlo hasta que el fichero cambie otra vez
+            self._mtime = mtime
+            logger.error(f"Error recargando el catálogo {self.path}: {self.last_error}")
+            raise
+        self.catalog = catalog
+        # Los índices recientes eran del catálogo anterior
+        for recent in self._recent.values():
+            recent.clear()
+        self._mtime = mtime
+        self.load_seconds = time.perf_counter() - started
+        self.reloads += 1
+        self.last_error = None
+        logger.info(f"Catálogo {self.path} recargado en {self.load_seconds:.2f}s: {catalog.stats()}")
+        return catalog.stats()
+
+    def snapshot(self) -> Dict:
         return {
-            "song": random.choice(data["songs"]),
-            "color": data["colors"],
-            "quote": random.choice(data["quotes"])
+            "path": self.path,
+            "mode": self.mode,
+            **self.catalog.stats(),
+            "load_s": round(self.load_seconds, 3),
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "last_error": self.last_error,
         }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Herramientas del catálogo de recomendaciones")
+    commands = parser.add_subparsers(dest="command", required=True)
+    stats = commands.add_parser("stats", help="Carga un catálogo y muestra su tamaño y tiempo de carga")
+    stats.add_argument("path", nargs="?", help="JSON o SQLite; sin él, el catálogo incluido")
+    convert = commands.add_parser("convert", help="Convierte un catálogo JSON a SQLite")
+    convert.add_argument("source")
+    convert.add_argument("target")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        with open(args.source, encoding="utf-8") as f:
+            write_sqlite(json.load(f), args.target)
+        args.path = args.target
+
+    engine = RecommendationEngine(args.path)
+    print(json.dumps(engine.snapshot(), ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+"""
+Registro de modelos por idioma.
+
+Cada petición se enruta al modelo de su idioma (SENTIFY_LANGUAGE_MODELS, p.ej.
+"es=finiteautomata/beto-sentiment-analysis,en=cardiffnlp/twitter-roberta-base-sentiment-latest")
+o al modelo por defecto. Los modelos se cargan la primera vez que se usan y
+cada uno tiene su propio micro-batching y su propia caché de resultados. Si
+la memoria de los modelos cargados supera SENTIFY_MODEL_MEMORY_BUDGET_MB se
+descargan los menos usados recientemente; el modelo por defecto no se
+descarga nunca.
+"""
+from typing import Dict, List, Optional
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+
+from app.batching import BatchScheduler
+from app.cache import ResultCache
+from app.cascade import normalize_language
+from app.lifecycle import ModelNotReady, ModelRuntime
+
+
+logger = logging.getLogger(__name__)
+
+
+def parse_language_models(spec: str) -> Dict[str, str]:
+    """"es=modelo-a, en=modelo-b" -> {"es": "modelo-a", "en": "modelo-b"}"""
+    routes: Dict[str, str] = {}
+    for entry in (spec or "").split(","):
+        if not entry.strip():
+            continue
+        language, sep, model_name = entry.partition("=")
+        if not sep or not language.strip() or not model_name.strip():
+            raise ValueError(f"Entrada inválida en SENTIFY_LANGUAGE_MODELS: {entry!r} (se espera idioma=modelo)")
+        routes[normalize_language(language)] = model_name.strip()
+    return routes
+
+
+class ModelSlot:
+    """Un modelo del registro con su runtime, su planificador de lotes y su caché"""
+
+    def __init__(self, model_name: str, settings, warmup: bool = True):
+        self.model_name = model_name
+        self.runtime = ModelRuntime(settings, warmup=warmup, model_name=model_name, on_ready=self._apply_profile)
+        self.batcher = BatchScheduler(
+            self.runtime.analyze_batch,
+            max_batch_size=settings.batch_max_size,
+            max_wait_ms=settings.batch_max_wait_ms,
+            max_concurrency=settings.inference_workers,
+            max_queue=settings.admission_max_queue,
+            max_queue_wait_ms=settings.admission_max_wait_ms,
+            max_bulk_queue=settings.admission_bulk_max_queue,
+            max_bulk_wait_ms=settings.admission_bulk_max_wait_ms
+        )
+        self.cache = ResultCache(
+            # El motor forma parte de la clave: onnx-int8 puede puntuar distinto que transformers
+            f"{model_name}:{settings.inference_backend}",
+            max_entries=settings.cache_max_entries,
+            max_bytes=int(settings.cache_max_mb * 1024 * 1024),
+            ttl_seconds=settings.cache_ttl_seconds
+        )
+        self.last_used = time.monotonic()
+        # Peticiones que están usando el modelo: no se puede descargar mientras tanto
+        self.active = 0
+
+    def _apply_profile(self) -> None:
+        # El tamaño de lote calibrado sustituye a SENTIFY_BATCH_MAX_SIZE
+        if self.runtime.profile is not None:
+            self.batcher.max_batch_size = self.runtime.profile.batch_size
+
+    @property
+    def memory_bytes(self) -> int:
+        executor = self.runtime.executor
+        return executor.memory_bytes if executor is not None else 0
+
+    async def close(self) -> None:
+        await self.batcher.close()
+        self.runtime.shutdown()
+
+    def snapshot(self) -> Dict:
+        return {
+            **self.runtime.snapshot(),
+            "memory_bytes": self.memory_bytes,
+            "active_requests": self.active,
+            "idle_s": round(time.monotonic() - self.last_used, 3),
+            "batching": self.batcher.snapshot(),
+            "cache": self.cache.snapshot(),
+        }
+
+
+class ModelRegistry:
+    """
+    Modelos cargados, en orden LRU, y el enrutado de idioma a modelo.
+
+    `acquire` devuelve el slot del modelo del idioma (cargándolo si hace
+    falta) y lo marca en uso hasta `release`. Si la carga de un modelo de
+    idioma falla se responde con el modelo por defecto.
+    """
+
+    def __init__(self, settings, warmup: bool = True):
+        self.settings = settings
+        self.warmup = warmup
+        self.routes = parse_language_models(settings.language_models)
+        # Modelos que se pueden cargar a petición de /admin: nunca un nombre arbitrario del Hub
+        self.allowed = {settings.model_name, *self.routes.values(), *(
+            name.strip() for name in settings.allowed_models.split(",") if name.strip()
+        )}
+        self.memory_budget = int(settings.model_memory_budget_mb * 1024 * 1024)
+        self.evictions = 0
+        self.default = ModelSlot(settings.model_name, settings, warmup)
+        self._slots: "OrderedDict[str, ModelSlot]" = OrderedDict([(settings.model_name, self.default)])
+
+    def is_allowed(self, model_name: str) -> bool:
+        return model_name in self.allowed
+
+    def model_for(self, language: Optional[str]) -> str:
+        return self.routes.get(normalize_language(language), self.settings.model_name)
+
+    def slots(self) -> List[ModelSlot]:
+        return list(self._slots.values())
+
+    @property
+    def memory_bytes(self) -> int:
+        return sum(slot.memory_bytes for slot in self._slots.values())
+
+    async def start(self) -> None:
+        # Solo el modelo por defecto se carga al arrancar; el resto bajo demanda
+        await self.default.runtime.start()
+
+    def _slot(self, model_name: str) -> ModelSlot:
+        slot = self._slots.get(model_name)
+        if slot is None:
+            logger.info(f"Cargando bajo demanda el modelo {model_name}")
+            slot = self._slots[model_name] = ModelSlot(model_name, self.settings, self.warmup)
+        self._slots.move_to_end(model_name)
+        slot.last_used = time.monotonic()
+        return slot
+
+    async def acquire(self, language: Optional[str], timeout: float) -> ModelSlot:
+        """Slot listo para el idioma; hay que devolverlo con `release`"""
+        slot = self._slot(self.model_for(language))
+        slot.active += 1
+        try:
+            await slot.runtime.start()
+            await slot.runtime.wait_ready(timeout)
+        except ModelNotReady:
+            self.release(slot)
+            if slot is self.default or slot.runtime.phase != "failed":
+                raise
+            logger.warning(f"El modelo {slot.model_name} no está disponible, se usa {self.default.model_name}")
+            return await self.acquire(None, timeout)
+        await self._enforce_budget(keep=slot)
+        return slot
+
+    def release(self, slot: ModelSlot) -> None:
+        slot.active -= 1
+        slot.last_used = time.monotonic()
+
+    async def preload(self, model_name: str, timeout: float) -> ModelSlot:
+        slot = self._slot(model_name)
+        await slot.runtime.start()
+        await slot.runtime.wait_ready(timeout)
+        await self._enforce_budget(keep=slot)
+        return slot
+
+    async def evict(self, model_name: str) -> bool:
+        """Descarga un modelo; devuelve False si no estaba en el registro"""
+        slot = self._slots.get(model_name)
+        if slot is None:
+            return False
+        if slot is self.default:
+            raise ValueError("El modelo por defecto no se puede descargar")
+        if slot.active:
+            raise ValueError(f"El modelo {model_name} está atendiendo {slot.active} peticiones")
+        del self._slots[model_name]
+        await slot.close()
+        self.evictions += 1
+        logger.info(f"Modelo {model_name} descargado")
+        return True
+
+    async def _enforce_budget(self, keep: ModelSlot) -> None:
+        if not self.memory_budget:
+            return
+        # Del menos al más usado recientemente, sin tocar el por defecto, el
+        # recién pedido ni los que están atendiendo peticiones
+        for model_name, slot in list(self._slots.items()):
+            if self.memory_bytes <= self.memory_budget:
+                return
+            if slot is self.default or slot is keep or slot.active:
+                continue
+            logger.info(f"Presupuesto de memoria de modelos superado, se descarga {model_name}")
+            await self.evict(model_name)
+        if self.memory_bytes > self.memory_budget:
+            logger.warning(
+                f"Los modelos en uso ocupan {self.memory_bytes / 2**20:.0f} MB, "
+                f"por encima del presupuesto de {self.memory_budget / 2**20:.0f} MB"
+            )
+
+    async def close(self) -> None:
+        await asyncio.gather(*(slot.close() for slot in self._slots.values()))
+        # Solo se conserva el por defecto, listo para volver a arrancar
+        self._slots = OrderedDict([(self.default.model_name, self.default)])
+
+    def snapshot(self) -> Dict:
+        return {
+            "default": self.default.model_name,
+            "routes": dict(self.routes),
+            "allowed": sorted(self.allowed),
+            "memory_budget_bytes": self.memory_budget,
+            "memory_bytes": self.memory_bytes,
+            "evictions": self.evictions,
+            # Del menos al más usado recientemente
+            "loaded": [
+                {
+                    "model": slot.model_name,
+                    "phase": slot.runtime.phase,
+                    "memory_bytes": slot.memory_bytes,
+                    "active_requests": slot.active,
+                    "idle_s": round(time.monotonic() - slot.last_used, 3),
+                }
+                for slot in self._slots.values()
+            ],
+        }
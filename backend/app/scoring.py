@@ -0,0 +1,447 @@
+"""
+Puntuación offline de corpus grandes (exportaciones CSV/JSONL de varios GB).
+
+    python -m app.scoring comentarios.csv --output puntuado.jsonl --workers 4
+
+lee la entrada en streaming, reparte lotes de textos entre un pool de
+procesos que cargan el modelo una sola vez cada uno y escribe los resultados
+en orden a medida que terminan, en JSONL o en Parquet (un directorio de
+ficheros `part-NNNNN.parquet`, necesita pyarrow). El progreso se guarda en
+`<salida>.checkpoint.json`: si la ejecución se interrumpe, relanzar el mismo
+comando continúa desde la última fila guardada.
+"""
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+import argparse
+import csv
+import gzip
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+
+from app import executor as _executor
+from app.config import settings
+from app.executor import AnalyzerFactory, configure_torch_threads
+from app.lifecycle import analyzer_factory
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+logger = logging.getLogger(__name__)
+
+OUTPUT_FORMATS = ("jsonl", "parquet")
+CSV_DELIMITERS = {".csv": ",", ".tsv": "\t"}
+JSONL_SUFFIXES = (".jsonl", ".ndjson", ".json")
+
+# (fila, id, texto) de un registro de la entrada; texto None si no se pudo leer
+Record = Tuple[int, Optional[str], Optional[str]]
+ProgressFn = Callable[[int], None]
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def _input_kind(path: str) -> str:
+    name = path[:-3] if path.endswith(".gz") else path
+    for suffix in CSV_DELIMITERS:
+        if name.endswith(suffix):
+            return suffix
+    if name.endswith(JSONL_SUFFIXES):
+        return "jsonl"
+    return "text"
+
+
+def read_records(path: str, text_field: str = "text", id_field: Optional[str] = "id") -> Iterator[Record]:
+    """
+    Registros de la entrada de uno en uno, sin cargar el fichero: CSV/TSV con
+    cabecera, JSONL (una cadena u objeto por línea) o texto plano (un texto por
+    línea). Los `.gz` se descomprimen al vuelo.
+    """
+    kind = _input_kind(path)
+    with _open_text(path) as f:
+        if kind in CSV_DELIMITERS:
+            for row, entry in enumerate(csv.DictReader(f, delimiter=CSV_DELIMITERS[kind])):
+                text = entry.get(text_field)
+                yield row, entry.get(id_field) if id_field else None, text if text else None
+            return
+
+        row = 0
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line.strip():
+                continue
+            if kind == "text":
+                yield row, None, line
+            else:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    entry = None
+                if isinstance(entry, str):
+                    yield row, None, entry
+                elif isinstance(entry, dict):
+                    item_id = entry.get(id_field) if id_field else None
+                    text = entry.get(text_field)
+                    yield row, None if item_id is None else str(item_id), text if isinstance(text, str) and text else None
+                else:
+                    yield row, None, None
+            row += 1
+
+
+def _result_row(row: int, item_id: Optional[str], result: Optional[SentimentResult], error: Optional[str] = None) -> Dict:
+    if result is None:
+        return {"row": row, "id": item_id, "error": error}
+    return {
+        "row": row,
+        "id": item_id,
+        "sentiment": result.sentiment,
+        "score": result.score,
+        "confidence": result.confidence,
+        "emotions": result.emotions,
+        "intensity": result.intensity,
+        "scores": result.raw_scores,
+    }
+
+
+def _analyze(analyzer: SentimentAnalyzer, texts: List[str]) -> List[Optional[SentimentResult]]:
+    try:
+        return analyzer.analyze_batch(texts)
+    except Exception as e:
+        # Un texto problemático no debe tirar el lote entero: se repite uno a uno
+        logger.warning(f"Falló un lote de {len(texts)} textos ({e}); se reintenta texto a texto")
+        results: List[Optional[SentimentResult]] = []
+        for text in texts:
+            try:
+                results.append(analyzer.analyze_batch([text])[0])
+            except Exception:
+                results.append(None)
+        return results
+
+
+def _worker_score(texts: List[str]) -> List[Optional[SentimentResult]]:
+    # El analizador lo carga app.executor._init_worker al arrancar el proceso
+    return _analyze(_executor._worker_analyzer, texts)
+
+
+class JsonlWriter:
+    """Resultados en un fichero JSONL; el checkpoint guarda el offset en bytes"""
+
+    def __init__(self, path: str, state: Dict):
+        self.path = path
+        self.rows = state.get("rows", 0)
+        if self.rows:
+            self._file = open(path, "r+b")
+            # Lo escrito después del último checkpoint se descarta y se repite
+            self._file.truncate(state["bytes"])
+            self._file.seek(state["bytes"])
+        else:
+            self._file = open(path, "wb")
+
+    def write(self, rows: List[Dict]) -> None:
+        self._file.write(b"".join(
+            json.dumps({k: v for k, v in row.items() if v is not None}, ensure_ascii=False).encode("utf-8") + b"\n"
+            for row in rows
+        ))
+        self.rows += len(rows)
+
+    def commit(self) -> Dict:
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {"rows": self.rows, "bytes": self._file.tell()}
+
+    def close(self) -> Dict:
+        state = self.commit()
+        self._file.close()
+        return state
+
+
+class ParquetWriter:
+    """
+    Resultados en un directorio de ficheros Parquet de `part_rows` filas. Cada
+    parte se escribe entera (fichero temporal y rename), así que el checkpoint
+    solo cuenta las partes completas y lo que quedaba en memoria se repite.
+    """
+
+    def __init__(self, path: str, state: Dict, part_rows: int = 100000):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("La salida Parquet necesita 'pyarrow' (pip install pyarrow)") from e
+        self._pa = pyarrow
+        self._pq = pyarrow.parquet
+        self.schema = pyarrow.schema([
+            ("row", pyarrow.int64()),
+            ("id", pyarrow.string()),
+            ("sentiment", pyarrow.string()),
+            ("score", pyarrow.float64()),
+            ("confidence", pyarrow.float64()),
+            ("emotions", pyarrow.list_(pyarrow.string())),
+            ("intensity", pyarrow.string()),
+            ("scores", pyarrow.map_(pyarrow.string(), pyarrow.float64())),
+            ("error", pyarrow.string()),
+        ])
+        self.path = path
+        self.part_rows = part_rows
+        self.parts = state.get("parts", 0)
+        # Filas recibidas (incluidas las que esperan en memoria) y filas ya en partes completas
+        self.rows = self._durable_rows = state.get("rows", 0)
+        self._buffer: List[Dict] = []
+        os.makedirs(path, exist_ok=True)
+        # Partes de una ejecución interrumpida posteriores al checkpoint
+        for name in os.listdir(path):
+            if name.startswith("part-") and (name.endswith(".tmp") or int(name[5:10]) >= self.parts):
+                os.remove(os.path.join(path, name))
+
+    def write(self, rows: List[Dict]) -> None:
+        self._buffer.extend(rows)
+        self.rows += len(rows)
+        while len(self._buffer) >= self.part_rows:
+            self._write_part(self._buffer[:self.part_rows])
+            del self._buffer[:self.part_rows]
+
+    def _write_part(self, rows: List[Dict]) -> None:
+        columns = {name: [row.get(name) for row in rows] for name in self.schema.names}
+        columns["scores"] = [list(scores.items()) if scores is not None else None for scores in columns["scores"]]
+        table = self._pa.table(columns, schema=self.schema)
+        filename = os.path.join(self.path, f"part-{self.parts:05d}.parquet")
+        self._pq.write_table(table, filename + ".tmp")
+        os.replace(filename + ".tmp", filename)
+        self.parts += 1
+        self._durable_rows += len(rows)
+
+    def commit(self) -> Dict:
+        return {"rows": self._durable_rows, "parts": self.parts}
+
+    def close(self) -> Dict:
+        if self._buffer:
+            self._write_part(self._buffer)
+            self._buffer = []
+        return self.commit()
+
+
+class Throughput:
+    """Filas por segundo desde el último informe y de media, cada `every_s` segundos"""
+
+    def __init__(self, every_s: float = 5.0, initial: int = 0):
+        self.every = every_s
+        self.started = self._last_at = time.perf_counter()
+        self.initial = self._last_rows = initial
+
+    def rate(self, rows: int) -> float:
+        elapsed = time.perf_counter() - self.started
+        return (rows - self.initial) / elapsed if elapsed > 0 else 0.0
+
+    def __call__(self, rows: int) -> None:
+        now = time.perf_counter()
+        if now - self._last_at < self.every:
+            return
+        recent = (rows - self._last_rows) / (now - self._last_at)
+        self._last_at, self._last_rows = now, rows
+        logger.info(f"{rows} filas puntuadas, {recent:.0f} filas/s (media {self.rate(rows):.0f} filas/s)")
+
+
+def _batches(records: Iterator[Record], batch_size: int) -> Iterator[List[Record]]:
+    batch: List[Record] = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _merge(batch: List[Record], results: List[Optional[SentimentResult]]) -> List[Dict]:
+    scored = iter(results)
+    rows = []
+    for row, item_id, text in batch:
+        if text is None:
+            rows.append(_result_row(row, item_id, None, "Registro sin texto"))
+            continue
+        result = next(scored)
+        rows.append(_result_row(row, item_id, result, None if result is not None else "Falló el análisis del texto"))
+    return rows
+
+
+def _input_identity(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "input_bytes": stat.st_size, "input_mtime_ns": stat.st_mtime_ns}
+
+
+def _save_checkpoint(path: str, state: Dict) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(path + ".tmp", path)
+
+
+def _load_checkpoint(path: str, expected: Dict, output: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        state = json.load(f)
+    mismatched = [key for key, value in expected.items() if state.get(key) != value]
+    if mismatched:
+        raise ValueError(
+            f"El checkpoint {path} es de otra ejecución (difiere {', '.join(mismatched)}); "
+            "usa --restart para empezar de cero"
+        )
+    if state.get("rows") and not os.path.exists(output):
+        raise ValueError(f"Existe {path} pero no la salida {output}; usa --restart para empezar de cero")
+    return state
+
+
+def score_corpus(
+    input_path: str,
+    output_path: str,
+    model_name: str = settings.model_name,
+    factory: AnalyzerFactory = SentimentAnalyzer,
+    workers: int = 1,
+    threads_per_worker: int = 0,
+    batch_size: int = 64,
+    output_format: str = "jsonl",
+    text_field: str = "text",
+    id_field: Optional[str] = "id",
+    resume: bool = True,
+    checkpoint_seconds: float = 10.0,
+    part_rows: int = 100000,
+    progress: Optional[ProgressFn] = None
+) -> Dict:
+    """
+    Puntúa `input_path` y escribe los resultados en `output_path`, en el orden
+    de la entrada (una fila por registro; los que no tienen texto o fallan
+    llevan "error"). Con `workers` >= 1 el modelo corre en ese número de
+    procesos, cada uno con su copia y `threads_per_worker` hilos de torch; con
+    0 corre en este proceso.
+
+    Mientras el pool trabaja se mantienen a lo sumo 2 lotes por worker en
+    vuelo, así que la memoria no depende del tamaño de la entrada. Cada
+    `checkpoint_seconds` (y al terminar o interrumpirse) se guarda cuántas filas
+    hay escritas; al reanudar se vuelve a leer la entrada saltando esas filas
+    sin pasarlas por el modelo.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Formato de salida desconocido: {output_format!r} (opciones: {', '.join(OUTPUT_FORMATS)})")
+    checkpoint_path = output_path.rstrip("/" + os.sep) + ".checkpoint.json"
+    expected = {**_input_identity(input_path), "model": model_name, "format": output_format}
+    state = _load_checkpoint(checkpoint_path, expected, output_path) if resume else {}
+    if state.get("completed"):
+        logger.info(f"{output_path} ya está completo según {checkpoint_path}")
+        return {"rows": state["rows"], "resumed_from": state["rows"], "scored": 0, "rows_per_s": 0.0, "completed": True}
+
+    resumed_from = state.get("rows", 0)
+    if resumed_from:
+        logger.info(f"Reanudando desde la fila {resumed_from} de {input_path}")
+    writer = JsonlWriter(output_path, state) if output_format == "jsonl" else ParquetWriter(output_path, state, part_rows)
+    rate = Throughput(initial=resumed_from)
+    progress = progress or rate
+
+    pool: Optional[ProcessPoolExecutor] = None
+    analyzer: Optional[SentimentAnalyzer] = None
+    if workers > 0:
+        # spawn por el mismo motivo que InferenceExecutor: torch y fork no se llevan bien
+        pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_executor._init_worker,
+            initargs=(factory, model_name, threads_per_worker, 0, (), None)
+        )
+    else:
+        configure_torch_threads(threads_per_worker)
+        analyzer = factory(model_name)
+
+    records = (record for record in read_records(input_path, text_field, id_field) if record[0] >= resumed_from)
+    pending: Deque[Tuple[List[Record], Future]] = deque()
+    max_in_flight = 2 * max(1, workers)
+    last_checkpoint = time.monotonic()
+
+    def write(batch: List[Record], results: List[Optional[SentimentResult]]) -> None:
+        nonlocal last_checkpoint
+        writer.write(_merge(batch, results))
+        progress(writer.rows)
+        if time.monotonic() - last_checkpoint >= checkpoint_seconds:
+            _save_checkpoint(checkpoint_path, {**expected, **writer.commit()})
+            last_checkpoint = time.monotonic()
+
+    completed = False
+    try:
+        for batch in _batches(records, batch_size):
+            texts = [text for _, _, text in batch if text is not None]
+            if pool is None:
+                write(batch, _analyze(analyzer, texts) if texts else [])
+                continue
+            pending.append((batch, pool.submit(_worker_score, texts)))
+            # Se escribe siempre el lote más antiguo: la salida queda en el orden de la entrada
+            while len(pending) >= max_in_flight or (pending and pending[0][1].done()):
+                done_batch, future = pending.popleft()
+                write(done_batch, future.result())
+        while pending:
+            done_batch, future = pending.popleft()
+            write(done_batch, future.result())
+        completed = True
+    finally:
+        # También si se interrumpe: lo ya escrito queda en el checkpoint
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+        final = writer.close() if completed else writer.commit()
+        _save_checkpoint(checkpoint_path, {**expected, **final, "completed": completed})
+
+    rows = writer.rows
+    summary = {
+        "rows": rows,
+        "resumed_from": resumed_from,
+        "scored": rows - resumed_from,
+        "rows_per_s": round(rate.rate(rows), 1),
+        "completed": True,
+    }
+    logger.info(f"Puntuadas {summary['scored']} filas a {summary['rows_per_s']} filas/s en {output_path}")
+    return summary
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.scoring", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("input", help="CSV/TSV con cabecera, JSONL o texto plano (un texto por línea), opcionalmente .gz")
+    parser.add_argument("--output", required=True, help="Fichero JSONL o directorio Parquet")
+    parser.add_argument("--format", choices=OUTPUT_FORMATS, help="Por defecto según la extensión de --output")
+    parser.add_argument("--model", default=settings.model_name)
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--id-field", default="id", help="Columna que se copia a la salida ('' para ninguna)")
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 1) // 4),
+                        help="Procesos con el modelo (0 = en este proceso)")
+    parser.add_argument("--threads", type=int, default=0, help="Hilos de torch por worker (por defecto núcleos / workers)")
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--part-rows", type=int, default=100000, help="Filas por fichero Parquet")
+    parser.add_argument("--checkpoint-seconds", type=float, default=10.0)
+    parser.add_argument("--restart", action="store_true", help="Ignora el checkpoint y empieza de cero")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    output_format = args.format or ("parquet" if args.output.endswith((".parquet", "/")) else "jsonl")
+    threads = args.threads or max(1, (os.cpu_count() or 1) // max(1, args.workers))
+    summary = score_corpus(
+        args.input,
+        args.output,
+        model_name=args.model,
+        factory=analyzer_factory(settings),
+        workers=args.workers,
+        threads_per_worker=threads,
+        batch_size=args.batch_size,
+        output_format=output_format,
+        text_field=args.text_field,
+        id_field=args.id_field or None,
+        resume=not args.restart,
+        checkpoint_seconds=args.checkpoint_seconds,
+        part_rows=args.part_rows
+    )
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,40 @@
-from transformers import pipeline, AutoTokenizer, AutoModelForSequenceClassification
-from typing import Dict, List, Tuple
+from typing import TYPE_CHECKING, Dict, List, Optional, Tuple
 from dataclasses import dataclass
 from functools import lru_cache
+from operator import itemgetter
 import logging
-import torch
+import re
+
+from app.metrics import stage
+
+if TYPE_CHECKING:
+    from app.chunking import DocumentResult, Window
 
 
 logger = logging.getLogger(__name__)
 
-@dataclass
+# Etiquetas de los modelos de positivo/neutral/negativo (p.ej. beto-sentiment-analysis
+# o twitter-roberta-base-sentiment-latest), para mapearlas a estrellas
+POLARITY_LABELS = {"neg": -1, "negative": -1, "neu": 0, "neutral": 0, "pos": 1, "positive": 1}
+STRONG_POLARITY_SCORE = 0.9
+
+# Sentimiento, emociones e intensidad de cada número de estrellas. Todos los
+# resultados con las mismas estrellas comparten la misma lista de emociones:
+# no se copia por resultado, así que no debe modificarse
+STAR_TEMPLATES: Dict[int, Tuple[str, List[str], str]] = {
+    1: ("Muy Negativo", ["odio", "rabia", "frustración extrema", "decepción"], "Extrema"),
+    2: ("Negativo", ["molestia", "desagrado", "decepción", "irritación"], "Alta"),
+    3: ("Neutral", ["indiferencia", "calma", "duda", "ambivalencia"], "Media"),
+    4: ("Positivo", ["satisfacción", "agrado", "confianza", "optimismo"], "Alta"),
+    5: ("Muy Positivo", ["alegría", "entusiasmo", "felicidad", "excelente"], "Extrema"),
+}
+ERROR_EMOTIONS = ["error"]
+NEGATIVE_KEYWORDS = ("odio", "pésimo", "basura", "horrible", "malísimo", "asco", "terrible")
+
+_by_score = itemgetter("score")
+
+
+@dataclass(slots=True)
 class SentimentResult():
     """Result of sentiment"""
     sentiment: str
@@ -18,12 +44,39 @@ class SentimentResult():
     intensity: str
     raw_scores: Dict[str, float]
 
+
+@lru_cache(maxsize=256)
+def label_stars(label: str) -> Tuple[int, int]:
+    """
+    (estrellas, polaridad) de una etiqueta del modelo. Las etiquetas de
+    estrellas ('1 star', '5 stars', '4') dan polaridad 0; las de 3 clases dan
+    estrellas 3 y su polaridad, que con la confianza decide entre 4 y 5 (o 2 y
+    1). Un modelo tiene pocas etiquetas: se interpretan una sola vez.
+    """
+    label_lower = label.lower()
+    if 'star' in label_lower:
+        return int(label_lower.split()[0]), 0
+    if label_lower in POLARITY_LABELS:
+        return 3, POLARITY_LABELS[label_lower]
+    # Fallback for just digits or other formats
+    match = re.search(r'\d', label)
+    return (int(match.group()) if match else 3), 0
+
 class SentimentAnalyzer():
     """
     Docstring para SentimentAnalyzer
     """
 
-    def __init__(self, model_name: str = 'nlptown/bert-base-multilingual-uncased-sentiment'):
+    def __init__(
+        self,
+        model_name: str = 'nlptown/bert-base-multilingual-uncased-sentiment',
+        backend: str = 'transformers',
+        onnx_dir: Optional[str] = None,
+        max_length: int = 512,
+        bucketing: bool = True,
+        bucket_overhead_tokens: int = 64,
+        precision: str = "fp32"
+    ):
         """
         Inicializa el analizador con un modelo pre-entrenado
         
@@ -31,23 +84,33 @@ class SentimentAnalyzer():
         - nlptown/bert-base-multilingual-uncased-sentiment (5 estrellas, multilingüe)
         - cardiffnlp/twitter-roberta-base-sentiment-latest (inglés, muy preciso)
         - finiteautomata/beto-sentiment-analysis (español específico)
+
+        Motores (`backend`):
+        - transformers: pipeline de PyTorch, el de referencia
+        - onnx / onnx-int8: grafo exportado en `onnx_dir` con ONNX Runtime
+          (ver `python -m app.onnx_tools export`)
+        - stub: puntuaciones deterministas sin modelo, para benchmarks
+
+        Los textos se truncan a `max_length` tokens. Con `bucketing`, cada lote
+        se agrupa por longitud y se rellena solo dentro de cada grupo (ver
+        app.bucketing.plan_buckets). `precision` ("fp32" o "bf16") es la del
+        forward; bf16 solo está disponible en transformers sobre CPUs con
+        soporte nativo (ver app.tuning).
         """
-        logger.info(f"Inicializando SentimentAnalyzer con modelo: {model_name}")
+        logger.info(f"Inicializando SentimentAnalyzer con modelo: {model_name} (motor: {backend})")
+
+        # Los motores importan torch/transformers/onnxruntime al construirse y no
+        # a nivel de módulo: importar app.main (y SentimentResult) no debe pagar
+        # varios segundos de imports
+        from app.backends import create_backend
         
         self.model_name = model_name
-        self.device = 0 if torch.cuda.is_available() else -1
+        self.bucketing = bucketing
+        self.bucket_overhead_tokens = bucket_overhead_tokens
 
         try:
-            self.tokenizer = AutoTokenizer.from_pretrained(model_name)
-            self.model = AutoModelForSequenceClassification.from_pretrained(model_name)
-
-            self.analyzer = pipeline(
-                "sentiment-analysis",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                device=self.device,
-                top_k=None
-            )
+            self.backend = create_backend(backend, model_name, onnx_dir, max_length=max_length, precision=precision)
+            self.device = getattr(self.backend, 'device', -1)
             device_name = 'GPU' if self.device == 0 else 'CPU'
             logger.info(f"Modelo cargado exitosamente. Usando: {device_name}")
 
@@ -60,78 +123,134 @@ class SentimentAnalyzer():
         Analiza el sentimiento del texto proporcionado.
         """
         try:
-            results = self.analyzer(text)[0]
-            
-            results.sort(key=lambda x: x['score'], reverse=True)
-            top_result = results[0]
+            return self.analyze_batch([text])[0]
+        except Exception as e:
+            logger.error(f"Error analizando texto: {str(e)}")
+            return self._error_result()
+
+    def analyze_batch(self, texts: List[str]) -> List[SentimentResult]:
+        """
+        Analiza varios textos en un único forward pass del modelo.
+
+        Los resultados se devuelven en el mismo orden que los textos de entrada.
+        Si el modelo falla para el lote completo la excepción se propaga, para
+        que el llamante no confunda un fallo del modelo con un resultado neutral.
+        """
+        if not texts:
+            return []
+
+        batch_results = self._predict(list(texts))
+
+        with stage("postprocess"):
+            return [
+                self.build_result(results, self._has_negative_keywords(text))
+                for text, results in zip(texts, batch_results)
+            ]
+
+    def windows(self, text: str, overlap_tokens: int = 64) -> List["Window"]:
+        """
+        Ventanas de tokens solapadas que cubren `text` entero, para textos más
+        largos que lo que admite el modelo (ver app.chunking).
+        """
+        from app.chunking import iter_windows
+
+        return list(iter_windows(text, self.backend.token_spans, self.backend.window_tokens(), overlap_tokens))
+
+    def analyze_documents(self, texts: List[str], overlap_tokens: int = 64, batch_size: int = 32) -> List["DocumentResult"]:
+        """
+        Analiza documentos de cualquier longitud: cada uno se parte en ventanas,
+        las ventanas de todos se puntúan en lotes compartidos y se combinan en
+        un resultado por documento, con el detalle de cada ventana.
+        """
+        from app.chunking import analyze_documents
+
+        return analyze_documents(self, texts, overlap_tokens=overlap_tokens, batch_size=batch_size)
+
+    def _predict(self, texts: List[str]) -> List[List[Dict]]:
+        if not self.bucketing or len(texts) < 2:
+            return self._forward(texts)
+
+        from app.bucketing import plan_buckets
+
+        # Se tokeniza una vez: las longitudes planifican los grupos y cada
+        # grupo solo rellena sus textos ya tokenizados
+        with stage("tokenize"):
+            tokenized = self.backend.tokenize(texts)
+        with stage("bucketing"):
+            buckets = plan_buckets(self.backend.lengths(tokenized), forward_overhead_tokens=self.bucket_overhead_tokens)
+        scores: List[Optional[List[Dict]]] = [None] * len(texts)
+        for bucket in buckets:
+            with stage("tokenize"):
+                encoded = self.backend.pad(tokenized, bucket)
+            # Un forward por grupo; los resultados vuelven a su posición original
+            with stage("forward"):
+                for i, res in zip(bucket, self.backend.forward(encoded)):
+                    scores[i] = res
+        return scores
+
+    def _forward(self, texts: List[str]) -> List[List[Dict]]:
+        with stage("tokenize"):
+            encoded = self.backend.encode(texts)
+        with stage("forward"):
+            return self.backend.forward(encoded)
+
+    @staticmethod
+    def _has_negative_keywords(text: str) -> bool:
+        # Safeguard: If the confidence is low and there are strongly negative words, 
+        # override to negative. This handles cases like "Odio a mi trabajo".
+        text_lower = text.lower()
+        return any(word in text_lower for word in NEGATIVE_KEYWORDS)
+
+    @staticmethod
+    def build_result(results: List[Dict], negative_override: bool = False) -> SentimentResult:
+        """
+        Convierte las puntuaciones del pipeline para un texto en un SentimentResult.
+
+        Es estático para que otros clasificadores que produzcan scores por
+        estrellas (p.ej. el léxico de app.cascade) devuelvan el mismo resultado.
+        """
+        try:
+            top_result = max(results, key=_by_score)
             
             label = top_result['label']
             score = top_result['score']
             
             try:
-                # Handle labels like '1 star', '5 stars', or just '1', '5'
-                label_lower = label.lower()
-                if 'star' in label_lower:
-                    stars = int(label_lower.split()[0])
-                else:
-                    # Fallback for just digits or other formats
-                    import re
-                    match = re.search(r'\d', label)
-                    stars = int(match.group()) if match else 3
+                stars, polarity = label_stars(label)
+                if polarity:
+                    stars += polarity * (2 if score >= STRONG_POLARITY_SCORE else 1)
             except Exception as e:
                 logger.warning(f"Error parsing star label '{label}': {e}")
                 stars = 3
             
-            # Safeguard: If the confidence is low and there are strongly negative words, 
-            # override to negative. This handles cases like "Odio a mi trabajo".
-            negative_keywords = ["odio", "pésimo", "basura", "horrible", "malísimo", "asco", "terrible"]
-            text_lower = text.lower()
-            if any(word in text_lower for word in negative_keywords) and stars > 2:
+            if negative_override and stars > 2:
                 logger.info(f"Safeguard triggered: Overriding {stars} stars to 1 due to negative keywords.")
                 stars = 1
 
-            if stars == 1:
-                sentiment = "Muy Negativo"
-                emotions = ["odio", "rabia", "frustración extrema", "decepción"]
-                intensity = "Extrema"
-            elif stars == 2:
-                sentiment = "Negativo"
-                emotions = ["molestia", "desagrado", "decepción", "irritación"]
-                intensity = "Alta"
-            elif stars == 3:
-                sentiment = "Neutral"
-                emotions = ["indiferencia", "calma", "duda", "ambivalencia"]
-                intensity = "Media"
-            elif stars == 4:
-                sentiment = "Positivo"
-                emotions = ["satisfacción", "agrado", "confianza", "optimismo"]
-                intensity = "Alta"
-            else:  # 5 stars
-                sentiment = "Muy Positivo"
-                emotions = ["alegría", "entusiasmo", "felicidad", "excelente"]
-                intensity = "Extrema"
-
-
-            # Construir dict de scores crudos para debug
-            raw_scores = {res['label']: res['score'] for res in results}
+            sentiment, emotions, intensity = STAR_TEMPLATES.get(stars, STAR_TEMPLATES[5])
 
             return SentimentResult(
-                sentiment=sentiment,
-                score=score,
-                confidence=score,
-                emotions=emotions,
-                intensity=intensity,
-                raw_scores=raw_scores
+                sentiment,
+                score,
+                score,
+                emotions,
+                intensity,
+                # Dict de scores crudos para debug
+                {res['label']: res['score'] for res in results}
             )
             
         except Exception as e:
             logger.error(f"Error analizando texto: {str(e)}")
-            # Retornar resultado default seguro en caso de error
-            return SentimentResult(
-                sentiment="Neutral",
-                score=0.0,
-                confidence=0.0,
-                emotions=["error"],
-                intensity="Baja",
-                raw_scores={}
-            )
\ No newline at end of file
+            return SentimentAnalyzer._error_result()
+
+    @staticmethod
+    def _error_result() -> SentimentResult:
+        # Retornar resultado default seguro en caso de error
+        return SentimentResult(
+            sentiment="Neutral",
+            score=0.0,
+            confidence=0.0,
+            emotions=ERROR_EMOTIONS,
+            intensity="Baja",
+            raw_scores={}
+        )
@@ -0,0 +1,293 @@
+"""
+Perfil de ejecución en CPU: calibración de hilos, tamaño de lote y precisión.
+
+    python -m app.tuning --output perfil.json --workers 2
+    SENTIFY_RUNTIME_PROFILE_PATH=perfil.json uvicorn app.main:app
+
+La calibración mide el rendimiento (textos/s) del modelo con cada
+combinación de hilos de torch por worker, tamaño de lote y precisión (fp32,
+y bf16 en CPUs con soporte nativo). Una precisión cuyas probabilidades se
+alejan de las de fp32 más de la tolerancia se descarta sin medirla. Gana la
+combinación más rápida; a menos de un 5% se prefiere la de menos hilos y
+lotes más pequeños, que deja núcleos a los demás workers y acorta la latencia.
+
+El perfil se guarda por modelo y motor en un JSON junto con la CPU y el
+número de workers con los que se calibró: en otra máquina o con otro número
+de workers no se aplica. Los hilos inter-op no se calibran: torch solo
+permite fijarlos una vez por proceso.
+"""
+from typing import Dict, List, Optional, Sequence
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import time
+
+from app.config import settings
+from app.lifecycle import WARMUP_TEXTS, analyzer_factory
+from app.onnx_tools import DEFAULT_PARITY_TEXTS
+from app.sentiment_analyzer import SentimentAnalyzer
+
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_TEXTS = DEFAULT_PARITY_TEXTS + WARMUP_TEXTS
+DEFAULT_BATCH_SIZES = (1, 4, 8, 16, 32)
+# Diferencia máxima admitida en la probabilidad de cualquier clase respecto a fp32
+DEFAULT_TOLERANCE = 0.02
+# Diferencias de rendimiento por debajo de esto se consideran ruido
+TIE_MARGIN = 0.05
+
+
+def cpu_fingerprint() -> str:
+    """Arquitectura, modelo de CPU y núcleos: un perfil solo vale para la máquina en la que se midió"""
+    name = platform.processor() or "cpu"
+    try:
+        with open("/proc/cpuinfo", encoding="utf-8") as f:
+            name = next((line.split(":", 1)[1].strip() for line in f if line.startswith("model name")), name)
+    except OSError:
+        pass
+    return f"{platform.machine()} {name} x{os.cpu_count() or 1}"
+
+
+def thread_candidates(workers: int = 1) -> List[int]:
+    """Potencias de dos hasta los núcleos que le tocan a cada worker, y ese máximo"""
+    budget = max(1, (os.cpu_count() or 1) // max(1, workers))
+    candidates = [threads for threads in (1, 2, 4, 8, 16, 32, 64) if threads < budget]
+    return candidates + [budget]
+
+
+@dataclass
+class RuntimeProfile:
+    """Ajustes elegidos para un modelo en una máquina, y las medidas de las que salen"""
+    model: str
+    backend: str
+    cpu: str
+    workers: int
+    intra_op_threads: int
+    batch_size: int
+    precision: str
+    texts_per_second: float
+    max_score_drift: float
+    calibrated_at: str
+    trials: List[Dict] = field(default_factory=list)
+
+    @property
+    def key(self) -> str:
+        return profile_key(self.model, self.backend)
+
+    def matches(self, workers: int) -> bool:
+        return self.cpu == cpu_fingerprint() and self.workers == workers
+
+    def summary(self) -> Dict:
+        """Lo que se muestra en /ready y /stats (sin el detalle de cada medida)"""
+        report = asdict(self)
+        del report["trials"]
+        return report
+
+    def describe(self) -> str:
+        return (
+            f"{self.intra_op_threads} hilos, lotes de {self.batch_size}, {self.precision}"
+            f" ({self.texts_per_second:.0f} textos/s, calibrado {self.calibrated_at})"
+        )
+
+
+def profile_key(model: str, backend: str) -> str:
+    return f"{model}:{backend}"
+
+
+def load_profiles(path: str) -> Dict[str, RuntimeProfile]:
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return {key: RuntimeProfile(**entry) for key, entry in data.get("profiles", {}).items()}
+
+
+def save_profile(path: str, profile: RuntimeProfile) -> None:
+    """Añade o sustituye el perfil de su modelo en `path` (escritura atómica)"""
+    profiles = load_profiles(path)
+    profiles[profile.key] = profile
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"profiles": {key: asdict(entry) for key, entry in profiles.items()}}, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _cycled_batches(texts: Sequence[str], batch_size: int, count: int) -> List[List[str]]:
+    """`count` lotes de `batch_size` textos recorriendo `texts` en bucle"""
+    return [
+        [texts[(index * batch_size + offset) % len(texts)] for offset in range(batch_size)]
+        for index in range(count)
+    ]
+
+
+def _throughput(analyzer: SentimentAnalyzer, texts: Sequence[str], batch_size: int, min_seconds: float) -> float:
+    batches = _cycled_batches(texts, batch_size, max(2, -(-len(texts) // batch_size)))
+    # La primera pasada con una forma nueva reserva buffers: no cuenta
+    analyzer.analyze_batch(batches[0])
+    done = 0
+    started = time.perf_counter()
+    while True:
+        for batch in batches:
+            analyzer.analyze_batch(batch)
+            done += len(batch)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_seconds:
+            return done / elapsed
+
+
+def _score_drift(analyzer: SentimentAnalyzer, texts: Sequence[str], reference: List[Dict[str, float]]) -> float:
+    results = analyzer.analyze_batch(list(texts))
+    return max(
+        (abs(score - result.raw_scores.get(label, 0.0)) for expected, result in zip(reference, results)
+         for label, score in expected.items()),
+        default=0.0
+    )
+
+
+def calibrate(
+    analyzer: SentimentAnalyzer,
+    texts: Sequence[str] = CALIBRATION_TEXTS,
+    workers: int = 1,
+    threads: Optional[Sequence[int]] = None,
+    batch_sizes: Sequence[int] = DEFAULT_BATCH_SIZES,
+    precisions: Optional[Sequence[str]] = None,
+    tolerance: float = DEFAULT_TOLERANCE,
+    min_seconds: float = 0.3
+) -> RuntimeProfile:
+    """
+    Mide `analyzer` con cada combinación de hilos, tamaño de lote y precisión
+    (por defecto todas las que admite su motor) y devuelve el perfil con la
+    más rápida dentro de `tolerance`. Deja el analizador como estaba.
+    """
+    from app.executor import configure_torch_threads
+    import torch
+
+    backend = analyzer.backend
+    texts = list(texts)
+    threads = list(threads or thread_candidates(workers))
+    precisions = [p for p in (precisions or backend.precisions) if p in backend.precisions]
+    original_threads, original_precision = torch.get_num_threads(), backend.precision
+    trials: List[Dict] = []
+    try:
+        backend.set_precision("fp32")
+        reference = [result.raw_scores for result in analyzer.analyze_batch(texts)]
+        for precision in precisions:
+            backend.set_precision(precision)
+            drift = _score_drift(analyzer, texts, reference) if precision != "fp32" else 0.0
+            if drift > tolerance:
+                logger.info(f"Precisión {precision} descartada: se aleja {drift:.4f} de fp32 (tolerancia {tolerance})")
+                trials.append({"precision": precision, "max_score_drift": drift, "rejected": True})
+                continue
+            for thread_count in threads:
+                configure_torch_threads(thread_count)
+                for batch_size in batch_sizes:
+                    rate = _throughput(analyzer, texts, batch_size, min_seconds)
+                    logger.info(f"{precision}, {thread_count} hilos, lotes de {batch_size}: {rate:.1f} textos/s")
+                    trials.append({
+                        "precision": precision,
+                        "threads": thread_count,
+                        "batch_size": batch_size,
+                        "texts_per_second": rate,
+                        "max_score_drift": drift,
+                    })
+    finally:
+        configure_torch_threads(original_threads)
+        backend.set_precision(original_precision)
+
+    measured = [trial for trial in trials if not trial.get("rejected")]
+    if not measured:
+        raise ValueError("Ninguna combinación de la calibración queda dentro de la tolerancia")
+    fastest = max(trial["texts_per_second"] for trial in measured)
+    best = min(
+        (trial for trial in measured if trial["texts_per_second"] >= fastest * (1 - TIE_MARGIN)),
+        key=lambda trial: (trial["threads"], trial["batch_size"], -trial["texts_per_second"])
+    )
+    return RuntimeProfile(
+        model=analyzer.model_name,
+        backend=backend.name,
+        cpu=cpu_fingerprint(),
+        workers=workers,
+        intra_op_threads=best["threads"],
+        batch_size=best["batch_size"],
+        precision=best["precision"],
+        texts_per_second=round(best["texts_per_second"], 2),
+        max_score_drift=round(best["max_score_drift"], 6),
+        calibrated_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        trials=trials
+    )
+
+
+def resolve_profile(settings, model_name: str, executor=None) -> Optional[RuntimeProfile]:
+    """
+    Perfil de `model_name` para arrancar con `settings`: el guardado en
+    SENTIFY_RUNTIME_PROFILE_PATH si es de esta máquina y este número de
+    workers; si no lo hay, SENTIFY_RUNTIME_CALIBRATE está activo y se pasa
+    `executor` (app.executor.InferenceExecutor), se calibra con el modelo que
+    ya tiene cargado y se guarda. None si no hay perfil que aplicar.
+    """
+    path = settings.runtime_profile_path
+    if not path:
+        return None
+    profile = load_profiles(path).get(profile_key(model_name, settings.inference_backend))
+    if profile is not None and not profile.matches(settings.inference_workers):
+        logger.warning(
+            f"El perfil de {model_name} en {path} se calibró en otra máquina o con otros workers "
+            f"({profile.cpu}, {profile.workers} workers): no se aplica"
+        )
+        profile = None
+    if profile is None and settings.runtime_calibrate and executor is not None:
+        logger.info(f"Calibrando el perfil de ejecución de {model_name}")
+        profile = executor.calibrate(workers=settings.inference_workers, tolerance=settings.runtime_tolerance)
+        save_profile(path, profile)
+    return profile
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(item) for item in value.split(",") if item.strip()]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.tuning", description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", default=settings.runtime_profile_path or "runtime_profile.json",
+                        help="JSON de perfiles (se añade o sustituye el de este modelo)")
+    parser.add_argument("--model", default=settings.model_name)
+    parser.add_argument("--workers", type=int, default=settings.inference_workers,
+                        help="Workers de inferencia entre los que se reparten los núcleos")
+    parser.add_argument("--texts", help="Fichero con un texto por línea (por defecto, textos de ejemplo)")
+    parser.add_argument("--threads", type=_int_list, help="Hilos a probar, p.ej. 1,2,4 (por defecto según núcleos y workers)")
+    parser.add_argument("--batch-sizes", type=_int_list, default=list(DEFAULT_BATCH_SIZES))
+    parser.add_argument("--tolerance", type=float, default=settings.runtime_tolerance)
+    parser.add_argument("--min-seconds", type=float, default=0.3, help="Duración mínima de cada medida")
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+
+    texts = CALIBRATION_TEXTS
+    if args.texts:
+        with open(args.texts, encoding="utf-8") as f:
+            texts = [line.strip() for line in f if line.strip()]
+    analyzer = analyzer_factory(settings)(args.model)
+    profile = calibrate(
+        analyzer,
+        texts,
+        workers=args.workers,
+        threads=args.threads,
+        batch_sizes=args.batch_sizes,
+        tolerance=args.tolerance,
+        min_seconds=args.min_seconds
+    )
+    save_profile(args.output, profile)
+    print(json.dumps(asdict(profile), indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
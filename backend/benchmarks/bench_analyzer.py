@@ -0,0 +1,88 @@
+"""
+Microbenchmarks de SentimentAnalyzer.analyze_text por etapas y de
+RecommendationEngine (por categoría y por vecinos más cercanos, de uno en uno
+y en lote).
+
+    python -m benchmarks.bench_analyzer                                 # motor stub, sin modelo
+    python -m benchmarks.bench_analyzer --backend transformers --model <modelo>
+    python -m benchmarks.bench_analyzer --output analyzer.json
+    python -m benchmarks.bench_analyzer --catalog catalogo.db           # catálogo de recomendaciones propio
+
+Se ejecuta desde backend/. Las etapas son tokenize (tokenizer del motor),
+forward (predict del motor; el pipeline de transformers vuelve a tokenizar
+dentro), postprocess (scores -> SentimentResult) y analyze_text completo.
+Los tiempos se dan en microsegundos por llamada.
+"""
+from typing import Callable, Dict, List, Sequence
+import argparse
+import itertools
+import time
+
+from app.config import settings
+from app.recommendations import RecommendationEngine
+from app.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.common import percentiles, realistic_texts, write_report
+
+
+def measure(fn: Callable, inputs: Sequence, iterations: int, warmup: int = 5) -> Dict[str, float]:
+    """Ejecuta `fn` sobre `inputs` en bucle y devuelve percentiles en µs y llamadas por segundo"""
+    cycle = itertools.cycle(inputs)
+    for _ in range(warmup):
+        fn(next(cycle))
+    samples: List[float] = []
+    for _ in range(iterations):
+        item = next(cycle)
+        started = time.perf_counter()
+        fn(item)
+        samples.append((time.perf_counter() - started) * 1e6)
+    stats = {name: round(value, 2) for name, value in percentiles(samples).items()}
+    stats["calls_per_s"] = round(1e6 / stats["mean"], 1) if stats["mean"] else None
+    return stats
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", default="stub", help="Motor de inferencia (stub no necesita modelo)")
+    parser.add_argument("--model", default=settings.model_name)
+    parser.add_argument("--onnx-dir", default=settings.onnx_dir)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--catalog", help="Catálogo de recomendaciones JSON o SQLite (por defecto el incluido)")
+    parser.add_argument("--output", help="Guarda el informe JSON en este fichero")
+    args = parser.parse_args()
+
+    analyzer = SentimentAnalyzer(args.model, backend=args.backend, onnx_dir=args.onnx_dir)
+    backend = analyzer.backend
+    texts = realistic_texts(256)
+    scores = backend.predict(texts[:32])
+    results = [SentimentAnalyzer.build_result(s) for s in scores]
+    emotions = [result.emotions for result in results]
+    batches = [texts[i:i + args.batch_size] for i in range(0, len(texts), args.batch_size)]
+    engine = RecommendationEngine(args.catalog)
+    vector_engine = RecommendationEngine(args.catalog, mode="vector", top_k=3)
+    result_batch = (results * 8)[:256]
+
+    stages = {
+        "tokenize": measure(lambda text: backend.token_lengths([text]), texts, args.iterations),
+        "forward": measure(lambda text: backend.predict([text]), texts, args.iterations),
+        "postprocess": measure(
+            lambda pair: SentimentAnalyzer.build_result(pair[1], SentimentAnalyzer._has_negative_keywords(pair[0])),
+            list(zip(texts, scores)), args.iterations * 10
+        ),
+        "analyze_text": measure(analyzer.analyze_text, texts, args.iterations),
+        f"analyze_batch_{args.batch_size}": measure(analyzer.analyze_batch, batches, max(1, args.iterations // 10)),
+        "get_recommendations": measure(engine.get_recommendations, emotions, args.iterations * 10),
+        "recommend_vector": measure(vector_engine.recommend, results, args.iterations * 10),
+        # Un lote de 256 resultados en una sola búsqueda (lo que hace /sentify/batch)
+        "recommend_vector_batch_256": measure(vector_engine.recommend_many, [result_batch], max(1, args.iterations // 10)),
+    }
+    write_report("analyzer", {
+        "backend": backend.name,
+        "model": args.model,
+        "catalog": {key: value for key, value in engine.snapshot().items() if key in ("path", "songs", "quotes", "bytes", "load_s")},
+        "stages": stages,
+    }, args.output)
+
+
+if __name__ == "__main__":
+    main()
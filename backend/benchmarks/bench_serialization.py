@@ -0,0 +1,187 @@
+"""
+Coste por petición de construir y codificar los resultados: el camino
+anterior (SentimentResult con __dict__ y listas nuevas por resultado,
+validación en SentifyResponse y json de la librería estándar, como hace
+FastAPI con response_model) frente al actual (plantillas por estrellas,
+slots, dict directo y orjson), más el tamaño y el tiempo de un lote en
+NDJSON, MessagePack y Arrow (app.encoding).
+
+    python -m benchmarks.bench_serialization
+    python -m benchmarks.bench_serialization --results 20000 --output serialization.json
+
+Se ejecuta desde backend/. No carga ningún modelo: las puntuaciones son
+sintéticas. Los tiempos se dan en microsegundos por llamada; la memoria
+retenida es la de tener `--results` resultados vivos a la vez (p.ej. en la
+caché), medida con tracemalloc.
+"""
+from typing import Callable, Dict, List
+from dataclasses import dataclass
+from datetime import datetime
+import argparse
+import json
+import random
+import re
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from app import encoding
+from app.main import SentifyBatchResult, SentifyResponse
+from app.sentiment_analyzer import SentimentAnalyzer
+from benchmarks.bench_analyzer import measure
+from benchmarks.common import write_report
+
+RECOMMENDATION = {
+    "song": {"title": "Vivir Mi Vida", "artist": "Marc Anthony", "url": "https://open.spotify.com/track/3Q3myFA7q4Op95DOpHplaY"},
+    "color": {"hex": "#FFD700", "name": "Dorado", "meaning": "Alegría y optimismo"},
+    "quote": {"text": "La alegría es la piedra filosofal que todo lo convierte en oro.", "author": "Benjamin Franklin"},
+}
+
+
+@dataclass
+class LegacySentimentResult:
+    sentiment: str
+    score: float
+    confidence: float
+    emotions: List[str]
+    intensity: str
+    raw_scores: Dict[str, float]
+
+
+def legacy_build_result(results: List[Dict]) -> LegacySentimentResult:
+    """SentimentAnalyzer.build_result antes de las plantillas, tal cual"""
+    results = sorted(results, key=lambda x: x['score'], reverse=True)
+    label, score = results[0]['label'], results[0]['score']
+    label_lower = label.lower()
+    if 'star' in label_lower:
+        stars = int(label_lower.split()[0])
+    else:
+        match = re.search(r'\d', label)
+        stars = int(match.group()) if match else 3
+    if stars == 1:
+        sentiment, emotions, intensity = "Muy Negativo", ["odio", "rabia", "frustración extrema", "decepción"], "Extrema"
+    elif stars == 2:
+        sentiment, emotions, intensity = "Negativo", ["molestia", "desagrado", "decepción", "irritación"], "Alta"
+    elif stars == 3:
+        sentiment, emotions, intensity = "Neutral", ["indiferencia", "calma", "duda", "ambivalencia"], "Media"
+    elif stars == 4:
+        sentiment, emotions, intensity = "Positivo", ["satisfacción", "agrado", "confianza", "optimismo"], "Alta"
+    else:
+        sentiment, emotions, intensity = "Muy Positivo", ["alegría", "entusiasmo", "felicidad", "excelente"], "Extrema"
+    raw_scores = {res['label']: res['score'] for res in results}
+    return LegacySentimentResult(sentiment, score, score, emotions, intensity, raw_scores)
+
+
+def legacy_response(result) -> bytes:
+    """Lo que hace FastAPI con response_model: validar, jsonable_encoder y JSONResponse.render"""
+    response = SentifyResponse(
+        sentiment=result.sentiment,
+        score=result.score,
+        confidence=result.confidence,
+        emotions=result.emotions,
+        intensity=result.intensity,
+        recommendation=RECOMMENDATION,
+        timestamp=datetime.utcnow()
+    )
+    content = jsonable_encoder(response)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def lean_response(result) -> bytes:
+    return encoding.dumps(encoding.result_payload(result, RECOMMENDATION, datetime.utcnow()))
+
+
+def synthetic_scores(n: int, seed: int = 7) -> List[List[Dict]]:
+    rng = random.Random(seed)
+    batches = []
+    for _ in range(n):
+        weights = [rng.random() for _ in range(5)]
+        total = sum(weights)
+        batches.append([{"label": f"{i + 1} stars", "score": w / total} for i, w in enumerate(weights)])
+    return batches
+
+
+def retained_bytes(build: Callable, scores: List[List[Dict]]) -> float:
+    """Bytes por resultado que siguen ocupados mientras todos los resultados están vivos"""
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [build(item) for item in scores]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return round((after - before) / len(scores), 1)
+
+
+def batch_formats(scores: List[List[Dict]], repeat: int) -> Dict[str, Dict]:
+    results = [SentimentAnalyzer.build_result(item) for item in scores]
+    timestamp = datetime.utcnow()
+    rows = [{"index": i, "result": encoding.result_payload(r, RECOMMENDATION, timestamp)} for i, r in enumerate(results)]
+
+    def legacy_ndjson() -> bytes:
+        return b"".join(
+            (SentifyBatchResult(index=row["index"], result=SentifyResponse(**row["result"])).model_dump_json(exclude_none=True) + "\n").encode("utf-8")
+            for row in rows
+        )
+
+    encoders = {"ndjson_pydantic": legacy_ndjson, "ndjson": lambda: encoding.encode_rows(encoding.NDJSON)(rows)}
+    if encoding.available(encoding.MSGPACK):
+        encoders["msgpack"] = lambda: encoding.encode_rows(encoding.MSGPACK)(rows)
+    if encoding.available(encoding.ARROW):
+        flat = [{"index": row["index"], **row["result"]} for row in rows]
+
+        def arrow() -> bytes:
+            encoder = encoding.ArrowBatchEncoder()
+            return encoder.encode(flat) + encoder.close()
+
+        encoders["arrow"] = arrow
+
+    report = {}
+    for name, encode in encoders.items():
+        body = encode()
+        runs = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            encode()
+            runs.append(time.perf_counter() - started)
+        report[name] = {"bytes": len(body), "ms": round(min(runs) * 1000, 3), "bytes_per_result": round(len(body) / len(rows), 1)}
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark de construcción y codificación de resultados")
+    parser.add_argument("--results", type=int, default=10000, help="Resultados sintéticos")
+    parser.add_argument("--iterations", type=int, default=20000)
+    parser.add_argument("--batch-size", type=int, default=1000, help="Resultados por lote en la comparación de formatos")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", help="Guarda el informe JSON en este fichero")
+    args = parser.parse_args()
+
+    scores = synthetic_scores(args.results)
+    legacy_results = [legacy_build_result(item) for item in scores]
+    lean_results = [SentimentAnalyzer.build_result(item) for item in scores]
+
+    report = {
+        "build_result_us": {
+            "legacy": measure(legacy_build_result, scores, args.iterations),
+            "lean": measure(SentimentAnalyzer.build_result, scores, args.iterations),
+        },
+        "retained_bytes_per_result": {
+            "legacy": retained_bytes(legacy_build_result, scores),
+            "lean": retained_bytes(SentimentAnalyzer.build_result, scores),
+        },
+        "response_us": {
+            "legacy": measure(legacy_response, legacy_results, args.iterations),
+            "lean": measure(lean_response, lean_results, args.iterations),
+        },
+        "batch": batch_formats(scores[:args.batch_size], args.repeat),
+        "json_encoder": encoding.JSON_ENCODER,
+    }
+    for section in ("build_result_us", "response_us"):
+        legacy, lean = report[section]["legacy"]["mean"], report[section]["lean"]["mean"]
+        report[section]["speedup"] = round(legacy / lean, 2) if lean else None
+    write_report("serialization", report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Utilidades compartidas por los benchmarks: corpus sintético, percentiles e informes JSON"""
+from typing import Dict, List, Optional, Sequence
+from datetime import datetime, timezone
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+
+WORDS = (
+    "me encanta el servicio pero la entrega tardó demasiado y el producto llegó roto "
+    "excelente atención muy amables volveré a comprar no funciona nada pésimo horrible "
+    "está bien cumple su función normal sin más la aplicación se cuelga a veces"
+).split()
+
+
+def realistic_texts(n: int, seed: int = 7) -> List[str]:
+    """
+    Textos sintéticos con longitudes log-normales recortadas al máximo de 500
+    caracteres de SentifyRequest.text: muchos textos cortos y una cola de largos.
+    """
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(n):
+        words = max(3, int(rng.lognormvariate(2.3, 0.9)))
+        text = " ".join(rng.choice(WORDS) for _ in range(words))
+        texts.append(text[:500])
+    return texts
+
+
+def percentiles(samples: Sequence[float], points: Sequence[int] = (50, 95, 99)) -> Dict[str, float]:
+    """Percentiles por el método del rango más cercano, más media, mínimo y máximo"""
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    stats = {f"p{p}": ordered[min(len(ordered) - 1, max(0, -(-p * len(ordered) // 100) - 1))] for p in points}
+    stats.update(mean=sum(ordered) / len(ordered), min=ordered[0], max=ordered[-1])
+    return stats
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict:
+    """Contexto de la ejecución, para no comparar resultados de máquinas distintas sin saberlo"""
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def write_report(name: str, results: Dict, output: Optional[str] = None) -> Dict:
+    """Imprime el informe y, con `output`, lo guarda como JSON para compararlo después"""
+    report = {"benchmark": name, "environment": environment(), "results": results}
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    print(text)
+    return report
@@ -0,0 +1,74 @@
+"""
+Compara dos informes JSON de los benchmarks (p.ej. de dos commits).
+
+    python -m benchmarks.compare antes.json despues.json --threshold 0.1
+
+Lista cada métrica numérica común con su variación y marca como regresión
+las que empeoran más que --threshold: latencias y tiempos que suben, o
+throughput y ahorros que bajan. Sale con código 1 si hay alguna regresión.
+"""
+from typing import Dict
+import argparse
+import json
+import sys
+
+# Métricas en las que más es mejor; en el resto (latencias, tiempos) menos es mejor
+HIGHER_IS_BETTER = ("throughput", "per_s", "savings", "agreement", "hit_rate")
+# Parámetros y métricas informativas que no se evalúan
+IGNORED = (
+    "concurrency", "requests", "texts", "batch_size", "iterations", "min", "max", "errors",
+    "status_codes", "avg_batch_size", "stub_batch_ms", "stub_token_ms", "songs", "quotes",
+)
+
+
+def flatten(data, prefix: str = "") -> Dict[str, float]:
+    """{"a": {"b": [1, 2]}} -> {"a.b.0": 1, "a.b.1": 2}, solo hojas numéricas"""
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        # Los niveles de la prueba de carga se identifican por su concurrencia
+        items = ((f"c{item['concurrency']}" if isinstance(item, dict) and "concurrency" in item else str(i), item)
+                 for i, item in enumerate(data))
+    else:
+        if isinstance(data, (int, float)) and not isinstance(data, bool):
+            return {prefix: float(data)}
+        return {}
+    flat: Dict[str, float] = {}
+    for key, value in items:
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Variación relativa tolerada (0.1 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline = flatten(json.load(f)["results"])
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate = flatten(json.load(f)["results"])
+
+    regressions = 0
+    for key in sorted(baseline.keys() & candidate.keys()):
+        if any(part in IGNORED for part in key.split(".")):
+            continue
+        old, new = baseline[key], candidate[key]
+        change = (new - old) / old if old else 0.0
+        worse = -change if any(word in key for word in HIGHER_IS_BETTER) else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "  REGRESIÓN"
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = "  mejora"
+        print(f"{key:60} {old:>12.3f} -> {new:>12.3f} ({change:+.1%}){flag}")
+
+    print(f"\n{regressions} regresiones por encima del {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""
+Prueba de carga en proceso de POST /sentify a varios niveles de concurrencia.
+
+    python -m benchmarks.load_test                                   # motor stub, sin modelo
+    python -m benchmarks.load_test --concurrency 1 8 32 --requests 1000
+    python -m benchmarks.load_test --backend transformers --output load.json
+
+Se ejecuta desde backend/. La app se monta en el mismo proceso (lifespan
+incluido) y se le habla por ASGI con httpx, así que no hay red ni servidor de
+por medio: se mide el servicio (batching, caché, inferencia), no uvicorn.
+Cada nivel es un bucle cerrado: `concurrency` clientes lanzan la siguiente
+petición en cuanto reciben la respuesta anterior.
+
+Con el motor stub, --stub-batch-ms y --stub-token-ms simulan el coste de un
+forward para que el micro-batching tenga algo que amortizar.
+"""
+from typing import Dict, List
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+from benchmarks.common import percentiles, realistic_texts, write_report
+
+
+async def run_level(client, texts: List[str], concurrency: int, requests: int, timeout: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    pending = iter(range(requests))
+
+    async def user() -> None:
+        for i in pending:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/sentify", json={"text": texts[i % len(texts)], "include_song": True}, timeout=timeout
+                )
+                status = response.status_code
+            except Exception:
+                status = 0
+            latencies.append((time.perf_counter() - started) * 1000)
+            statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1),
+        "latency_ms": {name: round(value, 2) for name, value in percentiles(latencies).items()},
+        "errors": requests - statuses.get(200, 0),
+        "status_codes": statuses,
+    }
+
+
+async def run(args) -> Dict:
+    import httpx
+    from app.backends import StubBackend
+    from app.main import app, batcher, cache, runtime
+
+    # Los logs por petición distorsionarían las latencias
+    logging.getLogger().setLevel(logging.WARNING)
+    StubBackend.batch_ms = args.stub_batch_ms
+    StubBackend.token_ms = args.stub_token_ms
+
+    # Un texto distinto por petición salvo que se quiera medir la caché
+    texts = realistic_texts(max(args.requests, 1), seed=args.seed)
+    # (el sufijo cabe en el máximo de 500 caracteres de SentifyRequest.text)
+    texts = [f"{text[:490]} #{i}" for i, text in enumerate(texts)] if not args.cache else texts[:64]
+
+    levels = []
+    async with app.router.lifespan_context(app):
+        await runtime.wait_ready(args.startup_timeout)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Calentar el camino completo (validación, batching, recomendación)
+            await run_level(client, texts, 1, 10, args.timeout)
+            for concurrency in args.concurrency:
+                cache.clear()
+                before = batcher.snapshot()
+                level = await run_level(client, texts, concurrency, args.requests, args.timeout)
+                after = batcher.snapshot()
+                batches = after["batches"] - before["batches"]
+                level["avg_batch_size"] = round((after["items"] - before["items"]) / batches, 2) if batches else 0.0
+                levels.append(level)
+                logging.getLogger(__name__).warning(
+                    f"c={concurrency}: {level['throughput_rps']} req/s, p99={level['latency_ms'].get('p99')}ms"
+                )
+
+    return {
+        "backend": runtime.settings.inference_backend,
+        "model": runtime.settings.model_name,
+        "stub_batch_ms": args.stub_batch_ms,
+        "stub_token_ms": args.stub_token_ms,
+        "cache": args.cache,
+        "levels": levels,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--backend", default="stub", help="Motor de inferencia (stub no necesita modelo)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--requests", type=int, default=500, help="Peticiones por nivel de concurrencia")
+    parser.add_argument("--stub-batch-ms", type=float, default=5.0)
+    parser.add_argument("--stub-token-ms", type=float, default=0.02)
+    parser.add_argument("--cache", action="store_true", help="Repite 64 textos con la caché activa")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--startup-timeout", type=float, default=600.0)
+    parser.add_argument("--output", help="Guarda el informe JSON en este fichero")
+    args = parser.parse_args()
+
+    # La configuración se lee al importar app.main, así que va por entorno
+    os.environ["SENTIFY_INFERENCE_BACKEND"] = args.backend
+    if not args.cache:
+        os.environ["SENTIFY_CACHE_MAX_ENTRIES"] = "0"
+
+    results = asyncio.run(run(args))
+    write_report("load_test", results, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import asyncio
+from app.analytics import QuantileHistogram, RollingAnalytics, SpaceSaving
+from app.sentiment_analyzer import SentimentAnalyzer
+
+
+def result(stars, emotions=("calma",)):
+    scores = [{"label": f"{i} stars", "score": 0.96 if i == stars else 0.01} for i in range(1, 6)]
+    built = SentimentAnalyzer.build_result(scores)
+    built.emotions = list(emotions)
+    return built
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_quantile_histogram_is_within_one_bin():
+    histogram = QuantileHistogram(1.0, 5.0, 80)
+    for i in range(1000):
+        histogram.add(1.0 + 4.0 * i / 999)
+    assert abs(histogram.quantile(0.5) - 3.0) <= 0.05
+    assert abs(histogram.quantile(0.9) - 4.6) <= 0.05
+    assert abs(histogram.mean - 3.0) < 1e-9
+
+
+def test_space_saving_keeps_heavy_hitters():
+    sketch = SpaceSaving(4)
+    for i in range(200):
+        sketch.add("alegría")
+        if i % 2:
+            sketch.add("calma")
+        sketch.add(f"rara-{i}")
+    assert [item for item, _ in sketch.top(2)] == ["alegría", "calma"]
+    assert len(sketch.counts) == 4
+
+
+def test_buckets_roll_and_windows_merge():
+    clock = Clock()
+    analytics = RollingAnalytics(minute_buckets=3, hour_buckets=2, clock=clock)
+    analytics.record(result(5, ["alegría"]))
+    analytics.record(result(1, ["rabia"]))
+    clock.now += 60
+    analytics.record(result(5, ["alegría"]))
+    # Sin agregar todavía: record solo encola
+    assert analytics.snapshot()["pending"] == 3
+    # query tampoco: lee lo ya agregado
+    assert analytics.query("minute", buckets=2)["summary"]["count"] == 0
+
+    analytics.flush()
+    report = analytics.query("minute", buckets=2)
+    assert [bucket["count"] for bucket in report["series"]] == [2, 1]
+    summary = report["summary"]
+    assert summary["sentiments"] == {"Muy Positivo": 2, "Muy Negativo": 1}
+    assert summary["top_emotions"][0] == {"emotion": "alegría", "count": 2}
+    assert 1.0 <= summary["p50_stars"] <= 5.0
+    assert analytics.query("hour", buckets=1)["summary"]["count"] == 3
+
+    # Tres minutos después las cubetas antiguas ya se han reutilizado
+    clock.now += 180
+    analytics.record(result(3))
+    analytics.flush()
+    report = analytics.query("minute", buckets=10)
+    assert len(report["series"]) == 3
+    assert report["summary"]["count"] == 1
+
+
+def test_pending_is_bounded_and_flushed_in_background():
+    analytics = RollingAnalytics(max_pending=2, flush_seconds=0.01)
+
+    async def run():
+        analytics.start()
+        analytics.record_many([result(4), result(4), result(4)])
+        await asyncio.sleep(0.05)
+        snapshot = analytics.snapshot()
+        await analytics.stop()
+        return snapshot
+
+    snapshot = asyncio.run(run())
+    assert (snapshot["pending"], snapshot["recorded"], snapshot["dropped"]) == (0, 2, 1)
+
+
+def test_drain_yields_between_slices():
+    analytics = RollingAnalytics(flush_batch=4)
+    analytics.record_many([result(2) for _ in range(10)])
+    seen = []
+
+    async def observer():
+        # Corre entre tandas: el event loop no queda bloqueado toda la agregación
+        while analytics.snapshot()["pending"]:
+            seen.append(analytics.snapshot()["recorded"])
+            await asyncio.sleep(0)
+
+    async def run():
+        watcher = asyncio.ensure_future(observer())
+        await asyncio.sleep(0)
+        flushed = await analytics.drain()
+        await watcher
+        return flushed
+
+    assert asyncio.run(run()) == 10
+    assert seen[:3] == [0, 4, 8]
+    assert analytics.snapshot()["recorded"] == 10
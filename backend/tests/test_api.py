@@ -1,3 +1,5 @@
+import json
+import time
 import pytest
 
 def test_health_check(client):
@@ -7,6 +9,20 @@ def test_health_check(client):
     assert data["status"] == "healthy"
     assert "timestamp" in data
 
+def test_ready_endpoint(client):
+    # El modelo se carga en segundo plano: esperar a que termine el warm-up
+    for _ in range(120):
+        response = client.get("/ready")
+        if response.status_code == 200:
+            break
+        assert response.json()["phase"] == "loading"
+        time.sleep(0.5)
+
+    assert response.status_code == 200
+    data = response.json()
+    assert data["ready"] is True
+    assert {"import_s", "load_s", "warmup_s"} <= set(data["timings"])
+
 def test_root_endpoint(client):
     response = client.get("/")
     assert response.status_code == 200
@@ -43,3 +59,193 @@ def test_emotions_endpoint(client):
     data = response.json()
     assert "emotions" in data
     assert len(data["emotions"]) > 0
+
+def test_sentify_batch_endpoint(client):
+    payload = {
+        "items": [
+            "Estoy muy feliz con el resultado.",
+            {"id": "c-2", "text": "No"},
+            {"id": "c-3", "text": "El servicio fue pésimo."}
+        ],
+        "include_recommendation": False
+    }
+    response = client.post("/sentify/batch", json=payload)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["index"] for line in lines] == [0, 1, 2]
+    assert "sentiment" in lines[0]["result"]
+    assert lines[1]["id"] == "c-2" and "error" in lines[1]
+    assert lines[2]["id"] == "c-3" and "result" in lines[2]
+
+
+def test_sentify_batch_stream_endpoint(client):
+    body = '"Un día tranquilo en casa."\n{"id": "x", "text": "Me encanta"}\nno es json\n'
+    response = client.post("/sentify/batch/stream", content=body.encode("utf-8"))
+    assert response.status_code == 200
+
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 3
+    assert "result" in lines[0]
+    assert lines[1]["id"] == "x"
+    assert "error" in lines[2]
+
+def test_sentify_batch_stream_rejects_large_uploads(client, monkeypatch):
+    import dataclasses
+    from app import main
+
+    monkeypatch.setattr(main, "settings", dataclasses.replace(main.settings, bulk_max_upload_mb=0.0001))
+    body = b'"Un d\xc3\xada tranquilo en casa."\n' * 10
+
+    def chunked():
+        # Sin Content-Length: el límite se aplica al volcar la subida
+        yield body
+
+    assert client.post("/sentify/batch/stream", content=body).status_code == 413
+    assert client.post("/sentify/batch/stream", content=chunked()).status_code == 413
+    assert client.post("/sentify/batch/stream", content=body[:60]).status_code == 200
+
+def test_sentify_document_endpoint(client):
+    text = "El hotel era precioso y el personal muy amable, pero la habitación olía a humedad. " * 150
+    response = client.post("/sentify/document", json={"text": text, "include_recommendation": False})
+    assert response.status_code == 200
+    data = response.json()
+    assert len(data["segments"]) > 1
+    assert data["segments"][-1]["end"] == len(text.rstrip())
+    assert 1 <= data["stars"] <= 5 and data["recommendation"] is None
+
+    response = client.post("/sentify/document", json={"text": text, "stream": True})
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["segment"]["index"] for line in lines[:-1]] == list(range(len(data["segments"])))
+    assert lines[-1]["result"]["stars"] == data["stars"]
+    assert "segments" not in lines[-1]["result"]
+
+def test_sentify_document_model_not_ready(client, monkeypatch):
+    from app.batching import BatchScheduler
+    from app.lifecycle import ModelNotReady
+
+    async def unloaded(self, texts):
+        raise ModelNotReady("El modelo se está cargando")
+
+    monkeypatch.setattr(BatchScheduler, "run_batch", unloaded)
+    text = "Un texto largo que no llega a puntuarse porque el modelo no está listo. " * 100
+    response = client.post("/sentify/document", json={"text": text, "include_recommendation": False})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "5"
+
+    response = client.post("/sentify/document", json={"text": text, "stream": True})
+    assert json.loads(response.text.splitlines()[-1]) == {"error": "El modelo se está cargando", "status": 503, "retry_after": 5}
+
+def test_binary_formats_selected_by_accept(client):
+    msgpack = pytest.importorskip("msgpack")
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    response = client.post("/sentify", json={"text": "Me encanta este lugar"}, headers={"Accept": "application/msgpack"})
+    assert response.headers["content-type"] == "application/msgpack"
+    assert "sentiment" in msgpack.unpackb(response.content)
+    # Sin ningún formato aceptable se responde JSON, no 406
+    response = client.post("/sentify", json={"text": "Me encanta"}, headers={"Accept": "text/plain"})
+    assert response.status_code == 200 and response.headers["content-type"] == "application/json"
+
+    items = ["Me encanta", "no", {"id": "c-1", "text": "Odio esperar tanto"}]
+    response = client.post("/sentify/batch", json={"items": items}, headers={"Accept": "application/vnd.apache.arrow.stream"})
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column("index").to_pylist() == [0, 1, 2]
+    assert table.column("error")[1].as_py() and table.column("id")[2].as_py() == "c-1"
+    # application/json sigue respondiendo NDJSON
+    response = client.post("/sentify/batch", json={"items": items}, headers={"Accept": "application/json"})
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    assert len(response.text.splitlines()) == 3
+
+def test_overloaded_queue_sheds_with_retry_after(client, monkeypatch):
+    from app.batching import BatchScheduler, Overloaded
+
+    def saturated(self, lane):
+        raise Overloaded(lane, "queue_full", 3)
+
+    monkeypatch.setattr(BatchScheduler, "admit", saturated)
+    response = client.post("/sentify", json={"text": "Un texto que nunca llega al modelo"})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "3"
+    response = client.post("/sentify/batch", json={"items": ["uno", "dos"]})
+    assert response.status_code == 429 and response.headers["Retry-After"] == "3"
+
+def test_analytics_endpoint(client):
+    from app import main
+
+    client.post("/sentify", json={"text": "Me encanta este lugar, todo perfecto"})
+    # La agregación va en segundo plano; aquí se fuerza para no esperar al tick
+    main.analytics.flush()
+    data = client.get("/analytics", params={"resolution": "minute", "buckets": 5}).json()
+    assert len(data["series"]) == 5
+    assert data["summary"]["count"] >= 1 and data["summary"]["top_emotions"]
+    assert client.get("/analytics", params={"resolution": "day"}).status_code == 422
+
+def test_sentify_enriches_songs_from_music_catalog(client, monkeypatch):
+    from app import main
+    from app.catalog_stub import catalog_tracks
+    from app.music_catalog import MusicCatalogClient, parse_track
+    from app.recommendations import DEFAULT_CATALOG
+
+    catalog = MusicCatalogClient("http://catalogo-sin-red")
+    for id_, track in catalog_tracks(DEFAULT_CATALOG).items():
+        catalog.cache.put(id_, parse_track(track))
+    monkeypatch.setattr(main, "music_catalog", catalog)
+    song = client.post("/sentify", json={"text": "Me encanta este lugar, todo perfecto"}).json()["recommendation"]["song"]
+    assert song["album"] and song["duration_ms"] > 0
+    stats = client.get("/stats").json()["music_catalog"]
+    assert stats["hits"] >= 1 and stats["requests"] == 0
+
+def test_live_websocket(client):
+    with client.websocket_connect("/sentify/live") as ws:
+        ws.send_text("No")
+        assert "error" in ws.receive_json()
+        ws.send_json({"text": "Me encanta", "seq": 10})
+        ws.send_json({"text": "Me encanta este lugar", "seq": 11, "include_recommendation": False})
+        frame = ws.receive_json()
+        # Solo el último texto se analiza
+        assert frame["seq"] == 11
+        assert "sentiment" in frame["result"] and frame["result"]["recommendation"] is None
+    assert client.get("/stats").json()["live"]["sessions"] == 0
+
+def test_metrics_endpoint(client):
+    client.post("/sentify", json={"text": "Me gusta bastante este servicio."})
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    body = response.text
+    for stage in ("validation", "analysis", "tokenize", "forward", "postprocess", "recommendation", "serialization"):
+        assert f'sentify_stage_seconds_count{{stage="{stage}"}}' in body
+    assert 'sentify_request_seconds_count{path="/sentify",status="200"}' in body
+    assert 'sentify_requests_in_flight{path="/metrics"} 1' in body
+    assert "sentify_batches_total" in body
+    assert 'process_memory_bytes{kind="rss"}' in body
+
+def test_admin_endpoints_disabled_without_token(client):
+    assert client.get("/admin/models").status_code == 404
+    assert client.post("/admin/models/preload", json={"model": "org/cualquiera"}).status_code == 404
+    assert client.post("/admin/catalog/reload").status_code == 404
+
+def test_admin_models_endpoints(client, monkeypatch):
+    from dataclasses import replace
+    from app import main
+
+    monkeypatch.setattr(main, "settings", replace(main.settings, admin_token="secreto"))
+    assert client.get("/admin/models", headers={"X-Admin-Token": "otro"}).status_code == 401
+    admin = {"X-Admin-Token": "secreto"}
+    response = client.get("/admin/models", headers=admin)
+    assert response.status_code == 200
+    data = response.json()
+    default = data["default"]
+    assert default in [entry["model"] for entry in data["loaded"]]
+
+    # El modelo por defecto no se descarga; uno desconocido no está cargado
+    assert client.delete(f"/admin/models/{default}", headers=admin).status_code == 409
+    assert client.delete("/admin/models/org/no-cargado", headers=admin).status_code == 404
+    assert client.post("/admin/models/preload", json={}, headers=admin).status_code == 422
+    # Solo el modelo por defecto, los de idioma y SENTIFY_ALLOWED_MODELS
+    assert client.post("/admin/models/preload", json={"model": "org/cualquiera"}, headers=admin).status_code == 403
+
+    response = client.post("/admin/models/preload", json={"model": default}, headers=admin)
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
@@ -0,0 +1,66 @@
+import pytest
+from app.backends import create_backend
+from app.onnx_tools import parity_report
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+class FixedAnalyzer:
+    """Analizador sin modelo que devuelve siempre las mismas probabilidades"""
+
+    def __init__(self, sentiment, raw_scores):
+        self.sentiment = sentiment
+        self.raw_scores = raw_scores
+
+    def analyze_batch(self, texts):
+        return [
+            SentimentResult(
+                sentiment=self.sentiment,
+                score=max(self.raw_scores.values()),
+                confidence=max(self.raw_scores.values()),
+                emotions=["calma"],
+                intensity="Media",
+                raw_scores=dict(self.raw_scores)
+            )
+            for _ in texts
+        ]
+
+
+def test_unknown_backend():
+    with pytest.raises(ValueError):
+        create_backend("tensorrt", "modelo")
+
+
+def test_unsupported_precision():
+    # bf16 solo existe en transformers sobre CPUs con soporte nativo
+    with pytest.raises(ValueError):
+        create_backend("stub", "stub", precision="bf16")
+
+
+def test_missing_onnx_graph_points_to_export(tmp_path):
+    pytest.importorskip("onnxruntime")
+    with pytest.raises(FileNotFoundError, match="app.onnx_tools export"):
+        create_backend("onnx-int8", "modelo", onnx_dir=str(tmp_path))
+
+
+def test_parity_report_measures_agreement_and_drift():
+    reference = FixedAnalyzer("Positivo", {"4 stars": 0.6, "5 stars": 0.4})
+    close = FixedAnalyzer("Positivo", {"4 stars": 0.55, "5 stars": 0.45})
+    flipped = FixedAnalyzer("Muy Positivo", {"4 stars": 0.4, "5 stars": 0.6})
+
+    report = parity_report(reference, close, ["a", "b", "c"], batch_size=2)
+    assert report["label_agreement"] == 1.0
+    assert report["max_score_drift"] == pytest.approx(0.05)
+
+    report = parity_report(reference, flipped, ["a"])
+    assert report["sentiment_agreement"] == 0.0
+    assert report["disagreements"][0]["candidate"] == "Muy Positivo"
+
+
+def test_stub_backend_is_deterministic():
+    analyzer = SentimentAnalyzer("stub", backend="stub")
+    first = analyzer.analyze_batch(["Me encanta", "No funciona nada", "Me encanta"])
+    second = analyzer.analyze_batch(["Me encanta"])
+
+    assert first[0] == first[2] == second[0]
+    assert sum(first[1].raw_scores.values()) == pytest.approx(1.0)
+    assert set(first[1].raw_scores) == {"1 star", "2 stars", "3 stars", "4 stars", "5 stars"}
@@ -0,0 +1,276 @@
+import asyncio
+import pytest
+from app.batching import BatchScheduler, Overloaded
+from app.sentiment_analyzer import SentimentResult
+
+
+def _result(text):
+    return SentimentResult(
+        sentiment=text,
+        score=1.0,
+        confidence=1.0,
+        emotions=["calma"],
+        intensity="Media",
+        raw_scores={}
+    )
+
+
+class RecordingBatchFn:
+    def __init__(self):
+        self.calls = []
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        return [_result(text) for text in texts]
+
+
+def test_concurrent_requests_share_one_batch():
+    batch_fn = RecordingBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=8, max_wait_ms=20)
+
+    async def run():
+        texts = [f"texto {i}" for i in range(5)]
+        results = await asyncio.gather(*(scheduler.submit(t) for t in texts))
+        await scheduler.close()
+        return texts, results
+
+    texts, results = asyncio.run(run())
+    assert [r.sentiment for r in results] == texts
+    assert batch_fn.calls == [texts]
+    assert scheduler.stats.batches == 1
+    assert scheduler.snapshot()["batch_size_histogram"] == {5: 1}
+
+
+def test_batches_respect_max_size():
+    batch_fn = RecordingBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=3, max_wait_ms=20)
+
+    async def run():
+        results = await asyncio.gather(*(scheduler.submit(f"t{i}") for i in range(7)))
+        await scheduler.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [r.sentiment for r in results] == [f"t{i}" for i in range(7)]
+    assert [len(call) for call in batch_fn.calls] == [3, 3, 1]
+
+
+def test_batch_errors_propagate_to_every_caller():
+    async def failing(texts):
+        raise RuntimeError("modelo caído")
+
+    scheduler = BatchScheduler(failing, max_batch_size=4, max_wait_ms=5)
+
+    async def run():
+        outcomes = await asyncio.gather(
+            scheduler.submit("uno"), scheduler.submit("dos"), return_exceptions=True
+        )
+        await scheduler.close()
+        return outcomes
+
+    outcomes = asyncio.run(run())
+    assert all(isinstance(o, RuntimeError) for o in outcomes)
+
+
+def test_batches_run_concurrently_up_to_limit():
+    active = 0
+    peak = 0
+
+    async def slow(texts):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.05)
+        active -= 1
+        return [_result(text) for text in texts]
+
+    scheduler = BatchScheduler(slow, max_batch_size=1, max_wait_ms=0, max_concurrency=2)
+
+    async def run():
+        results = await asyncio.gather(*(scheduler.submit(f"t{i}") for i in range(6)))
+        await scheduler.close()
+        return results
+
+    results = asyncio.run(run())
+    assert [r.sentiment for r in results] == [f"t{i}" for i in range(6)]
+    assert peak == 2
+
+
+def test_invalid_batch_size():
+    with pytest.raises(ValueError):
+        BatchScheduler(RecordingBatchFn(), max_batch_size=0)
+    with pytest.raises(ValueError):
+        BatchScheduler(RecordingBatchFn(), max_concurrency=0)
+
+
+def test_close_while_batch_in_flight_releases_callers():
+    started = asyncio.Event()
+
+    async def blocked(texts):
+        started.set()
+        await asyncio.sleep(3600)
+
+    scheduler = BatchScheduler(blocked, max_batch_size=4, max_wait_ms=0)
+
+    async def run():
+        waiter = asyncio.ensure_future(scheduler.submit("uno"))
+        await started.wait()
+        await scheduler.close()
+        outcome = await asyncio.wait_for(asyncio.gather(waiter, return_exceptions=True), 1)
+        return outcome[0]
+
+    outcome = asyncio.run(run())
+    assert isinstance(outcome, asyncio.CancelledError)
+    assert scheduler.batches_in_flight == 0
+
+
+def test_run_batch_shares_the_concurrency_limit():
+    active = 0
+    peak = 0
+
+    async def slow(texts):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.02)
+        active -= 1
+        return [_result(text) for text in texts]
+
+    scheduler = BatchScheduler(slow, max_batch_size=1, max_wait_ms=0, max_concurrency=1)
+
+    async def run():
+        await asyncio.gather(
+            scheduler.run_batch(["a", "b"]),
+            scheduler.run_batch(["c"]),
+            scheduler.submit("d"),
+        )
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert peak == 1
+
+
+def test_run_batch_records_stats_without_queue_wait():
+    async def timed(texts):
+        await asyncio.sleep(0.1 if texts == ["lento"] else 0)
+        return [_result(text) for text in texts]
+
+    scheduler = BatchScheduler(timed, max_concurrency=1)
+
+    async def run():
+        # El segundo lote espera ~0.1 s al hueco, pero su forward es instantáneo
+        await asyncio.gather(scheduler.run_batch(["lento"]), scheduler.run_batch(["a", "b"]))
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert (scheduler.stats.batches, scheduler.stats.items) == (2, 3)
+    assert scheduler.stats.batch_seconds < 0.09
+
+
+def test_run_batch_is_not_blocked_by_an_idle_scheduler():
+    scheduler = BatchScheduler(RecordingBatchFn(), max_batch_size=4, max_wait_ms=0, max_concurrency=1)
+
+    async def run():
+        await scheduler.submit("primero")
+        # El worker queda esperando la siguiente petición; no debe retener el hueco
+        results = await asyncio.wait_for(scheduler.run_batch(["a", "b"]), 1)
+        await scheduler.close()
+        return results
+
+    assert [r.sentiment for r in asyncio.run(run())] == ["a", "b"]
+
+
+class GatedBatchFn(RecordingBatchFn):
+    """Cada lote espera a que el test abra la puerta"""
+
+    def __init__(self):
+        super().__init__()
+        self.gate = asyncio.Event()
+
+    async def __call__(self, texts):
+        self.calls.append(list(texts))
+        await self.gate.wait()
+        return [_result(text) for text in texts]
+
+
+def test_interactive_batches_go_before_waiting_bulk():
+    batch_fn = GatedBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=1, max_concurrency=1)
+
+    async def run():
+        busy = asyncio.ensure_future(scheduler.run_batch(["ocupado"]))
+        await asyncio.sleep(0.01)
+        waiting_bulk = asyncio.ensure_future(scheduler.run_batch(["masivo"]))
+        await asyncio.sleep(0.01)
+        interactive = asyncio.ensure_future(scheduler.submit("suelto"))
+        await asyncio.sleep(0.01)
+        assert scheduler.snapshot()["bulk_waiting"] == 1
+        batch_fn.gate.set()
+        await asyncio.gather(busy, waiting_bulk, interactive)
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert batch_fn.calls == [["ocupado"], ["suelto"], ["masivo"]]
+
+
+def test_full_queue_is_shed_with_retry_after():
+    batch_fn = GatedBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=1, max_wait_ms=1, max_queue=2)
+
+    async def run():
+        first = asyncio.ensure_future(scheduler.submit("en vuelo"))
+        await asyncio.sleep(0.01)
+        queued = [asyncio.ensure_future(scheduler.submit(f"cola {i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as shed:
+            await scheduler.submit("sobra")
+        batch_fn.gate.set()
+        await asyncio.gather(first, *queued)
+        await scheduler.close()
+        return shed.value
+
+    shed = asyncio.run(run())
+    assert (shed.lane, shed.reason) == ("interactive", "queue_full") and shed.retry_after >= 1
+    assert scheduler.snapshot()["shed"] == {"interactive:queue_full": 1}
+    assert "sobra" not in sum(batch_fn.calls, [])
+
+
+def test_queue_wait_timeout_never_reaches_the_model():
+    batch_fn = GatedBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=1, max_wait_ms=1, max_queue_wait_ms=20, max_bulk_wait_ms=20)
+
+    async def run():
+        busy = asyncio.ensure_future(scheduler.submit("en vuelo"))
+        await asyncio.sleep(0.01)
+        with pytest.raises(Overloaded) as interactive:
+            await scheduler.submit("espera demasiado")
+        with pytest.raises(Overloaded) as bulk:
+            await scheduler.run_batch(["masivo"])
+        batch_fn.gate.set()
+        # El que ya estaba en un lote no caduca aunque pase del máximo
+        assert (await busy).sentiment == "en vuelo"
+        await scheduler.close()
+        return interactive.value, bulk.value
+
+    interactive, bulk = asyncio.run(run())
+    assert (interactive.reason, bulk.lane, bulk.reason) == ("timeout", "bulk", "timeout")
+    assert batch_fn.calls == [["en vuelo"]]
+
+
+def test_cancelled_caller_leaves_the_queue():
+    batch_fn = GatedBatchFn()
+    scheduler = BatchScheduler(batch_fn, max_batch_size=4, max_wait_ms=1)
+
+    async def run():
+        busy = asyncio.ensure_future(scheduler.submit("en vuelo"))
+        await asyncio.sleep(0.01)
+        gone = asyncio.ensure_future(scheduler.submit("desconectado"))
+        kept = asyncio.ensure_future(scheduler.submit("sigue"))
+        await asyncio.sleep(0.01)
+        gone.cancel()
+        batch_fn.gate.set()
+        await asyncio.gather(busy, kept)
+        await scheduler.close()
+
+    asyncio.run(run())
+    assert batch_fn.calls == [["en vuelo"], ["sigue"]]
@@ -0,0 +1,63 @@
+from app.backends import StubBackend
+from app.bucketing import padding_cost, plan_buckets
+from app.sentiment_analyzer import SentimentAnalyzer
+
+
+def test_buckets_cover_every_index_once():
+    lengths = [12, 3, 90, 5, 40, 7, 88, 4]
+    buckets = plan_buckets(lengths, forward_overhead_tokens=16)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(lengths)))
+    for bucket in buckets:
+        assert [lengths[i] for i in bucket] == sorted(lengths[i] for i in bucket)
+
+
+def test_short_and_long_texts_are_split():
+    lengths = [4, 5, 4, 6, 120, 118]
+    buckets = plan_buckets(lengths, forward_overhead_tokens=32)
+
+    assert [sorted(b) for b in buckets] == [[0, 1, 2, 3], [4, 5]]
+
+
+def test_similar_lengths_stay_in_one_forward():
+    lengths = [10, 11, 12, 13, 14]
+    assert len(plan_buckets(lengths, forward_overhead_tokens=64)) == 1
+
+
+def test_max_bucket_size():
+    buckets = plan_buckets([5] * 10, max_bucket_size=4)
+    assert [len(b) for b in buckets] == [4, 4, 2]
+
+
+def test_bucketing_reduces_padding_cost():
+    lengths = [4, 5, 4, 6, 120, 118]
+    naive = padding_cost(lengths, [list(range(len(lengths)))])
+    bucketed = padding_cost(lengths, plan_buckets(lengths, forward_overhead_tokens=32))
+
+    assert naive["padded_tokens"] == 6 * 120
+    assert bucketed["padded_tokens"] == 4 * 6 + 2 * 120
+    assert bucketed["attention_cost"] < naive["attention_cost"]
+
+
+class CountingBackend(StubBackend):
+    def __init__(self):
+        super().__init__()
+        self.tokenized = []
+
+    def tokenize(self, texts):
+        self.tokenized.append(len(texts))
+        return super().tokenize(texts)
+
+    def encode(self, texts):
+        raise AssertionError("con bucketing no se vuelve a tokenizar cada grupo")
+
+
+def test_bucketed_batch_is_tokenized_once():
+    texts = ["corto", "un texto bastante más largo " * 20, "otro corto", "medio texto aquí"]
+    reference = SentimentAnalyzer("stub-modelo", backend="stub", bucketing=False).analyze_batch(texts)
+    analyzer = SentimentAnalyzer("stub-modelo", backend="stub", bucket_overhead_tokens=0)
+    analyzer.backend = CountingBackend()
+    results = analyzer.analyze_batch(texts)
+
+    assert analyzer.backend.tokenized == [len(texts)]
+    assert [r.raw_scores for r in results] == [r.raw_scores for r in reference]
@@ -0,0 +1,124 @@
+import asyncio
+import pytest
+from app import bulk
+from app.sentiment_analyzer import SentimentResult
+
+
+async def _chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def _collect(aiter):
+    return [item async for item in aiter]
+
+
+def _result(text):
+    return SentimentResult(
+        sentiment=text,
+        score=1.0,
+        confidence=1.0,
+        emotions=["calma"],
+        intensity="Media",
+        raw_scores={}
+    )
+
+
+def test_ndjson_lines_split_across_chunks():
+    chunks = _chunks(b'"hola mu', b'ndo"\n{"id": 7, "te', b'xt": "adios"}\n\n', b'roto\n"ultimo"')
+    items = asyncio.run(_collect(bulk.items_from_ndjson(chunks)))
+
+    assert [item.text for item in items] == ["hola mundo", "adios", None, "ultimo"]
+    assert items[1].id == "7"
+    assert items[2].error is not None
+    assert [item.index for item in items] == [0, 1, 2, 3]
+
+
+def test_ndjson_overlong_line_is_reported_once():
+    chunks = _chunks(b"x" * 40, b"y" * 40, b'\n"ok"\n')
+    items = asyncio.run(_collect(bulk.items_from_ndjson(chunks, max_line_bytes=32)))
+
+    assert len(items) == 2
+    assert items[0].error is not None
+    assert items[1].text == "ok"
+
+
+def test_spool_upload_stops_past_max_bytes():
+    spool = asyncio.run(bulk.spool_upload(_chunks(b"a" * 10, b"b" * 10), max_bytes=20))
+    assert spool.read() == b"a" * 10 + b"b" * 10
+
+    read = []
+
+    async def endless():
+        while True:
+            read.append(1)
+            yield b"x" * 8
+
+    with pytest.raises(bulk.UploadTooLarge):
+        asyncio.run(bulk.spool_upload(endless(), max_bytes=20))
+    # Deja de leer en cuanto se pasa del límite
+    assert len(read) == 3
+
+
+def test_stream_results_keeps_order_and_inline_errors():
+    calls = []
+
+    async def analyze_batch(texts):
+        calls.append(list(texts))
+        return [_result(text) for text in texts]
+
+    def validate(text):
+        return "demasiado corto" if len(text) < 3 else None
+
+    def render(item):
+        return f"{item.index}:{item.error or item.result.sentiment}"
+
+    entries = ["uno", "no", "tres", {"id": "a", "text": "cuatro"}, 5]
+    lines = asyncio.run(_collect(bulk.stream_results(
+        bulk.items_from_list(entries), analyze_batch, render, validate, batch_size=2, max_in_flight=2
+    )))
+
+    assert [line.decode().strip() for line in lines][:4] == ["0:uno", "1:demasiado corto", "2:tres", "3:cuatro"]
+    assert lines[4].decode().startswith("4:")
+    assert calls == [["uno"], ["tres", "cuatro"]]
+
+
+def test_ndjson_overlong_complete_line_is_rejected():
+    chunks = _chunks(b'"' + b"z" * 64 + b'"\n"ok"\n')
+    items = asyncio.run(_collect(bulk.items_from_ndjson(chunks, max_line_bytes=32)))
+
+    assert items[0].error is not None
+    assert items[1].text == "ok"
+
+
+def test_result_count_mismatch_is_reported_inline():
+    async def short_batch(texts):
+        return [_result(texts[0])]
+
+    entries = ["uno", "dos", "tres"]
+    lines = asyncio.run(_collect(bulk.stream_results(
+        bulk.items_from_list(entries), short_batch, lambda item: str(item.error), lambda text: None, batch_size=3
+    )))
+
+    assert len(lines) == 3
+    assert all(b"Se esperaban" in line for line in lines)
+
+
+def test_prepare_sees_each_scored_chunk_before_render():
+    prepared = []
+
+    async def analyze_batch(texts):
+        return [_result(text) for text in texts]
+
+    def prepare(chunk):
+        prepared.append([item.index for item in chunk])
+        for item in chunk:
+            item.recommendation = {"for": item.index}
+
+    lines = asyncio.run(_collect(bulk.stream_results(
+        bulk.items_from_list(["uno", "dos", "tres"]), analyze_batch,
+        lambda item: str(item.recommendation["for"]), lambda text: None, batch_size=2, prepare=prepare
+    )))
+
+    assert prepared == [[0, 1], [2]]
+    assert [line.decode().strip() for line in lines] == ["0", "1", "2"]
@@ -0,0 +1,143 @@
+import asyncio
+from app.cache import ResultCache
+from app.sentiment_analyzer import SentimentResult
+
+
+def _result(sentiment="Neutral"):
+    return SentimentResult(
+        sentiment=sentiment,
+        score=0.9,
+        confidence=0.9,
+        emotions=["calma"],
+        intensity="Media",
+        raw_scores={"3 stars": 0.9}
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalized_text_hits_the_same_entry():
+    cache = ResultCache("modelo")
+    cache.put("Hola   mundo ", _result("Positivo"))
+
+    assert cache.get("Hola mundo").sentiment == "Positivo"
+    assert cache.get("hola mundo") is None
+
+
+def test_lru_eviction_by_entries():
+    cache = ResultCache("modelo", max_entries=2)
+    cache.put("a", _result())
+    cache.put("b", _result())
+    cache.get("a")
+    cache.put("c", _result())
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats.evictions == 1
+
+
+def test_memory_bound_evicts():
+    cache = ResultCache("modelo", max_bytes=2000)
+    for i in range(50):
+        cache.put(f"texto {i}", _result())
+
+    assert 0 < len(cache) < 50
+    assert cache.snapshot()["bytes"] <= 2000
+
+
+def test_ttl_expiration():
+    clock = FakeClock()
+    cache = ResultCache("modelo", ttl_seconds=10, clock=clock)
+    cache.put("a", _result())
+    clock.now = 11
+
+    assert cache.get("a") is None
+    assert cache.stats.expirations == 1
+
+
+def test_single_flight_shares_one_inference():
+    cache = ResultCache("modelo")
+    calls = []
+
+    async def compute(text):
+        calls.append(text)
+        await asyncio.sleep(0.01)
+        return _result()
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_compute("mismo texto", compute) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert calls == ["mismo texto"]
+    assert len(results) == 5
+    assert cache.stats.misses == 1 and cache.stats.coalesced == 4
+
+    asyncio.run(cache.get_or_compute("mismo texto", compute))
+    assert cache.stats.hits == 1
+
+
+def test_errors_are_not_cached():
+    cache = ResultCache("modelo")
+
+    async def failing(text):
+        raise RuntimeError("fallo")
+
+    async def run():
+        try:
+            await cache.get_or_compute("a", failing)
+        except RuntimeError:
+            pass
+
+    asyncio.run(run())
+    assert len(cache) == 0
+
+
+def test_get_or_compute_many_only_scores_misses():
+    cache = ResultCache("modelo")
+    cache.put("a", _result("cacheado"))
+    batches = []
+
+    async def compute_batch(texts):
+        batches.append(list(texts))
+        return [_result(text) for text in texts]
+
+    results = asyncio.run(cache.get_or_compute_many(["a", "b", "c"], compute_batch))
+    assert [r.sentiment for r in results] == ["cacheado", "b", "c"]
+    assert batches == [["b", "c"]]
+
+
+def test_shared_compute_is_cancelled_with_its_last_waiter():
+    cache = ResultCache("modelo")
+    started, cancelled = asyncio.Event(), []
+
+    async def slow(text):
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(text)
+            raise
+
+    async def run():
+        first = asyncio.ensure_future(cache.get_or_compute("a", slow))
+        second = asyncio.ensure_future(cache.get_or_compute("a", slow))
+        await started.wait()
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        # Aún la espera otro llamante: sigue en vuelo
+        await asyncio.sleep(0)
+        assert cancelled == [] and cache.snapshot()["in_flight"] == 1
+        second.cancel()
+        await asyncio.gather(second, return_exceptions=True)
+        await asyncio.sleep(0)
+        return await cache.get_or_compute("b", lambda text: asyncio.sleep(0, _result()))
+
+    assert asyncio.run(run()).sentiment == "Neutral"
+    assert cancelled == ["a"] and cache.get("a") is None
+    assert cache.snapshot()["in_flight"] == 0 and cache.get("b") is not None
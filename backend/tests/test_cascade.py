@@ -0,0 +1,104 @@
+import asyncio
+import json
+import pytest
+from app.cascade import SentimentCascade, agreement_report, lexicon_result
+from app.lexicon import Lexicon, load_lexicons
+from app.sentiment_analyzer import SentimentResult
+
+
+@pytest.fixture(scope="module")
+def lexicons():
+    return load_lexicons()
+
+
+def test_lexicon_scores_clear_texts(lexicons):
+    positive = lexicons["es"].match("Me encanta, es excelente")
+    assert positive.stars == 5 and positive.confidence > 0.9
+
+    negative = lexicons["en"].match("This is the worst, terrible")
+    assert negative.stars == 1 and negative.confidence > 0.9
+
+    assert lexicons["es"].match("El paquete llegó el martes") is None
+
+
+def test_lexicon_negation_and_mixed_polarity(lexicons):
+    negated = lexicons["es"].match("No me gusta")
+    assert negated.stars < 3
+
+    mixed = lexicons["es"].match("El producto es bueno pero el envío fue lento")
+    assert mixed.confidence == 0.0
+
+
+def test_lexicon_prefers_longest_phrase():
+    lexicon = Lexicon("en", {"waste": -1, "waste of money": -2, "money": 1})
+    match = lexicon.match("a waste of money")
+    assert match.hits == 1
+    assert match.negative == 2.0
+
+
+def test_custom_lexicon_file(tmp_path):
+    path = tmp_path / "lexicons.json"
+    path.write_text(json.dumps({"pt": {"terms": {"ótimo": 2}}}), encoding="utf-8")
+    lexicons = load_lexicons(str(path))
+    assert lexicons["pt"].match("Ótimo, ótimo").stars == 5
+    assert "es" in lexicons
+
+
+def test_lexicon_result_has_model_shape(lexicons):
+    result = lexicon_result(lexicons["es"].match("Me encanta, es excelente"))
+    assert result.sentiment == "Muy Positivo"
+    assert result.confidence == max(result.raw_scores.values())
+    assert set(result.raw_scores) == {"1 star", "2 stars", "3 stars", "4 stars", "5 stars"}
+
+
+def model_result(text):
+    return SentimentResult(
+        sentiment="Neutral", score=0.5, confidence=0.5, emotions=["calma"],
+        intensity="Media", raw_scores={"3 stars": 0.5}
+    )
+
+
+def test_cascade_falls_back_below_threshold(lexicons):
+    cascade = SentimentCascade(lexicons, threshold=0.85)
+    sent = []
+
+    async def fallback_batch(texts):
+        sent.extend(texts)
+        return [model_result(text) for text in texts]
+
+    texts = ["Me encanta, es excelente", "No sé qué pensar", "Es una basura total, horrible"]
+    results = asyncio.run(cascade.analyze_many(texts, "es-ES", fallback_batch))
+
+    assert sent == ["No sé qué pensar"]
+    assert [r.sentiment for r in results] == ["Muy Positivo", "Neutral", "Muy Negativo"]
+    snapshot = cascade.snapshot()
+    assert snapshot["tiers"] == {"lexicon": 2, "model": 1}
+    assert snapshot["by_language"] == {"es": {"lexicon": 2, "model": 1}}
+
+
+def test_cascade_without_lexicon_or_disabled_uses_model(lexicons):
+    async def fallback(text):
+        return model_result(text)
+
+    unknown = SentimentCascade(lexicons)
+    assert asyncio.run(unknown.analyze("Ich liebe es", "de", fallback)).sentiment == "Neutral"
+
+    disabled = SentimentCascade(lexicons, enabled=False)
+    assert asyncio.run(disabled.analyze("Me encanta, es excelente", "es", fallback)).sentiment == "Neutral"
+    assert disabled.snapshot()["tiers"]["lexicon"] == 0
+
+
+def test_agreement_report(lexicons):
+    class ReferenceModel:
+        def analyze_batch(self, texts):
+            return [lexicon_result(lexicons["es"].match("Me encanta")) if "encanta" in text else model_result(text)
+                    for text in texts]
+
+    texts = ["Me encanta, es excelente", "Es una basura total, horrible", "No sé qué pensar"]
+    report = agreement_report(lexicons["es"], ReferenceModel(), texts, thresholds=[0.9])
+
+    sweep = report["thresholds"][0]
+    assert sweep["coverage"] == pytest.approx(2 / 3)
+    assert sweep["lexicon_sentiment_agreement"] == 0.5
+    assert sweep["cascade_sentiment_agreement"] == pytest.approx(2 / 3)
+    assert report["disagreements"][0]["text"] == "Es una basura total, horrible"
@@ -0,0 +1,69 @@
+from functools import partial
+import pytest
+from app.chunking import BLOCK_CHARS, DocumentScore, Window, expected_stars, iter_windows
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+StubAnalyzer = partial(SentimentAnalyzer, backend="stub")
+
+
+def words(text):
+    return StubAnalyzer("stub").backend.token_spans(text)
+
+
+def document(count):
+    return " ".join(f"palabra{i}" for i in range(count))
+
+
+@pytest.mark.parametrize("count", [1, 10, 11, 25, 100])
+def test_windows_cover_every_token_once(count):
+    text = document(count)
+    windows = list(iter_windows(text, words, window_tokens=10, overlap_tokens=3))
+    assert all(w.tokens == min(10, count) for w in windows)
+    assert sum(w.weight for w in windows) == count
+    assert windows[0].start == 0 and windows[-1].end == len(text)
+    # Ventanas consecutivas solapan al menos 3 palabras
+    for previous, current in zip(windows, windows[1:]):
+        assert len(text[current.start:previous.end].split()) >= 3
+
+
+def test_blocks_do_not_split_tokens():
+    text = document(5000)
+    assert len(text) > 3 * BLOCK_CHARS // 2
+    small = [(w.start, w.end, w.weight) for w in iter_windows(text, words, 50, 10, block_chars=997)]
+    whole = [(w.start, w.end, w.weight) for w in iter_windows(text, words, 50, 10, block_chars=len(text))]
+    assert small == whole
+
+
+def scored(label, tokens):
+    rest = {f"{s} stars": 0.0 for s in range(1, 6)}
+    result = SentimentAnalyzer.build_result([{"label": k, "score": 1.0 if k == label else v} for k, v in rest.items()])
+    return Window(0, 0, 0, tokens, tokens), result
+
+
+def test_document_score_is_length_weighted():
+    score = DocumentScore()
+    score.add(*scored("5 stars", 300))
+    score.add(*scored("1 stars", 100))
+    score.add(Window(2, 0, 0, 50, 50), SentimentAnalyzer._error_result())
+    document = score.result()
+    assert document.stars == pytest.approx(4.0)
+    assert document.result.raw_scores["5 stars"] == pytest.approx(0.75)
+    assert document.result.sentiment == "Muy Positivo"
+    assert document.tokens == 450 and len(document.segments) == 3
+    assert expected_stars({"NEG": 0.5, "POS": 0.5}) == pytest.approx(3.0)
+
+
+def test_analyze_documents_shares_batches_across_documents():
+    analyzer = StubAnalyzer("stub")
+    window = analyzer.backend.window_tokens()
+    batches = []
+    analyze_batch = analyzer.analyze_batch
+    analyzer.analyze_batch = lambda texts: batches.append(len(texts)) or analyze_batch(texts)
+
+    texts = ["Me encanta.", document(window * 3), "No funciona nada."]
+    results = analyzer.analyze_documents(texts, overlap_tokens=16, batch_size=4)
+    assert [len(r.segments) for r in results] == [1, 4, 1]
+    assert batches == [4, 2]
+    assert results[1].tokens == window * 3
+    # Un texto corto es una sola ventana con el mismo resultado que analyze_text
+    assert results[0].result.raw_scores == pytest.approx(analyzer.analyze_text("Me encanta.").raw_scores)
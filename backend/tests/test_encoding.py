@@ -0,0 +1,74 @@
+import json
+from datetime import datetime
+import pytest
+from app import encoding
+from app.sentiment_analyzer import SentimentAnalyzer
+
+
+def result(stars):
+    return SentimentAnalyzer.build_result([{"label": f"{i} stars", "score": 0.96 if i == stars else 0.01} for i in range(1, 6)])
+
+
+def test_negotiate_prefers_the_most_specific_range():
+    offered = (encoding.JSON, encoding.MSGPACK)
+    assert encoding.negotiate(None, offered) == encoding.JSON
+    assert encoding.negotiate("*/*", offered) == encoding.JSON
+    assert encoding.negotiate("application/x-msgpack", offered) == encoding.MSGPACK
+    assert encoding.negotiate("application/*;q=0.5, application/json;q=0.4", offered) == encoding.MSGPACK
+    assert encoding.negotiate("application/json;q=0, */*", offered) == encoding.MSGPACK
+    assert encoding.negotiate("text/html", offered) is None
+    # El formato de fichero de Arrow no es el stream IPC que se envía
+    assert encoding.negotiate("application/vnd.apache.arrow.file", (encoding.NDJSON, encoding.ARROW)) is None
+
+
+def test_unavailable_formats_are_not_offered(monkeypatch):
+    monkeypatch.setattr(encoding, "find_spec", lambda name: None)
+    assert encoding.negotiate("application/msgpack", (encoding.JSON, encoding.MSGPACK)) is None
+    assert encoding.negotiate("application/msgpack, */*;q=0.1", (encoding.JSON, encoding.MSGPACK)) == encoding.JSON
+
+
+def test_results_share_their_star_template():
+    first, second = result(5), result(5)
+    assert first.emotions is second.emotions
+    assert first.raw_scores is not second.raw_scores
+    with pytest.raises(AttributeError):
+        first.extra = 1
+
+
+def test_payload_matches_json_encoding():
+    timestamp = datetime(2026, 1, 2, 3, 4, 5, 678)
+    payload = encoding.result_payload(result(4), {"color": {"hex": "#FFF"}}, timestamp)
+    decoded = json.loads(encoding.dumps(payload))
+    assert decoded["emotions"] == result(4).emotions
+    assert decoded["timestamp"] == timestamp.isoformat()
+    assert encoding.encoder(encoding.NDJSON)(payload).endswith(b"}\n")
+
+
+def test_msgpack_round_trip():
+    msgpack = pytest.importorskip("msgpack")
+    payload = encoding.result_payload(result(1), None, datetime(2026, 1, 1))
+    rows = encoding.encode_rows(encoding.MSGPACK)([payload, payload])
+    unpacker = msgpack.Unpacker(raw=False)
+    unpacker.feed(rows)
+    decoded = list(unpacker)
+    assert len(decoded) == 2 and decoded[0]["sentiment"] == "Muy Negativo"
+    assert decoded[0]["timestamp"] == "2026-01-01T00:00:00"
+
+
+def test_arrow_stream_is_readable():
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+
+    arrow = encoding.ArrowBatchEncoder()
+    rows = [
+        {"index": 0, "id": "a", "error": None, **encoding.result_payload(result(5), {"song": {"title": "x"}}, datetime(2026, 1, 1))},
+        {"index": 1, "id": None, "error": "demasiado corto"},
+    ]
+    stream = arrow.encode(rows[:1]) + arrow.encode(rows[1:]) + arrow.close()
+    table = pyarrow.ipc.open_stream(stream).read_all()
+    assert table.num_rows == 2
+    assert table.column("emotions")[0].as_py() == result(5).emotions
+    assert json.loads(table.column("recommendation")[0].as_py()) == {"song": {"title": "x"}}
+    assert table.column("error").to_pylist() == [None, "demasiado corto"]
+    # Sin lotes, el stream sigue siendo válido
+    assert pyarrow.ipc.open_stream(encoding.ArrowBatchEncoder().close()).read_all().num_rows == 0
@@ -0,0 +1,104 @@
+import asyncio
+import threading
+import pytest
+from app.chunking import Window
+from app.executor import InferenceExecutor
+from app.metrics import STAGE_SECONDS, stage
+from app.sentiment_analyzer import SentimentResult
+
+
+class StubAnalyzer:
+    """Analizador sin modelo: devuelve el texto como sentimiento"""
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+        self.threads = set()
+
+    def analyze_batch(self, texts):
+        self.threads.add(threading.get_ident())
+        return [
+            SentimentResult(
+                sentiment=text,
+                score=0.5,
+                confidence=0.5,
+                emotions=["calma"],
+                intensity="Media",
+                raw_scores={"3 stars": 0.5}
+            )
+            for text in texts
+        ]
+
+    def windows(self, text, overlap_tokens):
+        # Una ventana por palabra
+        return [Window(i, start, start + len(word), 1, 1) for i, (start, word) in enumerate(_words(text))]
+
+
+class StagedAnalyzer(StubAnalyzer):
+    """Mide su forward como lo hace SentimentAnalyzer"""
+
+    def analyze_batch(self, texts):
+        with stage("forward"):
+            return super().analyze_batch(texts)
+
+
+def _words(text):
+    start = 0
+    for word in text.split(" "):
+        yield start, word
+        start += len(word) + 1
+
+
+def test_invalid_configuration():
+    with pytest.raises(ValueError):
+        InferenceExecutor("stub", mode="gpu", analyzer_factory=StubAnalyzer)
+    with pytest.raises(ValueError):
+        InferenceExecutor("stub", workers=0, analyzer_factory=StubAnalyzer)
+
+
+def test_thread_mode_runs_off_the_event_loop():
+    executor = InferenceExecutor("stub", mode="thread", workers=2, analyzer_factory=StubAnalyzer)
+
+    async def run():
+        loop_thread = threading.get_ident()
+        results = await executor.analyze_batch(["uno", "dos"])
+        return loop_thread, results
+
+    try:
+        loop_thread, results = asyncio.run(run())
+    finally:
+        executor.shutdown()
+
+    assert [r.sentiment for r in results] == ["uno", "dos"]
+    assert executor.analyzer.threads and loop_thread not in executor.analyzer.threads
+    assert executor.snapshot()["mode"] == "thread"
+
+
+def test_process_mode_round_trip():
+    executor = InferenceExecutor(
+        "stub", mode="process", workers=2, intra_op_threads=1, analyzer_factory=StubAnalyzer
+    )
+    try:
+        snapshot = executor.snapshot()
+        results = asyncio.run(executor.analyze_batch(["hola", "adiós"]))
+        windows = asyncio.run(executor.windows("hola que tal", 0))
+    finally:
+        executor.shutdown()
+
+    assert windows == [(0, 4, 1, 1), (5, 8, 1, 1), (9, 12, 1, 1)]
+
+    assert [r.sentiment for r in results] == ["hola", "adiós"]
+    assert isinstance(results[0], SentimentResult)
+    # Ambos procesos arrancaron en el constructor con los hilos configurados
+    assert list(snapshot["torch_threads"].values()) == [1, 1]
+
+
+def test_process_mode_reports_stages_to_the_parent():
+    executor = InferenceExecutor("stub", mode="process", workers=1, analyzer_factory=StagedAnalyzer)
+    before = STAGE_SECONDS.count(stage="forward")
+    try:
+        asyncio.run(executor.analyze_batch(["hola"]))
+        asyncio.run(executor.analyze_batch(["adiós"]))
+    finally:
+        executor.shutdown()
+    # Medidas en el worker, registradas aquí: una por lote, sin el warm-up
+    assert STAGE_SECONDS.count(stage="forward") == before + 2
@@ -0,0 +1,111 @@
+import asyncio
+from app import live
+from app.live import LiveSession, LiveUpdate, TokenBucket
+from app.sentiment_analyzer import SentimentResult
+
+
+def _result(text):
+    return SentimentResult(text, 0.9, 0.9, ["calma"], "Media", {"3 stars": 0.9})
+
+
+class Client:
+    """Sesión con un análisis falso que registra qué textos llegan al modelo"""
+
+    def __init__(self, delay=0.0, **options):
+        self.analyzed, self.sent = [], []
+        self.delay = delay
+        self.session = LiveSession(self.analyze, self.render, self.send, **options)
+
+    async def analyze(self, update):
+        await asyncio.sleep(self.delay)
+        self.analyzed.append(update.text)
+        return _result(update.text)
+
+    @staticmethod
+    def render(update, result):
+        return {"seq": update.seq, "result": result.sentiment}
+
+    async def send(self, frame):
+        self.sent.append(frame)
+
+    def type(self, seq, text):
+        self.session.update(LiveUpdate(seq, text))
+
+
+def run(client, scenario):
+    async def main():
+        runner = asyncio.ensure_future(client.session.run())
+        try:
+            await scenario()
+        finally:
+            runner.cancel()
+            await asyncio.gather(runner, return_exceptions=True)
+    asyncio.run(main())
+
+
+def test_debounce_analyzes_only_the_latest_text():
+    client = Client(debounce_ms=30, rate_per_second=0)
+
+    async def scenario():
+        for i, text in enumerate(["Me", "Me en", "Me encan", "Me encanta"], start=1):
+            client.type(i, text)
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.1)
+
+    run(client, scenario)
+    assert client.analyzed == ["Me encanta"]
+    assert client.sent == [{"seq": 4, "result": "Me encanta"}]
+
+
+def test_superseded_text_is_cancelled_in_flight():
+    client = Client(delay=0.2, debounce_ms=10, rate_per_second=0)
+    superseded = live.stats.superseded
+
+    async def scenario():
+        client.type(1, "Hoy fue")
+        await asyncio.sleep(0.05)
+        # El primero ya está en análisis: se cancela y no se envía
+        client.type(2, "Hoy fue un gran día")
+        await asyncio.sleep(0.4)
+
+    run(client, scenario)
+    assert client.analyzed == ["Hoy fue un gran día"]
+    assert [frame["seq"] for frame in client.sent] == [2]
+    assert live.stats.superseded == superseded + 1
+
+
+def test_unchanged_text_is_answered_without_inference():
+    client = Client(debounce_ms=5, rate_per_second=0)
+
+    async def scenario():
+        client.type(1, "Qué bien")
+        await asyncio.sleep(0.05)
+        client.type(2, "Qué bien")
+        await asyncio.sleep(0.05)
+
+    run(client, scenario)
+    assert client.analyzed == ["Qué bien"]
+    assert [frame["seq"] for frame in client.sent] == [1, 2]
+
+
+def test_rate_limit_coalesces_a_chatty_client():
+    client = Client(debounce_ms=0, rate_per_second=10, burst=1)
+
+    async def scenario():
+        for i in range(40):
+            client.type(i, f"texto número {i}")
+            await asyncio.sleep(0.005)
+        await asyncio.sleep(0.15)
+
+    run(client, scenario)
+    # ~0,35 s a 10 análisis/s con ráfaga de 1: unos 4-5 análisis, no 40, y el último texto siempre
+    assert 2 <= len(client.analyzed) <= 6
+    assert client.analyzed[-1] == "texto número 39"
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, burst=2)
+    bucket.take()
+    bucket.take()
+    assert 0.4 < bucket.delay() <= 0.5
+    assert TokenBucket(rate=0, burst=1).delay() == 0
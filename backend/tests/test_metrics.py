@@ -0,0 +1,65 @@
+import os
+import time
+from app.metrics import Registry, stage, STAGE_SECONDS
+from app.profiling import SlowRequestProfiler
+
+
+def test_histogram_renders_cumulative_buckets():
+    registry = Registry()
+    histogram = registry.histogram("demo_seconds", "Demo", ["stage"], buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value, stage="a")
+
+    lines = registry.render().splitlines()
+    assert "# TYPE demo_seconds histogram" in lines
+    assert 'demo_seconds_bucket{stage="a",le="0.1"} 2' in lines
+    assert 'demo_seconds_bucket{stage="a",le="1"} 3' in lines
+    assert 'demo_seconds_bucket{stage="a",le="+Inf"} 4' in lines
+    assert 'demo_seconds_count{stage="a"} 4' in lines
+    assert 'demo_seconds_sum{stage="a"} 3.65' in lines
+
+
+def test_counters_gauges_and_collectors():
+    registry = Registry()
+    counter = registry.counter("demo_requests", "Demo", ["path"])
+    gauge = registry.gauge("demo_in_flight", "Demo")
+    counter.inc(path='/a"b')
+    gauge.inc()
+    gauge.inc()
+    gauge.dec()
+    registry.add_collector(lambda: [("demo_items", "counter", "Demo", [({"kind": "x"}, 7)])])
+
+    lines = registry.render().splitlines()
+    assert 'demo_requests_total{path="/a\\"b"} 1' in lines
+    assert "demo_in_flight 1" in lines
+    assert 'demo_items_total{kind="x"} 7' in lines
+
+
+def test_stage_records_even_on_error():
+    before = STAGE_SECONDS.count(stage="test-error")
+    try:
+        with stage("test-error"):
+            raise ValueError
+    except ValueError:
+        pass
+    assert STAGE_SECONDS.count(stage="test-error") == before + 1
+
+
+def test_profiler_dumps_only_slow_requests(tmp_path):
+    profiler = SlowRequestProfiler(50, output_dir=str(tmp_path), interval_ms=1, min_dump_interval_s=0)
+    profiler.start()
+    try:
+        started = time.perf_counter()
+        time.sleep(0.1)
+        finished = time.perf_counter()
+        assert profiler.request_finished("/fast", finished - 0.01, finished) is None
+        path = profiler.request_finished("/sentify", started, finished)
+    finally:
+        profiler.stop()
+
+    assert path is not None and os.path.dirname(path) == str(tmp_path)
+    with open(path, encoding="utf-8") as f:
+        lines = f.read().splitlines()
+    # Una pila colapsada por línea con su número de muestras; el hilo principal dormía
+    assert any(line.startswith("MainThread;") and "test_profiler_dumps_only_slow_requests" in line for line in lines)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
@@ -0,0 +1,142 @@
+import asyncio
+import httpx
+from app.catalog_stub import create_app
+from app.music_catalog import CircuitBreaker, MusicCatalogClient, TTLCache, track_id
+from app.recommendations import DEFAULT_CATALOG
+
+
+SONGS = [song for entry in DEFAULT_CATALOG["categories"].values() for song in entry["songs"]]
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def stub_client(stub, **kwargs):
+    return MusicCatalogClient("http://catalogo", transport=httpx.ASGITransport(app=stub), **kwargs)
+
+
+def recommendation(*songs):
+    return {"song": songs[0], "songs": list(songs), "color": {"hex": "#FFD700"}}
+
+
+def test_ttl_cache_expires_and_evicts():
+    clock = Clock()
+    cache = TTLCache(2, 10.0, clock=clock)
+    cache.put("a", 1)
+    cache.put("b", None, ttl_seconds=1.0)
+    assert "b" in cache and cache.get("b", "falta") is None
+    clock.now += 2
+    assert "b" not in cache and cache.get("a") == 1
+    cache.put("c", 3)
+    cache.put("d", 4)
+    assert "a" not in cache and len(cache) == 2
+
+
+def test_circuit_breaker_opens_and_probes_once():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=5.0, clock=clock)
+    breaker.failure()
+    assert breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and not breaker.allow()
+    clock.now += 5
+    # Semiabierto: una sola llamada de prueba
+    assert breaker.allow() and not breaker.allow()
+    breaker.failure()
+    assert breaker.state == "open" and breaker.opened == 2
+    clock.now += 5
+    assert breaker.allow()
+    breaker.success()
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_concurrent_lookups_are_coalesced_into_one_request():
+    stub = create_app(latency_ms=20)
+    client = stub_client(stub)
+
+    async def scenario():
+        try:
+            recommendations = [recommendation(song) for song in SONGS * 3]
+            return await asyncio.gather(*(client.enrich(r, budget_seconds=1.0) for r in recommendations))
+        finally:
+            await client.close()
+
+    enriched = asyncio.run(scenario())
+    # Cada id una sola vez, todos en la misma llamada (hay menos de 50)
+    assert stub.state.requests == 1
+    assert client.stats["coalesced"] > 0
+    first = enriched[0]["song"]
+    assert first["title"] == SONGS[0]["title"] and first["album"] and first["duration_ms"] > 0
+    assert enriched[0]["songs"][0] is first
+    # Las canciones del catálogo no se modifican
+    assert "album" not in SONGS[0]
+    assert all(track_id(song["url"]) for song in SONGS)
+
+
+def test_slow_catalog_falls_back_and_fills_the_cache():
+    stub = create_app(latency_ms=100)
+    client = stub_client(stub)
+    song = SONGS[0]
+
+    async def scenario():
+        try:
+            fast = await client.enrich(recommendation(song), budget_seconds=0.01)
+            # La búsqueda sigue en segundo plano y la siguiente sale de la caché
+            await asyncio.sleep(0.3)
+            cached = client.enrich_nowait(recommendation(song))
+            return fast, cached
+        finally:
+            await client.close()
+
+    fast, cached = asyncio.run(scenario())
+    assert fast["song"] is song
+    assert cached["song"]["album"] and client.stats["hits"] == 1
+    assert client.stats["fallbacks"] == 1
+
+
+def test_failing_catalog_opens_the_circuit():
+    stub = create_app(failure_rate=1.0)
+    client = stub_client(stub, failure_threshold=2, reset_seconds=60.0)
+
+    async def scenario():
+        try:
+            results = []
+            for song in SONGS[:4]:
+                results.append(await client.enrich(recommendation(song), budget_seconds=1.0))
+            return results
+        finally:
+            await client.close()
+
+    results = asyncio.run(scenario())
+    assert [r["song"] for r in results] == SONGS[:4]
+    assert stub.state.requests == 2
+    assert client.breaker.state == "open" and client.stats["rejected"] == 2
+    assert client.snapshot()["circuit"] == "open"
+
+
+def test_client_credentials_token_is_sent():
+    stub = create_app()
+    seen = []
+
+    @stub.middleware("http")
+    async def record_auth(request, call_next):
+        seen.append((request.url.path, request.headers.get("authorization", "")))
+        return await call_next(request)
+
+    client = stub_client(stub, client_id="id", client_secret="secreto")
+
+    async def scenario():
+        try:
+            await client.enrich(recommendation(SONGS[0]), budget_seconds=1.0)
+            await client.enrich(recommendation(SONGS[1]), budget_seconds=1.0)
+        finally:
+            await client.close()
+
+    asyncio.run(scenario())
+    assert [path for path, _ in seen] == ["/api/token", "/v1/tracks", "/v1/tracks"]
+    assert seen[0][1].startswith("Basic ") and seen[1][1] == "Bearer stub-token"
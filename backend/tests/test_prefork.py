@@ -0,0 +1,135 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import pytest
+from app import lifecycle
+from app.config import Settings
+from app.memory import memory_report, process_memory
+from app.sentiment_analyzer import SentimentResult
+
+linux_only = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="necesita /proc/<pid>/smaps_rollup")
+
+
+class PreloadedAnalyzer:
+    def analyze_batch(self, texts):
+        return [
+            SentimentResult(
+                sentiment="Neutral",
+                score=0.5,
+                confidence=0.5,
+                emotions=["calma"],
+                intensity="Media",
+                raw_scores={"3 stars": 0.5}
+            )
+            for _ in texts
+        ]
+
+
+@pytest.fixture
+def preloaded():
+    analyzer = PreloadedAnalyzer()
+    lifecycle.install_preloaded(analyzer, {"preload_s": 1.5})
+    yield analyzer
+    lifecycle.install_preloaded(None, {})
+
+
+def test_runtime_uses_preloaded_analyzer(preloaded):
+    # El modo "process" se ignora: el modelo heredado solo se comparte entre hilos
+    runtime = lifecycle.ModelRuntime(Settings(model_name="no-existe", inference_mode="process"), warmup=True)
+
+    async def run():
+        await runtime.start()
+        await runtime.wait_ready(10)
+        return await runtime.analyze_batch(["hola", "adiós"])
+
+    try:
+        results = asyncio.run(run())
+        assert [r.sentiment for r in results] == ["Neutral", "Neutral"]
+        assert runtime.executor.mode == "thread"
+        assert runtime.executor.analyzer is preloaded
+        assert runtime.timings["preload_s"] == 1.5
+    finally:
+        runtime.shutdown()
+
+
+
+class StubExecutor:
+    def __init__(self, name):
+        self.name = name
+        self.closed = False
+
+    def shutdown(self):
+        self.closed = True
+
+
+def test_stale_load_does_not_touch_the_next_cycle():
+    runtime = lifecycle.ModelRuntime(Settings(model_name="no-existe"), warmup=False)
+    gates = [threading.Event(), threading.Event()]
+    built = []
+
+    def build():
+        gate = gates[len(built)]
+        executor = StubExecutor(len(built))
+        built.append(executor)
+        gate.wait(5)
+        return executor, None, {"total_s": float(executor.name)}
+
+    runtime._build_executor = build
+
+    async def run():
+        await runtime.start()
+        stale = runtime._task
+        await asyncio.sleep(0.05)
+        runtime.shutdown()
+        await runtime.start()
+        current = runtime._ready
+        # La carga del ciclo anterior termina primero: ni marca el evento del
+        # ciclo nuevo ni instala su ejecutor
+        gates[0].set()
+        await stale
+        assert not current.is_set() and not runtime.ready
+        gates[1].set()
+        await runtime.wait_ready(5)
+
+    try:
+        asyncio.run(run())
+        assert built[0].closed and runtime.executor is built[1]
+        assert runtime.timings == {"total_s": 1.0}
+    finally:
+        runtime.shutdown()
+
+
+@linux_only
+def test_process_memory_of_current_process():
+    memory = process_memory()
+    assert memory["rss"] > 0
+    assert memory["shared"] + memory["private"] == memory["rss"]
+    assert 0 < memory["pss"] <= memory["rss"]
+
+
+@linux_only
+def test_forked_child_shares_parent_pages():
+    payload = bytearray(os.urandom(32 * 1024 * 1024))
+    read, write = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        # Solo lee los datos heredados: sus páginas siguen compartidas
+        os.close(read)
+        sum(payload[::4096])
+        os.write(write, b"x")
+        time.sleep(60)
+        os._exit(0)
+
+    os.close(write)
+    try:
+        assert os.read(read, 1) == b"x"
+        report = memory_report([os.getpid(), pid, 999999999])
+        child = report["processes"][pid]
+        assert child["shared"] >= len(payload)
+        assert 999999999 not in report["processes"]
+        assert report["totals"]["pss"] < report["totals"]["rss"]
+    finally:
+        os.kill(pid, 9)
+        os.waitpid(pid, 0)
@@ -0,0 +1,175 @@
+import copy
+import json
+import os
+import random
+import time
+from collections import Counter
+import numpy as np
+import pytest
+from app.mood import MoodIndex, result_mood
+from app.recommendations import DEFAULT_CATALOG, RecommendationEngine, catalog_from_dict, load_catalog, write_sqlite
+from app.sentiment_analyzer import SentimentAnalyzer, SentimentResult
+
+
+def small_catalog(song_weights=(1.0, 1.0)):
+    return {
+        "default": "neutral",
+        "emotions": {"nostalgia": "tristeza"},
+        "categories": {
+            "neutral": {
+                "songs": [{"title": "Calma", "artist": "A", "url": "u0"}],
+                "colors": {"hex": "#D3D3D3", "name": "Gris", "meaning": "Equilibrio"},
+                "quotes": [{"text": "Respira.", "author": "B"}],
+            },
+            "tristeza": {
+                "songs": [
+                    {"title": f"Triste {i}", "artist": "C", "url": f"u{i + 1}", "weight": weight}
+                    for i, weight in enumerate(song_weights)
+                ],
+                "colors": {"hex": "#4682B4", "name": "Azul", "meaning": "Calma"},
+            },
+        },
+    }
+
+
+@pytest.mark.parametrize("stars,category", [(1, "enojo"), (2, "enojo"), (3, "neutral"), (4, "alegría"), (5, "alegría")])
+def test_analyzer_emotions_map_to_categories(stars, category):
+    # Las emociones que devuelve build_result, no solo las antiguas
+    emotions = SentimentAnalyzer.build_result([{"label": f"{stars} stars", "score": 0.9}]).emotions
+    assert load_catalog().category_for(emotions) == category
+
+
+def test_recommendation_shape():
+    engine = RecommendationEngine(rng=random.Random(0))
+    recommendation = engine.get_recommendations(["frustración extrema"])
+    assert recommendation["color"]["name"] == "Carmesí"
+    assert set(recommendation["song"]) == {"title", "artist", "url"}
+    assert set(recommendation["quote"]) == {"text", "author"}
+    assert engine.get_recommendations(["desconocida"])["color"]["name"] == "Gris Claro"
+
+
+def test_weighted_sampling_and_fallback_to_default_category():
+    catalog = catalog_from_dict(small_catalog(song_weights=(1.0, 0.0, 3.0)))
+    rng = random.Random(7)
+    picks = Counter(catalog.recommend(["nostalgia"], rng)["song"]["title"] for _ in range(20000))
+    assert "Triste 1" not in picks
+    assert 2.7 < picks["Triste 2"] / picks["Triste 0"] < 3.3
+    # "tristeza" no tiene frases: se usan las de la categoría por defecto
+    assert catalog.recommend(["nostalgia"], rng)["quote"]["text"] == "Respira."
+
+
+def test_large_categories_use_compact_storage():
+    data = small_catalog(song_weights=[1.0] * 5000)
+    catalog = catalog_from_dict(data)
+    _, songs, _ = catalog.categories["tristeza"]
+    assert len(songs) == 5000
+    assert songs.row(4321) == {"title": "Triste 4321", "artist": "C", "url": "u4322"}
+    assert songs.nbytes < 5000 * 40
+
+
+def test_sqlite_catalog_matches_json(tmp_path):
+    path = str(tmp_path / "catalogo.db")
+    write_sqlite(DEFAULT_CATALOG, path)
+    from_sqlite, from_json = load_catalog(path), load_catalog()
+    assert from_sqlite.stats() == from_json.stats()
+    assert from_sqlite.emotions == from_json.emotions
+
+
+def test_hot_reload_on_file_change(tmp_path):
+    path = tmp_path / "catalogo.json"
+    path.write_text(json.dumps(small_catalog()), encoding="utf-8")
+    engine = RecommendationEngine(str(path), reload_seconds=0.01)
+    assert engine.get_recommendations(["nostalgia"])["color"]["name"] == "Azul"
+
+    data = small_catalog()
+    data["categories"]["tristeza"]["colors"]["name"] = "Azul Noche"
+    path.write_text(json.dumps(data), encoding="utf-8")
+    os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+
+    for _ in range(200):
+        time.sleep(0.02)
+        if engine.get_recommendations(["nostalgia"])["color"]["name"] == "Azul Noche":
+            break
+    assert engine.reloads == 1
+
+
+def test_invalid_reload_keeps_previous_catalog(tmp_path):
+    path = tmp_path / "catalogo.json"
+    path.write_text(json.dumps(small_catalog()), encoding="utf-8")
+    engine = RecommendationEngine(str(path))
+
+    broken = copy.deepcopy(small_catalog())
+    broken["default"] = "no-existe"
+    path.write_text(json.dumps(broken), encoding="utf-8")
+    with pytest.raises(ValueError):
+        engine.reload()
+    assert engine.reload_errors == 1
+    assert engine.get_recommendations(["nostalgia"])["color"]["name"] == "Azul"
+
+
+def _scored(stars, score=0.9, intensity="Alta"):
+    rest = (1.0 - score) / 4
+    scores = {f"{s} stars": score if s == stars else rest for s in range(1, 6)}
+    return SentimentResult("x", score, score, [], intensity, scores)
+
+
+def test_result_mood_uses_the_full_distribution():
+    negative = result_mood(_scored(1))
+    positive = result_mood(SentimentResult("x", 0.9, 0.9, [], "Alta", {"POS": 0.8, "NEU": 0.15, "NEG": 0.05}))
+    assert np.argmax(negative[:5]) == 0 and np.argmax(positive[:5]) in (3, 4)
+    assert np.isclose(np.linalg.norm(negative), 1.0)
+    # Sin puntuaciones (resultado de error) cae en el mood neutral
+    assert np.argmax(result_mood(SentimentResult("x", 0, 0, ["error"], "Baja", {}))[:5]) == 2
+
+
+def test_approximate_index_recall():
+    rng = np.random.default_rng(1)
+    vectors = rng.dirichlet(np.ones(6) * 0.5, size=20000).astype(np.float32)
+    queries = rng.dirichlet(np.ones(6) * 0.5, size=100).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    exact = MoodIndex(vectors, ann_threshold=len(vectors))
+    approximate = MoodIndex(vectors, ann_threshold=1000)
+    assert approximate.approximate and not exact.approximate
+
+    hits = [
+        len({i for i, _ in a} & {i for i, _ in b}) / 10
+        for a, b in zip(exact.search(queries, 10), approximate.search(queries, 10))
+    ]
+    assert np.mean(hits) > 0.9
+
+
+def test_vector_mode_top_k_diversity_and_no_repeat():
+    engine = RecommendationEngine(mode="vector", top_k=2, no_repeat=2, exploration=0.0, rng=random.Random(0))
+    first = engine.recommend(_scored(1, intensity="Extrema"))
+    assert first["color"]["name"] == "Carmesí"
+    assert len(first["songs"]) == 2 and first["song"] == first["songs"][0]
+    # Molotov tiene dos canciones de enojo, pero la diversidad no repite artista
+    assert len({song["artist"] for song in first["songs"]}) == 2
+    assert first["songs"][0]["similarity"] >= first["songs"][1]["similarity"]
+
+    second = engine.recommend(_scored(1, intensity="Extrema"))
+    assert not {s["title"] for s in first["songs"]} & {s["title"] for s in second["songs"]}
+
+
+def test_vector_mode_batch_and_custom_moods(tmp_path):
+    data = small_catalog()
+    data["categories"]["neutral"]["songs"].append(
+        {"title": "Euforia", "artist": "D", "url": "u9", "mood": [0, 0, 0, 0.1, 0.9, 1.0]}
+    )
+    path = str(tmp_path / "catalogo.db")
+    write_sqlite(data, path)
+    engine = RecommendationEngine(path, mode="vector", exploration=0.0)
+
+    recommendations = engine.recommend_many([_scored(5), _scored(3, intensity="Media")] * 50)
+    assert len(recommendations) == 100
+    # El mood propio manda sobre el de su categoría
+    assert recommendations[0]["song"]["title"] == "Euforia"
+    assert recommendations[1]["song"]["title"] == "Calma"
+    assert engine.snapshot()["mood_index"]["songs"]["items"] == 4
+
+
+def test_category_mode_recommend_many_uses_emotions():
+    engine = RecommendationEngine(rng=random.Random(0))
+    result = SentimentAnalyzer.build_result([{"label": "2 stars", "score": 0.9}])
+    assert [r["color"]["name"] for r in engine.recommend_many([result, result])] == ["Carmesí", "Carmesí"]
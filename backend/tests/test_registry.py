@@ -0,0 +1,167 @@
+import asyncio
+import os
+from functools import partial
+import pytest
+from app import lifecycle
+from app.config import Settings
+from app.lifecycle import ModelNotReady
+from app.registry import ModelRegistry, parse_language_models
+from app.sentiment_analyzer import SentimentAnalyzer
+
+MB = 1024 * 1024
+
+
+def stub_settings(**overrides):
+    values = dict(
+        model_name="stub-multi",
+        inference_backend="stub",
+        language_models="es=stub-es,en=stub-en",
+        batch_max_wait_ms=0.0
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def run(registry, scenario):
+    async def main():
+        await registry.start()
+        try:
+            return await scenario()
+        finally:
+            await registry.close()
+    return asyncio.run(main())
+
+
+def test_parse_language_models():
+    assert parse_language_models(" es=modelo-a, EN-us=org/modelo-b ,") == {"es": "modelo-a", "en": "org/modelo-b"}
+    assert parse_language_models("") == {}
+    with pytest.raises(ValueError):
+        parse_language_models("es")
+
+
+def test_routes_by_language_and_loads_lazily():
+    registry = ModelRegistry(stub_settings(), warmup=False)
+
+    async def scenario():
+        assert [slot.model_name for slot in registry.slots()] == ["stub-multi"]
+        es = await registry.acquire("es-ES", timeout=10)
+        result = await es.cache.get_or_compute("Me encanta", es.batcher.submit)
+        registry.release(es)
+        other = await registry.acquire("fr", timeout=10)
+        registry.release(other)
+        return es, other, result
+
+    es, other, result = run(registry, scenario)
+    assert es.model_name == "stub-es"
+    assert other is registry.default
+    assert result.sentiment
+    # Caché y micro-batching propios de cada modelo
+    assert es.cache is not registry.default.cache
+    assert es.batcher.stats.items == 1 and registry.default.batcher.stats.items == 0
+
+
+def test_evicts_least_recently_used_over_budget():
+    registry = ModelRegistry(stub_settings(language_models="es=stub-es,en=stub-en,pt=stub-pt", model_memory_budget_mb=100), warmup=False)
+
+    async def use(language):
+        slot = await registry.acquire(language, timeout=10)
+        # El motor stub no tiene pesos: se simula lo que ocuparía cada modelo
+        slot.runtime.executor.memory_bytes = 40 * MB
+        registry.release(slot)
+        return slot
+
+    async def scenario():
+        await use("es")
+        await use("en")
+        await use("es")
+        # es + en + pt (y el por defecto) superan los 100 MB: se descarga en,
+        # el menos usado recientemente
+        await use("pt")
+        await registry.acquire("pt", timeout=10)
+        return [slot.model_name for slot in registry.slots()]
+
+    loaded = run(registry, scenario)
+    assert loaded == ["stub-multi", "stub-es", "stub-pt"]
+    assert registry.evictions == 1
+
+
+def test_evict_refuses_default_and_models_in_use():
+    registry = ModelRegistry(stub_settings(), warmup=False)
+
+    async def scenario():
+        slot = await registry.acquire("en", timeout=10)
+        with pytest.raises(ValueError):
+            await registry.evict("stub-multi")
+        with pytest.raises(ValueError):
+            await registry.evict("stub-en")
+        registry.release(slot)
+        assert await registry.evict("stub-en") is True
+        assert await registry.evict("stub-en") is False
+        return slot
+
+    slot = run(registry, scenario)
+    assert not slot.runtime.ready
+
+
+def test_failed_language_model_falls_back_to_default(monkeypatch):
+    def factory(settings):
+        stub = partial(SentimentAnalyzer, backend="stub")
+
+        def build(model_name):
+            if model_name == "stub-es":
+                raise OSError("modelo no encontrado")
+            return stub(model_name)
+        return build
+
+    monkeypatch.setattr(lifecycle, "analyzer_factory", factory)
+    registry = ModelRegistry(stub_settings(), warmup=False)
+
+    async def scenario():
+        slot = await registry.acquire("es", timeout=10)
+        registry.release(slot)
+        return slot, {entry["model"]: entry for entry in registry.snapshot()["loaded"]}
+
+    slot, loaded = run(registry, scenario)
+    assert slot is registry.default
+    assert loaded["stub-es"]["phase"] == "failed"
+    assert loaded["stub-es"]["active_requests"] == 0
+
+
+def test_default_model_failure_is_reported(monkeypatch):
+    def factory(settings):
+        def build(model_name):
+            raise OSError("modelo no encontrado")
+        return build
+
+    monkeypatch.setattr(lifecycle, "analyzer_factory", factory)
+    registry = ModelRegistry(stub_settings(), warmup=False)
+
+    async def scenario():
+        with pytest.raises(ModelNotReady):
+            await registry.acquire("es", timeout=10)
+        return registry.default.active
+
+    assert run(registry, scenario) == 0
+
+
+def test_onnx_language_models_get_their_own_directory(monkeypatch):
+    built = {}
+
+    def fake_analyzer(model_name, onnx_dir=None, **kwargs):
+        built[model_name] = onnx_dir
+        return SentimentAnalyzer(model_name, backend="stub")
+
+    monkeypatch.setattr(lifecycle, "SentimentAnalyzer", fake_analyzer)
+    registry = ModelRegistry(stub_settings(inference_backend="onnx", onnx_dir="modelos/onnx"), warmup=False)
+
+    async def scenario():
+        for language in (None, "es", "en"):
+            registry.release(await registry.acquire(language, timeout=10))
+
+    run(registry, scenario)
+    assert built == {
+        "stub-multi": "modelos/onnx",
+        "stub-es": os.path.join("modelos/onnx", "stub-es"),
+        "stub-en": os.path.join("modelos/onnx", "stub-en"),
+    }
+    assert lifecycle.onnx_model_dir("modelos/onnx", "org/modelo en", "stub-multi") == os.path.join("modelos/onnx", "org__modelo__en")
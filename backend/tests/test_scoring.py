@@ -0,0 +1,105 @@
+import csv
+import json
+from functools import partial
+import pytest
+from app.scoring import read_records, score_corpus
+from app.sentiment_analyzer import SentimentAnalyzer
+
+StubAnalyzer = partial(SentimentAnalyzer, backend="stub")
+
+
+def write_jsonl(path, count):
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(count):
+            entry = {"id": f"c{i}", "text": f"comentario número {i} sobre el servicio"}
+            if i == 3:
+                entry = {"id": "c3"}
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+
+def read_output(path):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_read_records_csv_and_jsonl(tmp_path):
+    path = tmp_path / "entrada.csv"
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["id", "text"])
+        writer.writerows([["a", "Me encanta,\nde verdad"], ["b", ""]])
+    assert list(read_records(str(path))) == [(0, "a", "Me encanta,\nde verdad"), (1, "b", None)]
+
+    path = tmp_path / "entrada.jsonl"
+    path.write_text('"solo texto"\n\n{"id": 7, "text": "hola"}\nno es json\n', encoding="utf-8")
+    assert list(read_records(str(path))) == [(0, None, "solo texto"), (1, "7", "hola"), (2, None, None)]
+
+
+def test_scores_in_input_order_with_errors_inline(tmp_path):
+    source, output = tmp_path / "entrada.jsonl", tmp_path / "salida.jsonl"
+    write_jsonl(source, 50)
+    summary = score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0, batch_size=8)
+
+    rows = read_output(output)
+    assert summary["rows"] == summary["scored"] == 50
+    assert [row["row"] for row in rows] == list(range(50))
+    assert rows[3] == {"row": 3, "id": "c3", "error": "Registro sin texto"}
+    assert set(rows[0]) == {"row", "id", "sentiment", "score", "confidence", "emotions", "intensity", "scores"}
+
+
+def test_process_pool_matches_in_process(tmp_path):
+    source = tmp_path / "entrada.jsonl"
+    write_jsonl(source, 40)
+    score_corpus(str(source), str(tmp_path / "local.jsonl"), "stub", factory=StubAnalyzer, workers=0, batch_size=4)
+    score_corpus(
+        str(source), str(tmp_path / "pool.jsonl"), "stub", factory=StubAnalyzer, workers=2, threads_per_worker=1, batch_size=4
+    )
+    assert read_output(tmp_path / "pool.jsonl") == read_output(tmp_path / "local.jsonl")
+
+
+def test_resumes_after_interruption(tmp_path):
+    source, output = tmp_path / "entrada.jsonl", tmp_path / "salida.jsonl"
+    write_jsonl(source, 30)
+    score_corpus(str(source), str(tmp_path / "completo.jsonl"), "stub", factory=StubAnalyzer, workers=0, batch_size=5)
+
+    seen = []
+
+    def interrupt(rows):
+        seen.append(rows)
+        if rows == 20:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0, batch_size=5, progress=interrupt)
+    # Una línea a medias de la ejecución interrumpida se descarta al reanudar
+    with open(output, "a", encoding="utf-8") as f:
+        f.write('{"row": 20, "id"')
+
+    summary = score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0, batch_size=5)
+    assert (summary["resumed_from"], summary["scored"]) == (20, 10)
+    assert read_output(output) == read_output(tmp_path / "completo.jsonl")
+    # Completo: volver a lanzarlo no repite nada
+    assert score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0)["scored"] == 0
+
+
+def test_checkpoint_from_another_input_is_rejected(tmp_path):
+    source, output = tmp_path / "entrada.jsonl", tmp_path / "salida.jsonl"
+    write_jsonl(source, 10)
+    score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0)
+    write_jsonl(source, 12)
+    with pytest.raises(ValueError):
+        score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0)
+    assert score_corpus(str(source), str(output), "stub", factory=StubAnalyzer, workers=0, resume=False)["rows"] == 12
+
+
+def test_parquet_parts(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    source = tmp_path / "entrada.jsonl"
+    write_jsonl(source, 25)
+    score_corpus(
+        str(source), str(tmp_path / "salida"), "stub", factory=StubAnalyzer, workers=0,
+        batch_size=4, output_format="parquet", part_rows=10
+    )
+    table = pq.read_table(str(tmp_path / "salida"))
+    assert table.num_rows == 25
+    assert sorted(table.column("row").to_pylist()) == list(range(25))
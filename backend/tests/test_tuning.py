@@ -0,0 +1,116 @@
+import asyncio
+import json
+import pytest
+from app import lifecycle
+from app.backends import StubBackend
+from app.config import Settings
+from app.executor import InferenceExecutor
+from app.registry import ModelRegistry
+from app.sentiment_analyzer import SentimentAnalyzer
+from app.tuning import calibrate, cpu_fingerprint, load_profiles, resolve_profile, thread_candidates
+
+
+class NoisyBf16Backend(StubBackend):
+    """Stub que admite bf16 pero con `noise` de error en las probabilidades"""
+    precisions = ("fp32", "bf16")
+    noise = 0.0
+
+    def forward(self, texts):
+        results = super().forward(texts)
+        if self.precision == "bf16":
+            for scores in results:
+                scores[0]["score"] += self.noise
+        return results
+
+
+def stub_analyzer(noise=0.0):
+    analyzer = SentimentAnalyzer("stub-modelo", backend="stub")
+    analyzer.backend = NoisyBf16Backend()
+    analyzer.backend.noise = noise
+    return analyzer
+
+
+def stub_settings(tmp_path, **overrides):
+    values = dict(
+        model_name="stub-modelo",
+        inference_backend="stub",
+        batch_max_wait_ms=0.0,
+        runtime_profile_path=str(tmp_path / "perfil.json"),
+        runtime_calibrate=True
+    )
+    values.update(overrides)
+    return Settings(**values)
+
+
+def test_thread_candidates_split_cores_between_workers(monkeypatch):
+    monkeypatch.setattr("os.cpu_count", lambda: 16)
+    assert thread_candidates(1) == [1, 2, 4, 8, 16]
+    assert thread_candidates(3) == [1, 2, 4, 5]
+    assert thread_candidates(32) == [1]
+
+
+def test_calibration_measures_every_combination():
+    analyzer = stub_analyzer()
+    profile = calibrate(analyzer, threads=[1], batch_sizes=[1, 4], min_seconds=0.01)
+
+    assert {(t["precision"], t["batch_size"]) for t in profile.trials} == {
+        ("fp32", 1), ("fp32", 4), ("bf16", 1), ("bf16", 4)
+    }
+    assert profile.batch_size in (1, 4) and profile.intra_op_threads == 1
+    assert profile.cpu == cpu_fingerprint() and profile.model == "stub-modelo"
+    # El analizador queda como estaba
+    assert analyzer.backend.precision == "fp32"
+
+
+def test_precision_outside_tolerance_is_rejected():
+    profile = calibrate(stub_analyzer(noise=0.1), threads=[1], batch_sizes=[2], tolerance=0.02, min_seconds=0.01)
+    assert profile.precision == "fp32"
+    assert {"precision": "bf16", "max_score_drift": pytest.approx(0.1), "rejected": True} in profile.trials
+
+
+def test_profile_is_calibrated_once_and_reused(tmp_path, monkeypatch):
+    settings = stub_settings(tmp_path)
+    executor = InferenceExecutor("stub-modelo", analyzer_factory=lambda model_name: stub_analyzer())
+    # Sin ejecutor no hay modelo cargado con el que calibrar
+    assert resolve_profile(settings, "stub-modelo") is None
+    try:
+        first = resolve_profile(settings, "stub-modelo", executor)
+    finally:
+        executor.shutdown()
+    stored = json.loads((tmp_path / "perfil.json").read_text())
+    assert list(stored["profiles"]) == ["stub-modelo:stub"]
+
+    monkeypatch.setattr("app.tuning.calibrate", lambda *args, **kwargs: pytest.fail("no debe recalibrar"))
+    assert resolve_profile(settings, "stub-modelo", executor) == first
+    # Con otro número de workers el perfil no vale, y sin calibración no hay perfil
+    other = stub_settings(tmp_path, inference_workers=2, runtime_calibrate=False)
+    assert resolve_profile(other, "stub-modelo") is None
+    assert load_profiles(str(tmp_path / "perfil.json"))["stub-modelo:stub"] == first
+
+
+def test_runtime_applies_profile_at_startup(tmp_path, monkeypatch):
+    built = []
+
+    def counting_analyzer(model_name, **kwargs):
+        built.append(model_name)
+        return SentimentAnalyzer(model_name, **kwargs)
+
+    monkeypatch.setattr(lifecycle, "SentimentAnalyzer", counting_analyzer)
+    registry = ModelRegistry(stub_settings(tmp_path, batch_max_size=16), warmup=False)
+
+    async def scenario():
+        await registry.start()
+        try:
+            slot = await registry.acquire(None, timeout=30)
+            registry.release(slot)
+            return slot, slot.runtime.snapshot()
+        finally:
+            await registry.close()
+
+    slot, snapshot = asyncio.run(scenario())
+    profile = load_profiles(str(tmp_path / "perfil.json"))["stub-modelo:stub"]
+    assert slot.batcher.max_batch_size == profile.batch_size
+    assert snapshot["profile"] == profile.summary()
+    assert "profile_s" in snapshot["timings"]
+    # La calibración usa el modelo del pool: no se carga una segunda copia
+    assert built == ["stub-modelo"]
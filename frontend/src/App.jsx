@@ -1,12 +1,50 @@
-import { useState } from 'react'
+import { useEffect, useRef, useState } from 'react'
 import './App.css'
 
+const LIVE_URL = 'ws://localhost:8000/sentify/live'
+
 // Main Function
 function App() {
   const [text, setText] = useState('')
   const [result, setResult] = useState(null)
   const [loading, setLoading] = useState(false)
   const [error, setError] = useState(null)
+  // Análisis en vivo: una conexión WebSocket que recibe cada cambio del texto
+  const [live, setLive] = useState(false)
+  const socketRef = useRef(null)
+  const seqRef = useRef(0)
+
+  useEffect(() => {
+    if (!live) return
+
+    const socket = new WebSocket(LIVE_URL)
+    socket.onmessage = (event) => {
+      const frame = JSON.parse(event.data)
+      // El servidor solo responde al último texto, pero uno anterior puede llegar justo antes
+      if (frame.seq !== seqRef.current) return
+      if (frame.error) {
+        setError(frame.error)
+      } else {
+        setError(null)
+        setResult(frame.result)
+      }
+    }
+    socket.onerror = () => setError('No se pudo conectar al análisis en vivo')
+    socketRef.current = socket
+    return () => {
+      socket.close()
+      socketRef.current = null
+    }
+  }, [live])
+
+  const handleChange = (value) => {
+    setText(value)
+    const socket = socketRef.current
+    if (live && value.length >= 3 && socket?.readyState === WebSocket.OPEN) {
+      seqRef.current += 1
+      socket.send(JSON.stringify({ text: value, language: 'es', seq: seqRef.current }))
+    }
+  }
 
   const analyzeSentiment = async () => {
     if (!text || text.length < 3) {
@@ -63,13 +101,18 @@ function App() {
         <textarea
           placeholder="Escribe aquí tu comentario (ej: ¡Hoy es un día increíble!)..."
           value={text}
-          onChange={(e) => setText(e.target.value)}
+          onChange={(e) => handleChange(e.target.value)}
           disabled={loading}
         />
 
+        <label style={{ display: 'flex', gap: '0.5rem', alignItems: 'center', fontSize: '0.9rem' }}>
+          <input type="checkbox" checked={live} onChange={(e) => setLive(e.target.checked)} />
+          Analizar mientras escribo
+        </label>
+
         <button
           onClick={analyzeSentiment}
-          disabled={loading || text.length < 3}
+          disabled={loading || live || text.length < 3}
         >
           {loading ? 'Analizando...' : 'Analizar Sentimiento'}
         </button>